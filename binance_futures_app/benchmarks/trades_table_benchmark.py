@@ -0,0 +1,119 @@
+"""
+Đo thời gian làm mới bảng giao dịch với 10.000 hàng.
+
+So sánh cách cũ (QTableWidget: xóa toàn bộ rồi tạo lại mọi ô và nút) với TradeTableModel
+(kho dạng cột, chỉ báo thay đổi cho hàng khác) trong các trường hợp: tải lần đầu, làm mới
+không đổi, vài lệnh đổi PnL, thêm một lệnh mới. Cuối cùng đo bộ nhớ của kho với 100.000 lệnh.
+
+Chạy: cd binance_futures_app && QT_QPA_PLATFORM=offscreen python benchmarks/trades_table_benchmark.py [số hàng]
+"""
+import os
+import sys
+import time
+import random
+import tracemalloc
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PyQt5.QtGui import QColor
+from PyQt5.QtWidgets import QApplication, QTableWidget, QTableWidgetItem, QPushButton, QTableView
+
+from views.trade_table import TradeTableModel, CloseButtonDelegate, TRADE_COLUMN_COUNT, STATUS_COLUMN
+
+
+def make_trades(count, seed=7):
+    rng = random.Random(seed)
+    symbols = ["BTCUSDT", "ETHUSDT", "BNBUSDT", "SOLUSDT", "XRPUSDT"]
+    trades = []
+    for i in range(count):
+        trades.append({
+            "id": str(1000000 + i),
+            "symbol": rng.choice(symbols),
+            "side": rng.choice(["BUY", "SELL"]),
+            "price": round(rng.uniform(1, 70000), 2),
+            "quantity": round(rng.uniform(0.001, 5), 3),
+            "timestamp": "2024-01-01 00:00:00",
+            "pnl": round(rng.uniform(-50, 50), 2),
+            "source": rng.choice(["Ứng dụng", "Binance"]),
+            "leverage": rng.randint(1, 20),
+            "stop_loss": "",
+            "take_profit": "",
+            "status": "OPEN" if i % 50 == 0 else "FILLED",
+        })
+    return trades
+
+
+def full_rebuild(table, trades):
+    """Cách làm mới cũ: xóa hết và tạo lại mọi ô và nút"""
+    table.setRowCount(0)
+    for row, trade in enumerate(trades):
+        table.insertRow(row)
+        values = [trade["id"], trade["symbol"], trade["side"], trade["price"], trade["quantity"],
+                  trade["timestamp"], f"{trade['pnl']:.2f}", trade["source"], trade["leverage"],
+                  trade["stop_loss"], trade["take_profit"]]
+        for column, value in enumerate(values):
+            item = QTableWidgetItem(str(value))
+            if column in (2, 6, 7):
+                item.setForeground(QColor(0, 200, 83))
+            table.setItem(row, column, item)
+        if trade["status"] == "OPEN":
+            table.setCellWidget(row, STATUS_COLUMN, QPushButton("Đóng vị thế"))
+        else:
+            table.setItem(row, STATUS_COLUMN, QTableWidgetItem(trade["status"]))
+
+
+def timed(func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    return (time.perf_counter() - started) * 1000, result
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    app = QApplication(sys.argv)
+
+    trades = make_trades(rows)
+    changed = [dict(t) for t in trades]
+    for i in range(0, rows, rows // 10):
+        changed[i]["pnl"] = changed[i]["pnl"] + 1.0
+    added = changed + [dict(make_trades(1, seed=99)[0], id="new")]
+
+    scenarios = [("tải lần đầu", trades), ("không đổi", trades),
+                 ("10 lệnh đổi PnL", changed), ("thêm 1 lệnh", added)]
+
+    old_table = QTableWidget(0, TRADE_COLUMN_COUNT)
+    model = TradeTableModel()
+    view = QTableView()
+    view.setModel(model)
+    view.setItemDelegateForColumn(STATUS_COLUMN, CloseButtonDelegate(view))
+    view.resize(1600, 600)
+    view.show()
+
+    print(f"{rows} hàng")
+    print(f"{'Trường hợp':<22}{'Tạo lại (ms)':>14}{'Model (ms)':>14}{'Hàng đổi':>10}")
+    for name, data in scenarios:
+        old_ms, _ = timed(full_rebuild, old_table, data)
+        new_ms, changed_rows = timed(model.set_trades, data)
+        app.processEvents()
+        print(f"{name:<22}{old_ms:>14.1f}{new_ms:>14.1f}{changed_rows:>10}")
+
+    # Bộ nhớ của model với 100.000 lệnh (không có đối tượng Qt cho từng ô)
+    large = make_trades(100000)
+    tracemalloc.start()
+    large_model = TradeTableModel()
+    large_ms, _ = timed(large_model.set_trades, large)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    view.setModel(large_model)
+    started = time.perf_counter()
+    view.scrollToBottom()
+    app.processEvents()
+    scroll_ms = (time.perf_counter() - started) * 1000
+    print(f"100000 lệnh: nạp {large_ms:.0f} ms, bộ nhớ kho {current / 1024 / 1024:.1f} MB, "
+          f"cuộn xuống cuối {scroll_ms:.1f} ms")
+
+    app.quit()
+
+
+if __name__ == "__main__":
+    main()
@@ -19,6 +19,15 @@ SETTINGS_FILE = os.path.join(DATA_DIR, "settings.json")
 # SQLite Database path
 DATABASE_PATH = os.path.join(DATA_DIR, "binance_app.db")
 
+# Journal của hàng đợi ghi giao dịch (các câu lệnh chưa ghi vào database)
+TRADE_JOURNAL_FILE = os.path.join(DATA_DIR, "trade_journal.jsonl")
+
+# Chế độ giao dịch giả lập: dùng sàn mô phỏng (models.paper_exchange) thay cho Binance thật
+PAPER_TRADING = os.environ.get("BINANCE_PAPER_TRADING", "0") == "1"
+
+# Thư mục lưu dữ liệu nến lịch sử (dạng cột nhị phân)
+KLINES_DIR = os.path.join(DATA_DIR, "klines")
+
 # Đảm bảo các thư mục tồn tại
 for directory in [DATA_DIR, ICONS_DIR, UI_DIR]:
     if not os.path.exists(directory):
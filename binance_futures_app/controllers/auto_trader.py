@@ -1,18 +1,25 @@
 import time
 import datetime
+from contextlib import nullcontext
 import numpy as np
 from PyQt5.QtCore import QThread, pyqtSignal
 from config.logging_config import setup_logger
 from binance.error import ClientError
 from models import binance_data_singleton
+from utils.indicators import METHOD_BASELINE, METHOD_ICHIMOKU, generate_signals, klines_to_arrays
+from utils.latency_tracer import LatencyTracer
 
 # Tạo logger cho module này
 logger = setup_logger(__name__)
 
+# Các đường chỉ báo được gửi lên biểu đồ (nếu phương pháp có tính)
+CHART_INDICATORS = ("baseline", "tenkan", "kijun", "senkou_a", "senkou_b")
+
 class AutoTrader(QThread):
     trade_update = pyqtSignal(dict)
     status_update = pyqtSignal(str)
     close_position_signal = pyqtSignal(str, str, str)  # trade_id, symbol, side
+    indicator_update = pyqtSignal(str, str, object)  # symbol, timeframe, {"open_time": mảng, tên đường: mảng}
 
     def __init__(self, binance_client, symbol, timeframe, amount, leverage, stop_loss, trading_method="Đường Base Line"):
         super().__init__()
@@ -26,24 +33,42 @@ class AutoTrader(QThread):
         self.running = True
         self.current_position = None  # Theo dõi vị thế hiện tại: None hoặc {"side": "BUY"/"SELL", "trade_id": "id"}
         self.current_baseline = None  # Lưu giá trị baseline hiện tại
+        self.indicator_sent_until = None  # open_time của nến cuối đã gửi chỉ báo lên biểu đồ
         
         # Lấy tham chiếu đến data model
         self.data_model = binance_data_singleton.get_instance()
 
+        # Đo thời gian từng giai đoạn của mỗi chu kỳ
+        self.tracer = LatencyTracer(symbol, trading_method)
+        self.current_trace = None
+
+    def _stage(self, name):
+        """Đo thời gian một giai đoạn của chu kỳ hiện tại"""
+        if self.current_trace:
+            return self.current_trace.stage(name)
+        return nullcontext()
+
+    def latency_summary(self):
+        """Thống kê thời gian (phân vị) theo giai đoạn của các chu kỳ gần đây"""
+        return self.tracer.summary()
+
     def run(self):
         while self.running:
+            self.current_trace = self.tracer.start_cycle()
             try:
                 self.status_update.emit(f"Đang phân tích thị trường với phương pháp {self.trading_method}...")
 
                 # Kiểm tra vị thế hiện tại trước
-                self.check_current_position()
+                with self._stage("position_check"):
+                    self.check_current_position()
 
                 # Lấy dữ liệu lịch sử giá với Futures Connector
-                klines_response = self.data_model.get_klines(
-                    symbol=self.symbol,
-                    interval=self.timeframe,
-                    limit=200  # Tăng số lượng nến để có đủ dữ liệu cho Ichimoku và Baseline
-                )
+                with self._stage("kline_fetch"):
+                    klines_response = self.data_model.get_klines(
+                        symbol=self.symbol,
+                        interval=self.timeframe,
+                        limit=200  # Tăng số lượng nến để có đủ dữ liệu cho Ichimoku và Baseline
+                    )
 
                 # Phân tích dựa trên phương pháp được chọn
                 if self.trading_method == "Đường Base Line":
@@ -81,6 +106,9 @@ class AutoTrader(QThread):
                 error_msg = f"Lỗi giao dịch tự động: {e}"
                 self.status_update.emit(error_msg)
                 logger.error(error_msg)
+            finally:
+                self.current_trace.finish()
+                self.current_trace = None
 
             # Chờ khoảng thời gian trước khi kiểm tra lại
             time_sleep = 60  # 1 phút
@@ -149,13 +177,15 @@ class AutoTrader(QThread):
             
             # Phát tín hiệu đóng vị thế
             self.status_update.emit(f"Đang đóng vị thế {side} {self.symbol}...")
-            self.close_position_signal.emit(str(trade_id), self.symbol, side)
+            with self._stage("close_send"):
+                self.close_position_signal.emit(str(trade_id), self.symbol, side)
             
             # Đặt current_position về None
             self.current_position = None
             
             # Đợi một khoảng thời gian để vị thế được đóng
-            time.sleep(2)
+            with self._stage("close_wait"):
+                time.sleep(2)
             
         except Exception as e:
             error_msg = f"Lỗi khi đóng vị thế: {e}"
@@ -167,7 +197,8 @@ class AutoTrader(QThread):
     def execute_trade(self, side, current_price):
         try:
             # Tính toán số lượng
-            quantity = self.data_model.calculate_order_quantity(self.symbol, self.amount)
+            with self._stage("quantity"):
+                quantity = self.data_model.calculate_order_quantity(self.symbol, self.amount)
 
             if not quantity:
                 self.status_update.emit("Không thể tính toán số lượng lệnh")
@@ -180,6 +211,11 @@ class AutoTrader(QThread):
                 self.symbol, side, quantity, self.leverage, self.stop_loss, 0
             )
 
+            # Thời gian gửi lệnh và xử lý sau xác nhận được đo trong place_order
+            if success and self.current_trace:
+                for stage, duration in result.get('timings', {}).items():
+                    self.current_trace.record(stage, duration)
+
             if success:
                 trade_info = result
                 # Thêm thông tin phương pháp giao dịch và đòn bẩy vào thông tin giao dịch
@@ -223,8 +259,58 @@ class AutoTrader(QThread):
             self.status_update.emit(error_msg)
             logger.error(error_msg)
 
-    # [Giữ nguyên các phương thức phân tích khác - calculate_jma, calculate_rsi, v.v.]
+    def analyze_with_baseline(self, klines):
+        """Phân tích theo Đường Base Line, trả về (tín hiệu mở lệnh, tín hiệu đóng vị thế)"""
+        return self._analyze(METHOD_BASELINE, klines)
+
+    def analyze_with_ichimoku(self, klines):
+        """Phân tích theo Mây Ichimoku, trả về (tín hiệu mở lệnh, tín hiệu đóng vị thế)"""
+        return self._analyze(METHOD_ICHIMOKU, klines)
+
+    def _analyze(self, trading_method, klines):
+        """Sinh tín hiệu bằng utils.indicators - dùng chung với Backtester"""
+        if not klines:
+            raise ValueError("Không lấy được dữ liệu nến")
+
+        with self._stage("indicator"):
+            data = klines_to_arrays(klines)
+            result = generate_signals(trading_method, data)
+        self._publish_indicators(data["open_time"], result)
+
+        with self._stage("signal"):
+            # Lưu giá trị baseline của nến cuối cùng
+            baseline = float(result["baseline"][-1])
+            self.current_baseline = None if np.isnan(baseline) else baseline
+
+            signal = {1: "BUY", -1: "SELL"}.get(int(result["signal"][-1]))
+
+            close_signal = False
+            if self.current_position:
+                key = "close_long" if self.current_position["side"] == "BUY" else "close_short"
+                close_signal = bool(result[key][-1])
+
+        return signal, close_signal
+
+
+    def _publish_indicators(self, open_time, result):
+        """
+        Gửi các đường chỉ báo lên biểu đồ - chỉ từ nến cuối của lần gửi trước
+        (nến đó có thể đã thay đổi khi còn đang hình thành) trở đi
+        """
+        start = 0
+        if self.indicator_sent_until is not None:
+            start = int(np.searchsorted(open_time, self.indicator_sent_until))
+        series = {"open_time": open_time[start:]}
+        # Với Ichimoku, baseline chính là Kijun - không vẽ trùng
+        names = [name for name in CHART_INDICATORS if name in result and not (name == "baseline" and "kijun" in result)]
+        series.update({name: result[name][start:] for name in names})
+        if len(series["open_time"]):
+            self.indicator_sent_until = int(open_time[-1])
+            self.indicator_update.emit(self.symbol, self.timeframe, series)
 
     def stop(self):
         logger.info("Stopping AutoTrader thread")
-        self.running = False
\ No newline at end of file
+        self.running = False
+        summary = self.tracer.summary()
+        if summary["stages"]:
+            logger.info(f"Thời gian chu kỳ AutoTrader {self.symbol} (lần chạy {self.tracer.run_id}): {summary}")
\ No newline at end of file
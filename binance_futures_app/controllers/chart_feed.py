@@ -0,0 +1,179 @@
+import time
+import threading
+import numpy as np
+from PyQt5.QtCore import QThread, pyqtSignal
+from config.logging_config import setup_logger
+from models import binance_data_singleton
+from models.kline_store import KlineStore
+from utils.indicators import INTERVAL_MS, klines_to_arrays, resample_klines
+
+# Tạo logger cho module này
+logger = setup_logger(__name__)
+
+# Số nến tối đa Binance trả về trong một lần gọi klines
+REST_LIMIT = 1500
+
+
+class ChartFeed(QThread):
+    """
+    Cung cấp dữ liệu nến cho biểu đồ trên thread nền.
+    Khi đổi cặp giao dịch/khung thời gian: đọc lịch sử từ KlineStore (gộp từ nến 1m nếu cần),
+    bổ sung phần gần nhất bằng REST rồi gửi một lần. Sau đó cập nhật nến cuối từ giá khớp lệnh
+    (aggTrade) của BinanceDataModel - cùng nguồn với nến của sàn, không phải giá đánh dấu - và chỉ gửi
+    nến cuối (tối đa một lần mỗi update_interval).
+    """
+    history_loaded = pyqtSignal(str, str, object)  # symbol, interval, dict mảng nến
+    candle_updated = pyqtSignal(str, object)  # symbol, (open_time, open, high, low, close)
+    error_signal = pyqtSignal(str)
+
+    def __init__(self, store=None, history_limit=1000, update_interval=0.2):
+        super().__init__()
+        self.data_model = binance_data_singleton.get_instance()
+        self.store = store or KlineStore()
+        self.history_limit = history_limit
+        self.update_interval = update_interval  # Khoảng cách tối thiểu giữa hai lần gửi nến cuối (giây)
+        self.running = True
+
+        self.condition = threading.Condition()
+        self.pending = None  # (symbol, interval) chờ nạp
+        self.symbol = None
+        self.interval = None
+        self.step = INTERVAL_MS["1m"]
+        self.last = None  # [open_time, open, high, low, close] của nến đang hình thành
+        self.price = None  # Giá khớp mới nhất chưa xử lý
+        self.next_check = 0  # Thời điểm (ms) cần kiểm tra nến mới qua REST
+        self.last_publish = 0.0
+
+    def set_symbol(self, symbol, interval):
+        """Đổi cặp giao dịch/khung thời gian (không chờ, việc nạp chạy trên thread nền)"""
+        with self.condition:
+            self.pending = (symbol, interval)
+            self.condition.notify()
+
+    def _on_data_update(self, kind, payload):
+        """Listener của BinanceDataModel - chỉ giữ giá khớp mới nhất của cặp đang hiển thị"""
+        if kind != "trade_price":
+            return
+        symbol, price = payload
+        with self.condition:
+            if symbol == self.symbol:
+                self.price = price
+                self.condition.notify()
+
+    def run(self):
+        self.data_model.add_listener(self._on_data_update)
+        try:
+            while self.running:
+                with self.condition:
+                    while self.running and self.pending is None and self.price is None:
+                        self.condition.wait()
+                    if not self.running:
+                        break
+                    pending, self.pending = self.pending, None
+                    if pending is None:
+                        remaining = self.last_publish + self.update_interval - time.monotonic()
+                        while self.running and self.pending is None and remaining > 0:
+                            self.condition.wait(remaining)
+                            remaining = self.last_publish + self.update_interval - time.monotonic()
+                        if self.pending is not None:
+                            continue
+                    price, self.price = self.price, None
+
+                try:
+                    if pending is not None:
+                        self._load(*pending)
+                    elif price is not None:
+                        self._on_price(price)
+                except Exception as e:
+                    error_msg = f"Lỗi khi cập nhật biểu đồ: {e}"
+                    logger.error(error_msg)
+                    self.error_signal.emit(error_msg)
+        finally:
+            self.data_model.remove_listener(self._on_data_update)
+            if self.symbol:
+                self.data_model.unsubscribe_trade_price(self.symbol)
+
+    def _load(self, symbol, interval):
+        """Nạp lịch sử nến và đăng ký giá khớp cho cặp giao dịch mới"""
+        if symbol != self.symbol:
+            if self.symbol:
+                self.data_model.unsubscribe_trade_price(self.symbol)
+            self.data_model.subscribe_trade_price(symbol)
+        with self.condition:
+            self.symbol = symbol
+            self.interval = interval
+            self.step = INTERVAL_MS.get(interval, INTERVAL_MS["1m"])
+            self.last = None
+            self.price = None
+
+        data = self.load_history(symbol, interval)
+        if len(data["open_time"]):
+            self.last = [int(data["open_time"][-1]), float(data["open"][-1]), float(data["high"][-1]),
+                         float(data["low"][-1]), float(data["close"][-1])]
+            self.next_check = self.last[0] + self.step
+        logger.debug(f"Biểu đồ {symbol} {interval}: {len(data['open_time'])} nến")
+        self.history_loaded.emit(symbol, interval, data)
+
+    def load_history(self, symbol, interval):
+        """
+        Lịch sử nến: phần cũ từ KlineStore (khung `interval` nếu có, không thì gộp từ 1m),
+        phần mới nhất (kể cả nến đang hình thành) từ REST
+
+        Returns:
+            dict: Mảng nến (bản sao trong bộ nhớ) như KlineStore.load
+        """
+        stored = None
+        if self.store.count(symbol, interval):
+            stored = self.store.tail(symbol, interval, self.history_limit)
+        elif interval != "1m" and self.store.count(symbol, "1m"):
+            ratio = self.step // INTERVAL_MS["1m"]
+            stored = resample_klines(self.store.tail(symbol, "1m", self.history_limit * ratio), interval)
+
+        recent = klines_to_arrays(self.data_model.get_klines(symbol, interval, limit=min(self.history_limit, REST_LIMIT)) or [])
+        if stored is None or not len(stored["open_time"]):
+            return {column: np.array(values) for column, values in recent.items()}
+        if not len(recent["open_time"]):
+            return {column: np.array(values) for column, values in stored.items()}
+
+        # Chỉ giữ phần của kho cũ hơn dữ liệu REST
+        cut = int(np.searchsorted(stored["open_time"], recent["open_time"][0]))
+        data = {column: np.concatenate((np.asarray(stored[column][:cut]), recent[column])) for column in recent}
+        return {column: values[-self.history_limit:] for column, values in data.items()}
+
+    def _on_price(self, price):
+        """Cập nhật nến cuối theo giá mới; khi hết thời gian nến thì lấy nến mới qua REST"""
+        self.last_publish = time.monotonic()
+        if self.last is None:
+            return
+        symbol = self.symbol
+        if time.time() * 1000 >= self.next_check and self._roll_candle(symbol):
+            return
+
+        last = self.last
+        last[2] = max(last[2], price)
+        last[3] = min(last[3], price)
+        last[4] = price
+        self.candle_updated.emit(symbol, tuple(last))
+
+    def _roll_candle(self, symbol):
+        """
+        Lấy hai nến gần nhất qua REST. Trả về True nếu đã sang nến mới
+        (đồng hồ máy và sàn có thể lệch nhau - nếu chưa sang thì thử lại sau 1 giây)
+        """
+        klines = self.data_model.get_klines(symbol, self.interval, limit=2) or []
+        if not klines or int(klines[-1][0]) <= self.last[0]:
+            self.next_check = time.time() * 1000 + 1000
+            return False
+        for kline in klines:
+            candle = (int(kline[0]), float(kline[1]), float(kline[2]), float(kline[3]), float(kline[4]))
+            if candle[0] >= self.last[0]:
+                self.candle_updated.emit(symbol, candle)
+        self.last = list(candle)
+        self.next_check = self.last[0] + self.step
+        return True
+
+    def stop(self):
+        """Yêu cầu thread dừng - không chờ"""
+        with self.condition:
+            self.running = False
+            self.condition.notify()
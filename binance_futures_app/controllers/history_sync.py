@@ -0,0 +1,168 @@
+import time
+import threading
+from PyQt5.QtCore import QThread, pyqtSignal
+from config.logging_config import setup_logger
+from models import binance_data_singleton
+from models.account_history import AccountHistoryStore, STREAM_INCOME
+from models.trade_model import TradeModel
+from utils.write_behind import get_journal
+
+# Tạo logger cho module này
+logger = setup_logger(__name__)
+
+# Số dòng tối đa Binance trả về trong một lần gọi income/userTrades
+PAGE_LIMIT = 1000
+
+# Khoảng thời gian tối đa của một lần gọi income (ms)
+INCOME_WINDOW = 7 * 24 * 60 * 60 * 1000
+
+# Lần đồng bộ đầu tiên lấy thu nhập trong khoảng này (Binance chỉ giữ khoảng 3 tháng)
+INCOME_LOOKBACK = 90 * 24 * 60 * 60 * 1000
+
+# Thu nhập có thể xuất hiện trễ vài giây: mỗi lần đồng bộ đọc lại khoảng cuối này (ms)
+SETTLE_MARGIN = 60 * 1000
+
+# Số trang tối đa cho một luồng dữ liệu trong một lần đồng bộ (phần còn lại đọc ở lần sau)
+MAX_PAGES = 50
+
+
+class HistorySync(QThread):
+    """
+    Đồng bộ dần lịch sử thu nhập và khớp lệnh của tài khoản vào SQLite trên thread nền.
+    Thu nhập (mọi cặp giao dịch trong một lần gọi) được đọc theo thời gian; các tradeId trong đó
+    cho biết cặp giao dịch nào có khớp lệnh mới, và chỉ những cặp đó được đọc userTrades theo fromId.
+    Vị trí đồng bộ lưu trong bảng sync_cursors nên khởi động lại sẽ tiếp tục từ chỗ cũ.
+    """
+    synced = pyqtSignal(int, int)  # số bản ghi thu nhập, số lần khớp lệnh mới lưu
+    error_signal = pyqtSignal(str)
+
+    def __init__(self, username, store=None, interval=30.0, min_gap=5.0):
+        super().__init__()
+        self.username = username
+        self.data_model = binance_data_singleton.get_instance()
+        self.store = store or AccountHistoryStore()
+        self.interval = interval  # Khoảng cách giữa hai lần đồng bộ định kỳ (giây)
+        self.min_gap = min_gap  # Khoảng cách tối thiểu khi được yêu cầu đồng bộ sớm (giây)
+        self.running = True
+
+        self.condition = threading.Condition()
+        self.requested = True
+        self.last_sync = 0.0
+        # Tìm cặp giao dịch có khớp lệnh chưa đồng bộ trong thu nhập từ thời điểm này (None = mọi thu nhập đã lưu,
+        # dùng cho lần đầu và khi lần trước chưa đọc hết khớp lệnh)
+        self.scan_from = None
+
+    def _on_data_update(self, kind, payload):
+        """Vị thế thay đổi nghĩa là vừa có khớp lệnh - đồng bộ sớm"""
+        if kind == "positions":
+            self.request_sync()
+
+    def request_sync(self):
+        """Yêu cầu đồng bộ sớm (gọi được từ mọi thread, không chờ)"""
+        with self.condition:
+            self.requested = True
+            self.condition.notify()
+
+    def run(self):
+        self.data_model.add_listener(self._on_data_update)
+        try:
+            while self.running:
+                with self.condition:
+                    deadline = self.last_sync + self.interval
+                    while self.running and not self.requested and time.monotonic() < deadline:
+                        self.condition.wait(deadline - time.monotonic())
+                    # Gộp các yêu cầu đến quá gần nhau
+                    remaining = self.last_sync + self.min_gap - time.monotonic()
+                    while self.running and remaining > 0:
+                        self.condition.wait(remaining)
+                        remaining = self.last_sync + self.min_gap - time.monotonic()
+                    if not self.running:
+                        break
+                    self.requested = False
+
+                try:
+                    self.sync_once()
+                except Exception as e:
+                    error_msg = f"Lỗi khi đồng bộ lịch sử giao dịch: {e}"
+                    logger.error(error_msg)
+                    self.error_signal.emit(error_msg)
+                self.last_sync = time.monotonic()
+        finally:
+            self.data_model.remove_listener(self._on_data_update)
+
+    def sync_once(self):
+        """Một lần đồng bộ: thu nhập mới, rồi khớp lệnh của các cặp giao dịch có tradeId mới"""
+        if not self.data_model.is_connected():
+            return 0, 0
+        income_from = self.store.get_cursor(self.username, STREAM_INCOME)
+        income_count = self._sync_income(income_from)
+
+        # Giao dịch local vừa thêm phải có trong database để vị thế đóng khớp được với chúng
+        get_journal().flush()
+        fill_count = 0
+        complete = True
+        for symbol, from_id in self.store.pending_trade_symbols(self.username, self.scan_from).items():
+            count, caught_up = self._sync_trades(symbol, from_id)
+            fill_count += count
+            complete = complete and caught_up
+        if complete:
+            self.scan_from = income_from
+        if fill_count:
+            # Vị thế đóng mới có thể đã đóng các giao dịch local trong cùng transaction
+            TradeModel.notify_changed(self.username)
+
+        if income_count or fill_count:
+            logger.info(f"Đồng bộ lịch sử: {income_count} bản ghi thu nhập, {fill_count} lần khớp lệnh")
+            self.synced.emit(income_count, fill_count)
+        return income_count, fill_count
+
+    def _sync_income(self, cursor):
+        """Đọc thu nhập theo từng khoảng thời gian từ vị trí đã lưu tới hiện tại"""
+        now = int(time.time() * 1000)
+        if cursor is None:
+            cursor = now - INCOME_LOOKBACK
+        count = 0
+        for _ in range(MAX_PAGES):
+            end = min(cursor + INCOME_WINDOW, now)
+            records = self.data_model.get_income_history(start_time=cursor, end_time=end, limit=PAGE_LIMIT)
+            if records is None:
+                break
+            last_time = max((int(record['time']) for record in records), default=cursor)
+            if len(records) >= PAGE_LIMIT:
+                # Trang đầy: đọc tiếp từ thời điểm cuối (bản ghi trùng bị bỏ qua khi lưu)
+                next_cursor = last_time if last_time > cursor else cursor + 1
+            else:
+                next_cursor = max(cursor, min(end + 1, now - SETTLE_MARGIN), last_time)
+            saved = self.store.save_income(self.username, records, next_cursor)
+            if saved is None:
+                break
+            count += saved
+            cursor = next_cursor
+            if len(records) < PAGE_LIMIT and end >= now:
+                break
+        return count
+
+    def _sync_trades(self, symbol, from_id):
+        """
+        Đọc userTrades của một cặp giao dịch theo fromId
+
+        Returns:
+            tuple: (số lần khớp lệnh đã lưu, True nếu đã đọc hết)
+        """
+        count = 0
+        for _ in range(MAX_PAGES):
+            fills = self.data_model.get_account_trades(symbol, from_id=from_id, limit=PAGE_LIMIT)
+            saved = self.store.save_trades(self.username, symbol, fills) if fills is not None else None
+            if saved is None:
+                return count, False
+            count += saved
+            if len(fills) < PAGE_LIMIT:
+                return count, True
+            from_id = max(int(fill['id']) for fill in fills) + 1
+        return count, False
+
+    def stop(self):
+        """Yêu cầu thread dừng - không chờ"""
+        with self.condition:
+            self.running = False
+            self.condition.notify()
@@ -2,7 +2,7 @@ import time
 import datetime
 import logging
 from PyQt5.QtWidgets import QApplication, QMessageBox, QTableWidgetItem
-from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtCore import Qt, QTimer, QMetaObject, Q_ARG
 from PyQt5.QtGui import QColor
 
 from config.logging_config import setup_logger
@@ -11,14 +11,21 @@ from views.main_view import MainView
 from controllers.user_controller import UserController
 from controllers.trade_controller import TradeController
 from controllers.price_updater import PriceUpdater
+from controllers.trade_aggregator import TradeAggregator
+from controllers.chart_feed import ChartFeed
+from controllers.history_sync import HistorySync
 
 from models.binance_client import BinanceClientModel
 from models.trade_model import TradeModel
 from models.settings_model import SettingsModel
+from models.closed_positions import ClosedPositionStore
 
 # Tạo logger cho module này
 logger = setup_logger(__name__)
 
+# Thời gian chờ tối đa cho mỗi thread nền khi đóng (ms)
+WORKER_STOP_TIMEOUT = 5000
+
 class MainController:
     def __init__(self, username, user_data):
         self.username = username
@@ -34,6 +41,7 @@ class MainController:
         self.binance_client = BinanceClientModel(user_data["api_key"], user_data["api_secret"])
         self.trade_model = TradeModel()
         self.settings_model = SettingsModel()
+        self.closed_positions = ClosedPositionStore()
 
         # Kiểm tra kết nối
         if self.binance_client.is_connected():
@@ -46,8 +54,11 @@ class MainController:
 
         # Khởi tạo biến theo dõi
         self.current_price = 0.0
+        self.current_balance = None
         self.refresh_timer = time.time()
 
+        self.is_shut_down = False
+
         # Thiết lập controller
         self.setup_controllers()
         self.connect_signals()
@@ -55,8 +66,9 @@ class MainController:
 
         # Tải dữ liệu ban đầu
         symbol = self.view.symbolComboBox.currentText()
-        self.view.load_chart(symbol)
+        self.load_chart(symbol)
         self.load_trades()
+        self.refresh_summary()
 
         # Bắt đầu cập nhật giá và số dư
         self.start_price_updater()
@@ -65,14 +77,35 @@ class MainController:
         """Thiết lập các controllers phụ"""
         self.trade_controller = TradeController(self.view, self.binance_client, self.trade_model, self.username)
         self.price_updater = None
+        # Tổng hợp giao dịch (local + Binance) trên thread nền, chỉ gửi dòng thay đổi lên bảng
+        self.trade_aggregator = TradeAggregator(self.trade_model, self.username)
+        self.trade_aggregator.trades_changed.connect(self.apply_trade_changes)
+        self.trade_aggregator.pnl_changed.connect(self.apply_pnl_changes)
+        self.trade_aggregator.error_signal.connect(self.display_error)
+        self.trade_aggregator.start()
+        # Dữ liệu nến cho biểu đồ (lịch sử + nến cuối theo giá đẩy)
+        self.chart_feed = ChartFeed()
+        self.chart_feed.history_loaded.connect(self.view.set_chart_data)
+        self.chart_feed.candle_updated.connect(self.view.update_chart_candle)
+        self.chart_feed.error_signal.connect(self.display_error)
+        self.chart_feed.start()
+        # Đồng bộ lịch sử khớp lệnh/thu nhập của tài khoản vào SQLite
+        self.history_sync = HistorySync(self.username)
+        self.history_sync.error_signal.connect(self.display_error)
+        self.history_sync.synced.connect(lambda *_: self.refresh_summary())
+        self.history_sync.start()
         # Gán tham chiếu đến main_controller cho trade_controller
         self.trade_controller.main_controller = self
+        # Ứng dụng thoát (đóng cửa sổ chính): dừng thread nền trước khi main() đóng journal và database
+        QApplication.instance().aboutToQuit.connect(self.shutdown)
 
     def connect_signals(self):
         """Kết nối các signals"""
         self.view.userButton.clicked.connect(self.open_user_management)
         self.view.logoutButton.clicked.connect(self.logout)
         self.view.symbolComboBox.currentTextChanged.connect(self.change_symbol)
+        self.view.timeframeComboBox.currentTextChanged.connect(
+            lambda _: self.load_chart(self.view.symbolComboBox.currentText()))
         self.view.autoTradingCheckBox.stateChanged.connect(self.toggle_auto_trading)
         self.view.buyButton.clicked.connect(lambda: self.trade_controller.place_order("BUY"))
         self.view.sellButton.clicked.connect(lambda: self.trade_controller.place_order("SELL"))
@@ -107,7 +140,7 @@ class MainController:
                     self.user_data["api_secret"]
                 )
                 
-                # Khởi động lại price updater
+                # Khởi động price updater nếu chưa chạy (thread đang chạy được giữ nguyên)
                 self.start_price_updater()
 
     def logout(self):
@@ -117,12 +150,7 @@ class MainController:
         if not reply:
             return
 
-        # Dừng các thread đang chạy
-        if self.price_updater:
-            self.price_updater.stop()
-        
-        # Dừng thread cập nhật của BinanceDataModel
-        self.data_model.stop_update_thread()
+        self.shutdown()
 
         # Mở cửa sổ đăng nhập mới
         from controllers.login_controller import LoginController
@@ -130,27 +158,66 @@ class MainController:
         self.login_controller.show()
         self.view.close()
 
+    def shutdown(self):
+        """
+        Dừng và chờ mọi thread nền (khi đăng xuất hoặc khi ứng dụng thoát), trước khi
+        journal và các kết nối database dùng chung bị đóng. Gọi nhiều lần không sao.
+        """
+        if self.is_shut_down:
+            return
+        self.is_shut_down = True
+        try:
+            QApplication.instance().aboutToQuit.disconnect(self.shutdown)
+        except TypeError:
+            pass
+        self.timer.stop()
+        SettingsModel.remove_listener(self._on_setting_changed)
+
+        # Yêu cầu tất cả dừng trước rồi mới chờ, để các thread dừng song song
+        workers = [self.price_updater, self.trade_aggregator, self.chart_feed, self.history_sync,
+                   self.trade_controller.auto_trader]
+        workers = [worker for worker in workers if worker is not None]
+        for worker in workers:
+            worker.stop()
+        for worker in workers:
+            if not worker.wait(WORKER_STOP_TIMEOUT):
+                logger.warning(f"Thread {type(worker).__name__} chưa dừng sau {WORKER_STOP_TIMEOUT} ms")
+
+        # Dừng thread cập nhật và luồng giá đẩy của BinanceDataModel
+        self.data_model.stop_update_thread()
+        self.data_model.close_price_streams()
+
     def change_symbol(self, symbol):
         """Xử lý khi thay đổi cặp giao dịch"""
         # Cập nhật biểu đồ
-        self.view.load_chart(symbol)
+        self.load_chart(symbol)
 
         # Cập nhật updater giá
         self.start_price_updater()
 
+        # Hiển thị lại số dư theo base asset của cặp mới
+        if self.current_balance is not None:
+            self.view.update_balance_display(self.current_balance, symbol)
+
         # Cập nhật thông báo trạng thái
         self.view.statusbar.showMessage(f"Đã chuyển sang cặp giao dịch {symbol}", 3000)
 
+    def load_chart(self, symbol):
+        """Chuyển biểu đồ sang cặp giao dịch theo khung thời gian đang chọn"""
+        self.view.load_chart(symbol)
+        self.chart_feed.set_symbol(symbol, self.view.timeframeComboBox.currentText())
+
     def start_price_updater(self):
-        """Bắt đầu cập nhật giá và số dư"""
+        """Bắt đầu cập nhật giá và số dư (một thread dùng chung cho mọi cặp giao dịch)"""
         if self.binance_client.is_connected():
             symbol = self.view.symbolComboBox.currentText()
 
-            # Dừng updater hiện tại nếu có
-            if self.price_updater:
-                self.price_updater.stop()
+            # Thread đã chạy: chỉ chuyển symbol
+            if self.price_updater and self.price_updater.isRunning():
+                self.price_updater.set_symbol(symbol)
+                return
 
-            # Khởi tạo và bắt đầu updater mới
+            # Khởi tạo và bắt đầu updater
             self.price_updater = PriceUpdater(self.binance_client, symbol)
             self.price_updater.price_update.connect(self.update_price)
             self.price_updater.balance_update.connect(self.update_balance)
@@ -163,23 +230,18 @@ class MainController:
 
     def update_price(self, price):
         """Cập nhật giá hiện tại"""
-        # Lưu giá hiện tại vào biến của lớp
-        self.current_price = float(price)
+        # Lưu giá hiện tại vào biến của lớp (PriceUpdater đã gửi giá dạng float)
+        self.current_price = price
 
         # Cập nhật hiển thị giá
         symbol = self.view.symbolComboBox.currentText()
         self.view.update_price_display(price, symbol)
 
-        # Cập nhật dữ liệu giao dịch định kỳ
-        current_time = time.time()
-        if current_time - self.refresh_timer > 60:
-            self.load_trades()
-            self.refresh_timer = current_time
-
-    def update_balance(self, balances):
+    def update_balance(self, balance):
         """Cập nhật thông tin số dư"""
+        self.current_balance = balance
         symbol = self.view.symbolComboBox.currentText()
-        self.view.update_balance_display(balances, symbol)
+        self.view.update_balance_display(balance, symbol)
 
     def toggle_auto_trading(self, state):
         """Bật/tắt chế độ giao dịch tự động an toàn"""
@@ -281,61 +343,25 @@ class MainController:
                 self.view.sellButton.setStyleSheet(self._original_sell_style)
 
     def load_trades(self):
-        """Tải lịch sử giao dịch - Chỉ lấy ID từ local DB và tải thông tin chi tiết từ Binance"""
-        try:
-            # Lấy thông tin IDs giao dịch từ cơ sở dữ liệu
-            local_trades = self.trade_model.get_user_trades(self.username)
-
-            # Nạp dữ liệu chi tiết từ Binance
-            all_trades = []
-            if self.binance_client.is_connected():
-                try:
-                    # Lấy tất cả vị thế và giao dịch hiện tại từ Binance 
-                    binance_trades = self.trade_controller.get_binance_trades()
-
-                    # Tạo từ điển tra cứu nhanh cho các giao dịch Binance dựa trên ID
-                    binance_trades_dict = {str(trade.get('id')): trade for trade in binance_trades}
-
-                    # Cập nhật thông tin chi tiết cho từng ID giao dịch local
-                    for local_trade in local_trades:
-                        trade_id = str(local_trade.get('id', ''))
-
-                        # Nếu có thông tin chi tiết từ Binance, sử dụng nó
-                        if trade_id in binance_trades_dict:
-                            # Bổ sung thông tin từ local vào thông tin Binance
-                            binance_trade = binance_trades_dict[trade_id].copy()
-                            # Giữ lại timestamp và source từ local nếu có
-                            if 'timestamp' in local_trade and local_trade['timestamp']:
-                                binance_trade['timestamp'] = local_trade['timestamp']
-                            if 'source' in local_trade and local_trade['source']:
-                                binance_trade['source'] = local_trade['source']
-
-                            all_trades.append(binance_trade)
-                            # Đánh dấu đã sử dụng
-                            del binance_trades_dict[trade_id]
-                        else:
-                            # Nếu không có thông tin chi tiết, dùng thông tin cơ bản từ local
-                            all_trades.append(local_trade)
-
-                    # Thêm các giao dịch từ Binance không có trong local
-                    all_trades.extend(binance_trades_dict.values())
-
-                except Exception as e:
-                    logging.error(f"Lỗi khi tải dữ liệu giao dịch từ Binance: {e}")
-                    # Nếu lỗi, hiển thị dữ liệu local
-                    all_trades = local_trades
-            else:
-                # Không có kết nối Binance, chỉ hiển thị dữ liệu local
-                all_trades = local_trades
-
-            # Hiển thị lên bảng
-            self.view.update_trades_table(all_trades)
-
-            # Cập nhật lại thời gian làm mới
-            self.refresh_timer = time.time()
+        """Yêu cầu làm mới danh sách giao dịch (đọc SQLite và ghép với Binance trên thread nền)"""
+        self.trade_aggregator.request_refresh(reload_local=True)
+
+    def refresh_summary(self):
+        """Cập nhật phần tổng kết từ bảng thống kê hiệu suất (không đọc lại lịch sử giao dịch)"""
+        summary = self.closed_positions.get_summary(self.username)
+        summary["by_symbol"] = self.closed_positions.get_breakdown(self.username, "symbol")
+        summary["by_strategy"] = self.closed_positions.get_breakdown(self.username, "strategy")
+        self.view.update_summary(summary["total_profit"], summary["win_rate"],
+                                 datetime.datetime.now().strftime("%H:%M:%S"), summary)
+
+    def apply_trade_changes(self, changed, removed):
+        """Nhận các dòng giao dịch thay đổi từ TradeAggregator và cập nhật bảng"""
+        self.view.apply_trade_changes(changed, removed)
+        self.refresh_timer = time.time()
 
-        except Exception as e:
-            logging.error(f"Lỗi khi tải dữ liệu giao dịch: {e}")
+    def apply_pnl_changes(self, trade_ids, values):
+        """Nhận PnL/ROE/khoảng cách SL-TP tính từ giá đánh dấu và cập nhật các ô tương ứng"""
+        self.view.update_trade_pnl(trade_ids, values)
 
     def filter_trades(self, filter_text):
         """Lọc bảng giao dịch"""
@@ -346,12 +372,20 @@ class MainController:
         self.timer = QTimer()
         self.timer.timeout.connect(self.auto_refresh_trades)
 
-        # Lấy cài đặt thời gian làm mới từ settings_model
-        # Thời gian làm mới cửa sổ lệnh là 15s
-        user_settings = self.settings_model.get_user_settings(self.username)
-        refresh_interval = user_settings.get("refresh_interval", 10000)
-        self.timer.start(refresh_interval)
+        # Lấy cài đặt thời gian làm mới từ settings_model (đọc từ bộ nhớ, không truy vấn database)
+        refresh_interval = self.settings_model.get_user_setting(self.username, "refresh_interval")
+        self.timer.start(int(refresh_interval))
+        SettingsModel.add_listener(self._on_setting_changed)
+
+    def _on_setting_changed(self, username, key, value):
+        """Áp dụng ngay thời gian làm mới mới khi người dùng đổi cài đặt"""
+        if username == self.username and key == "refresh_interval":
+            if value is None:
+                value = self.settings_model.get_user_setting(username, key)
+            # Listener chạy trên thread đã lưu cài đặt: đổi timer trên thread giao diện (start(int) là slot,
+            # đặt thời gian mới và chạy lại timer)
+            QMetaObject.invokeMethod(self.timer, "start", Qt.QueuedConnection, Q_ARG(int, int(value)))
 
     def auto_refresh_trades(self):
-            """Tự động làm mới dữ liệu giao dịch"""
-            self.load_trades()
\ No newline at end of file
+            """Tự động làm mới dữ liệu giao dịch (chỉ ghép lại với Binance, giao dịch local được đọc lại khi có ghi)"""
+            self.trade_aggregator.request_refresh()
\ No newline at end of file
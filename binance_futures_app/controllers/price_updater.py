@@ -1,14 +1,25 @@
 import time
+import threading
 from PyQt5.QtCore import QThread, pyqtSignal
+from PyQt5.QtGui import QGuiApplication
 from config.logging_config import setup_logger
 from models import binance_data_singleton
 
 # Tạo logger cho module này
 logger = setup_logger(__name__)
 
+# Tần số làm mới mặc định khi không đọc được tần số màn hình (Hz)
+DEFAULT_REFRESH_RATE = 60.0
+
 class PriceUpdater(QThread):
-    price_update = pyqtSignal(str)
-    balance_update = pyqtSignal(dict)
+    """
+    Chuyển giá và số dư từ BinanceDataModel lên giao diện.
+    Thread ngủ trên Condition cho đến khi cache báo có dữ liệu mới (websocket mark price
+    hoặc thread cập nhật), chỉ phát signal khi giá thực sự thay đổi và gộp các cập nhật
+    trong cùng một khung hình màn hình.
+    """
+    price_update = pyqtSignal(float)
+    balance_update = pyqtSignal(object)  # BalanceSnapshot
     error_signal = pyqtSignal(str)
 
     def __init__(self, binance_client, symbol):
@@ -18,108 +29,140 @@ class PriceUpdater(QThread):
         self.running = True
         # Lấy tham chiếu đến data model
         self.data_model = binance_data_singleton.get_instance()
-        # Thêm biến để kiểm soát tốc độ cập nhật
-        self.price_update_interval = 1.0  # Cập nhật giá mỗi 1 giây
-        self.balance_update_interval = 5.0  # Cập nhật số dư mỗi 5 giây
-        self.last_price_update = 0
-        self.last_balance_update = 0
+
+        # Dữ liệu mới nhất chờ phát lên giao diện (bản sau ghi đè bản trước)
+        self.condition = threading.Condition()
+        self.pending_price = None
+        self.pending_balance = None
+        self.last_price = None
+        self.last_balance = None
+        self.last_emit_time = 0.0
+        # Symbol mới chờ chuyển sang (set_symbol gọi từ thread giao diện)
+        self.pending_symbol = None
         self.error_count = 0
-        self.max_errors = 5  # Số lỗi tối đa trước khi tăng thời gian chờ
+        self.max_errors = 5  # Số lỗi liên tiếp tối đa được báo lên giao diện
+
+        # Khoảng cách tối thiểu giữa hai lần cập nhật giá = một khung hình màn hình
+        refresh_rate = DEFAULT_REFRESH_RATE
+        screen = QGuiApplication.primaryScreen() if QGuiApplication.instance() else None
+        if screen and screen.refreshRate() > 0:
+            refresh_rate = screen.refreshRate()
+        self.frame_interval = 1.0 / refresh_rate
+
+    def _on_data_update(self, kind, payload):
+        """Listener của BinanceDataModel - chạy trên thread websocket/cập nhật, chỉ ghi lại và đánh thức"""
+        if kind == "price":
+            symbol, price = payload
+            if symbol != self.symbol:
+                return
+            with self.condition:
+                self.pending_price = price
+                self.condition.notify()
+        elif kind == "balance":
+            with self.condition:
+                self.pending_balance = payload
+                self.condition.notify()
+
+    def set_symbol(self, symbol):
+        """
+        Chuyển sang cặp giao dịch khác mà không dừng thread.
+        Chỉ ghi lại symbol mới và đánh thức thread; việc hủy/đăng ký stream được làm trên thread này.
+        """
+        with self.condition:
+            if symbol == self.symbol and self.pending_symbol is None:
+                return
+            self.pending_symbol = symbol
+            self.condition.notify()
+
+    def _switch_symbol(self, symbol):
+        """Hủy stream của symbol cũ, đăng ký symbol mới và hiển thị ngay giá đang có trong cache"""
+        old_symbol = self.symbol
+        with self.condition:
+            self.symbol = symbol
+            self.last_price = None
+            self.pending_price = None
+        self.data_model.unsubscribe_price(old_symbol)
+        self.data_model.subscribe_price(symbol)
+
+        cached = self.data_model.get_ticker_price(symbol)
+        if cached is not None:
+            with self.condition:
+                if self.pending_price is None:
+                    self.pending_price = cached
+        logger.info(f"Price updater chuyển từ {old_symbol} sang {symbol}")
 
     def run(self):
-        while self.running:
-            current_time = time.time()
-            
-            try:
-                # Cập nhật giá nếu đến thời điểm
-                if current_time - self.last_price_update >= self.price_update_interval:
-                    self.update_price()
-                    self.last_price_update = current_time
-                
-                # Cập nhật số dư nếu đến thời điểm
-                if current_time - self.last_balance_update >= self.balance_update_interval:
-                    self.update_balance()
-                    self.last_balance_update = current_time
-                
-                # Đặt lại bộ đếm lỗi nếu không có lỗi
-                if self.error_count > 0:
-                    self.error_count -= 1
-                
-            except Exception as e:
-                error_msg = f"Lỗi cập nhật: {e}"
-                logger.error(error_msg)
-                self.error_signal.emit(error_msg)
-                
-                # Tăng bộ đếm lỗi và điều chỉnh khoảng thời gian nếu cần
-                self.error_count += 1
-                if self.error_count > self.max_errors:
-                    # Tăng thời gian cập nhật để giảm tải
-                    self.price_update_interval = min(5.0, self.price_update_interval * 1.5)
-                    self.balance_update_interval = min(30.0, self.balance_update_interval * 1.5)
-                    logger.warning(f"Điều chỉnh thời gian cập nhật: giá {self.price_update_interval}s, số dư {self.balance_update_interval}s")
-                    self.error_count = 0
-            
-            # Ngủ một khoảng thời gian nhỏ để không tiêu tốn CPU
-            time.sleep(0.1)
-
-    def update_price(self):
-        """Cập nhật giá"""
+        self.data_model.add_listener(self._on_data_update)
+        self.data_model.subscribe_price(self.symbol)
         try:
-            # Sử dụng data model để lấy giá
-            price = self.data_model.get_ticker_price(self.symbol)
-            if price:
-                self.price_update.emit(str(price))
-        except Exception as e:
-            logger.error(f"Error updating price: {e}")
-            raise
-
-    def update_balance(self):
-        """Cập nhật số dư"""
-        try:
-            # Sử dụng data model để lấy thông tin tài khoản
-            account_response = self.data_model.get_account_balance()
-            
-            if account_response and 'assets' in account_response:
-                # Tạo dict để lưu số dư
-                balances = {}
-                
-                # Tách base asset từ symbol
-                base_asset = self.symbol.replace('USDT', '')
-                
-                # Lấy số dư của tất cả tài sản
-                for asset in account_response['assets']:
-                    # Lưu thông tin tài sản
-                    asset_name = asset['asset']
-                    wallet_balance = float(asset['walletBalance'])  # Số dư ví
-                    cross_un_pnl = float(asset.get('crossUnPnl', 0))  # Lãi/lỗ chưa thực hiện
-                    available_balance = float(asset.get('availableBalance', 0))  # Số dư khả dụng
-                    
-                    # Chỉ lưu những tài sản có số dư > 0
-                    if wallet_balance > 0 or cross_un_pnl != 0:
-                        balances[asset_name] = {
-                            'wallet_balance': wallet_balance,
-                            'unrealized_pnl': cross_un_pnl,
-                            'available_balance': available_balance
-                        }
-                    
-                    # Lưu số dư USDT
-                    if asset_name == 'USDT':
-                        usdt_balance = wallet_balance
-                
-                # Thêm thông tin tổng vào dict
-                balances['total_usdt'] = usdt_balance
-                
-                # Gửi thông tin số dư
-                self.balance_update.emit(balances)
-        except Exception as e:
-            logger.error(f"Error updating balance: {e}")
-            raise
+            # Hiển thị ngay dữ liệu đang có trong cache
+            with self.condition:
+                self.pending_price = self.data_model.get_ticker_price(self.symbol)
+                self.pending_balance = self.data_model.get_balance_snapshot()
+
+            while self.running:
+                with self.condition:
+                    while (self.running and self.pending_symbol is None and
+                           self.pending_price is None and self.pending_balance is None):
+                        self.condition.wait()
+                    if self.pending_symbol is None and self.pending_price is not None:
+                        # Chưa hết khung hình: chờ nốt để gộp các giá đến sau (giá/số dư mới đánh thức
+                        # sớm thì chờ tiếp tới hết khung hình, chỉ dừng sớm khi phải đổi symbol)
+                        deadline = self.last_emit_time + self.frame_interval
+                        remaining = deadline - time.monotonic()
+                        while self.running and self.pending_symbol is None and remaining > 0:
+                            self.condition.wait(remaining)
+                            remaining = deadline - time.monotonic()
+                    if not self.running:
+                        break
+
+                    symbol, self.pending_symbol = self.pending_symbol, None
+                    if symbol is None:
+                        price, balance = self.pending_price, self.pending_balance
+                        self.pending_price = self.pending_balance = None
+
+                try:
+                    if symbol is not None:
+                        self._switch_symbol(symbol)
+                        continue
+                    if price is not None:
+                        self.update_price(price)
+                    if balance is not None:
+                        self.update_balance(balance)
+                    # Đặt lại bộ đếm lỗi nếu không có lỗi
+                    if self.error_count > 0:
+                        self.error_count -= 1
+                except Exception as e:
+                    error_msg = f"Lỗi cập nhật: {e}"
+                    logger.error(error_msg)
+                    self.error_count += 1
+                    # Chỉ báo lên giao diện max_errors lỗi đầu tiên của một đợt lỗi; lỗi tiếp theo chỉ ghi log
+                    # để tránh spam thanh trạng thái (bộ đếm giảm dần khi cập nhật thành công trở lại)
+                    if self.error_count <= self.max_errors:
+                        self.error_signal.emit(error_msg)
+        finally:
+            self.data_model.unsubscribe_price(self.symbol)
+            self.data_model.remove_listener(self._on_data_update)
+
+    def update_price(self, price):
+        """Phát giá mới nếu khác giá đã hiển thị"""
+        price = float(price)
+        if price == self.last_price:
+            return
+        self.last_price = price
+        self.last_emit_time = time.monotonic()
+        self.price_update.emit(price)
+
+    def update_balance(self, snapshot):
+        """Phát số dư mới (BalanceSnapshot) nếu khác lần trước"""
+        if snapshot is None or snapshot == self.last_balance:
+            return
+        self.last_balance = snapshot
+        self.balance_update.emit(snapshot)
 
     def stop(self):
-        """Dừng thread an toàn"""
+        """Yêu cầu thread dừng - không chờ, thread tự thoát ngay khi được đánh thức"""
         logger.info("Stopping price updater thread")
-        self.running = False
-        self.wait(1000)  # Đợi tối đa 1 giây
-        if self.isRunning():
-            logger.warning("Price updater thread did not stop gracefully, terminating")
-            self.terminate()
\ No newline at end of file
+        with self.condition:
+            self.running = False
+            self.condition.notify()
\ No newline at end of file
@@ -0,0 +1,338 @@
+import time
+import datetime
+import threading
+from PyQt5.QtCore import QThread, pyqtSignal
+from config.logging_config import setup_logger
+from models import binance_data_singleton
+from models.pnl_engine import PnLEngine
+from models.trade_enricher import TradeEnricher
+from models.trade_model import TradeModel
+from models.trade_store import OPEN_STATUSES
+
+# Tạo logger cho module này
+logger = setup_logger(__name__)
+
+# Các sự kiện của BinanceDataModel làm thay đổi danh sách giao dịch
+TRADE_EVENTS = ("positions", "account", "open_orders")
+
+
+def positions_to_trades(positions, account_info, open_orders_for, opened_at=None):
+    """
+    Chuyển các vị thế đang mở của Binance thành dòng giao dịch cho bảng
+
+    Args:
+        positions (list): Kết quả get_position_risk
+        account_info (dict): Thông tin tài khoản (để lấy đòn bẩy)
+        open_orders_for (callable): symbol -> danh sách lệnh đang mở
+        opened_at (dict, optional): ID vị thế -> thời điểm thấy lần đầu, giữ cho thời gian không đổi giữa các lần làm mới
+    """
+    # Tạo dict chứa thông tin đòn bẩy
+    leverage_info = {}
+    if account_info and 'positions' in account_info:
+        leverage_info = {p["symbol"]: int(p["leverage"]) for p in account_info["positions"]}
+
+    now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    binance_trades = []
+
+    for position in positions:
+        # Chỉ xem xét các vị thế có số lượng khác 0
+        position_amount = float(position.get('positionAmt', 0))
+        if position_amount == 0:
+            continue
+
+        symbol = position['symbol']
+        entry_price = float(position['entryPrice'])
+        unrealized_pnl = float(position.get('unRealizedProfit', 0))
+        side = "BUY" if position_amount > 0 else "SELL"
+
+        # Sử dụng ID mặc định trước (sẽ được cập nhật nếu tìm thấy lệnh)
+        position_id = f"POS_{symbol}_{side}"
+        timestamp = now
+        if opened_at is not None:
+            timestamp = opened_at.setdefault(position_id, now)
+
+        trade_info = {
+            'id': position_id,
+            'symbol': symbol,
+            'side': side,
+            'price': entry_price,
+            'quantity': abs(position_amount),
+            'timestamp': timestamp,
+            'status': "OPEN",
+            'pnl': unrealized_pnl,
+            'source': "Binance",
+            'order_type': "Đang mở",
+            'leverage': leverage_info.get(symbol, 1)
+        }
+
+        # Tìm lệnh SL/TP cho vị thế này
+        try:
+            # Lọc lệnh đóng vị thế
+            active_orders = []
+            for order in open_orders_for(symbol):
+                order_side = order.get('side', '')
+                is_closing_order = (side == "BUY" and order_side == "SELL") or (side == "SELL" and order_side == "BUY")
+
+                # Kiểm tra xem lệnh có closePosition=True không
+                is_close_position = order.get('closePosition', False)
+
+                # Nếu không có thuộc tính closePosition, kiểm tra type
+                if not is_close_position:
+                    is_close_position = order.get('type', '') in ["STOP_MARKET", "TAKE_PROFIT_MARKET"]
+
+                # Lệnh phải đang mở (status = NEW)
+                if is_closing_order and order.get('status', '') == 'NEW' and is_close_position:
+                    active_orders.append(order)
+
+            # Nếu tìm thấy lệnh, sử dụng orderId của lệnh đầu tiên làm ID
+            if active_orders:
+                order_id = active_orders[0].get('orderId')
+                if order_id:
+                    trade_info['id'] = str(order_id)
+                    if opened_at is not None:
+                        trade_info['timestamp'] = opened_at.setdefault(trade_info['id'], timestamp)
+
+            # Tìm SL/TP
+            for order in active_orders:
+                order_type = order.get('type', '')
+
+                if order_type == "STOP_MARKET":
+                    sl_price = float(order.get('stopPrice', 0))
+                    # Tính % SL
+                    if side == "BUY":  # Long position
+                        sl_percent = round(((entry_price - sl_price) / entry_price) * 100, 2)
+                    else:  # Short position
+                        sl_percent = round(((sl_price - entry_price) / entry_price) * 100, 2)
+
+                    # Lưu cả giá thực và phần trăm
+                    trade_info['stop_loss'] = f"{sl_price} ({sl_percent}%)"
+
+                elif order_type == "TAKE_PROFIT_MARKET":
+                    tp_price = float(order.get('stopPrice', 0))
+                    # Tính % TP
+                    if side == "BUY":  # Long position
+                        tp_percent = round(((tp_price - entry_price) / entry_price) * 100, 2)
+                    else:  # Short position
+                        tp_percent = round(((entry_price - tp_price) / entry_price) * 100, 2)
+
+                    # Lưu cả giá thực và phần trăm
+                    trade_info['take_profit'] = f"{tp_price} ({tp_percent}%)"
+
+        except Exception as e:
+            logger.error(f"Error finding SL/TP for {symbol}: {e}")
+
+        binance_trades.append(trade_info)
+
+    return binance_trades
+
+
+def merge_trades(local_trades, binance_trades):
+    """Ghép giao dịch local (SQLite) với giao dịch từ Binance theo ID"""
+    binance_trades_dict = {str(trade.get('id')): trade for trade in binance_trades}
+    all_trades = []
+
+    for local_trade in local_trades:
+        trade_id = str(local_trade.get('id', ''))
+
+        # Nếu có thông tin chi tiết từ Binance, sử dụng nó
+        if trade_id in binance_trades_dict:
+            binance_trade = binance_trades_dict.pop(trade_id).copy()
+            # Giữ lại timestamp và source từ local nếu có
+            if local_trade.get('timestamp'):
+                binance_trade['timestamp'] = local_trade['timestamp']
+            if local_trade.get('source'):
+                binance_trade['source'] = local_trade['source']
+            all_trades.append(binance_trade)
+        else:
+            # Nếu không có thông tin chi tiết, dùng thông tin cơ bản từ local
+            all_trades.append(local_trade)
+
+    # Thêm các giao dịch từ Binance không có trong local
+    all_trades.extend(binance_trades_dict.values())
+    return all_trades
+
+
+class TradeAggregator(QThread):
+    """
+    Giữ danh sách giao dịch đã ghép (local + Binance) trên thread nền.
+    Làm mới khi cache của BinanceDataModel báo vị thế/lệnh/tài khoản thay đổi hoặc khi được yêu cầu,
+    và chỉ gửi lên giao diện những dòng thêm/đổi và ID bị xóa. Giao dịch local chỉ được đọc lại từ
+    SQLite khi TradeModel báo bảng trades vừa được ghi (hoặc khi được yêu cầu rõ ràng).
+    Đồng thời nhận giá đẩy của các cặp giao dịch có lệnh đang mở và tính lại PnL trực tiếp bằng PnLEngine.
+    """
+    trades_changed = pyqtSignal(list, list)  # dòng thêm/đổi, ID bị xóa
+    pnl_changed = pyqtSignal(list, object)  # ID, {tên trong LIVE_FIELDS: mảng giá trị}
+    error_signal = pyqtSignal(str)
+
+    def __init__(self, trade_model, username, debounce=0.2, pnl_interval=0.25):
+        super().__init__()
+        self.trade_model = trade_model
+        self.username = username
+        self.data_model = binance_data_singleton.get_instance()
+        self.enricher = TradeEnricher(trade_model, username)
+        self.debounce = debounce  # Gộp các sự kiện đến gần nhau (giây)
+        self.running = True
+
+        self.condition = threading.Condition()
+        self.dirty = True
+        self.reload_local = True
+
+        self.local_trades = []
+        self.published = {}  # ID -> dòng đã gửi lên giao diện
+        self.opened_at = {}  # ID vị thế -> thời điểm thấy lần đầu
+
+        self.pnl_engine = PnLEngine()
+        self.pnl_interval = pnl_interval  # Khoảng cách tối thiểu giữa hai lần gửi PnL (giây)
+        self.prices_dirty = False
+        self.last_pnl_publish = 0.0
+        self.price_symbols = set()  # Các cặp giao dịch đang đăng ký giá đẩy
+
+    def _on_data_update(self, kind, payload):
+        """Listener của BinanceDataModel - chỉ đánh dấu cần làm mới"""
+        if kind in TRADE_EVENTS:
+            self.request_refresh()
+        elif kind == "price":
+            symbol, price = payload
+            with self.condition:
+                if self.pnl_engine.set_mark(symbol, price):
+                    self.prices_dirty = True
+                    self.condition.notify()
+
+    def _on_trades_written(self, username):
+        """Listener của TradeModel - giao dịch local phải đọc lại ở lần làm mới tới"""
+        if username is None or username == self.username:
+            self.request_refresh(reload_local=True)
+
+    def request_refresh(self, reload_local=False):
+        """Yêu cầu làm mới (gọi được từ mọi thread, không chờ)"""
+        with self.condition:
+            self.dirty = True
+            self.reload_local = self.reload_local or reload_local
+            self.condition.notify()
+
+    def run(self):
+        self.data_model.add_listener(self._on_data_update)
+        TradeModel.add_listener(self._on_trades_written)
+        try:
+            while self.running:
+                with self.condition:
+                    while self.running and not self.dirty and not self.prices_dirty:
+                        self.condition.wait()
+                    if not self.running:
+                        break
+                    if not self.dirty:
+                        # Chỉ có giá mới: gửi PnL, tối đa một lần mỗi pnl_interval
+                        remaining = self.last_pnl_publish + self.pnl_interval - time.monotonic()
+                        while self.running and not self.dirty and remaining > 0:
+                            self.condition.wait(remaining)
+                            remaining = self.last_pnl_publish + self.pnl_interval - time.monotonic()
+                        if not self.dirty:
+                            self._publish_pnl()
+                            continue
+                    # Chờ thêm một chút để gộp các sự kiện positions/account/open_orders của cùng một lần cập nhật
+                    deadline = time.monotonic() + self.debounce
+                    remaining = self.debounce
+                    while self.running and remaining > 0:
+                        self.condition.wait(remaining)
+                        remaining = deadline - time.monotonic()
+                    reload_local = self.reload_local
+                    self.dirty = self.reload_local = False
+
+                try:
+                    self._refresh(reload_local)
+                except Exception as e:
+                    error_msg = f"Lỗi khi tổng hợp giao dịch: {e}"
+                    logger.error(error_msg)
+                    self.error_signal.emit(error_msg)
+        finally:
+            self.data_model.remove_listener(self._on_data_update)
+            TradeModel.remove_listener(self._on_trades_written)
+            for symbol in self.price_symbols:
+                self.data_model.unsubscribe_price(symbol)
+            self.price_symbols = set()
+
+    def _refresh(self, reload_local):
+        if reload_local:
+            try:
+                self.local_trades = self.trade_model.get_user_trades(self.username)
+            except Exception as e:
+                logger.error(f"Lỗi khi đọc giao dịch local: {e}")
+            # Thông tin khớp lệnh tra từ account_trades (HistorySync đồng bộ), không gọi API
+            self.local_trades = self.enricher.enrich(self.local_trades)
+
+        binance_trades = []
+        if self.data_model.is_connected():
+            binance_trades = positions_to_trades(
+                self.data_model.get_positions(),
+                self.data_model.get_account_balance(),
+                self.data_model.get_open_orders,
+                self.opened_at
+            )
+
+        trades = self._apply_live_pnl(merge_trades(self.local_trades, binance_trades),
+                                      {str(trade['id']) for trade in binance_trades})
+        current = {str(trade.get('id', '')): trade for trade in trades}
+
+        changed = [trade for trade_id, trade in current.items() if self.published.get(trade_id) != trade]
+        removed = [trade_id for trade_id in self.published if trade_id not in current]
+
+        # Chỉ giữ thời điểm mở của các dòng còn hiển thị
+        self.opened_at = {trade_id: opened for trade_id, opened in self.opened_at.items() if trade_id in current}
+
+        self.published = current
+        if changed or removed:
+            logger.debug(f"Giao dịch thay đổi: {len(changed)} dòng, xóa {len(removed)}")
+            self.trades_changed.emit(changed, removed)
+
+        with self.condition:
+            self._publish_pnl()
+
+    def _apply_live_pnl(self, trades, position_ids=()):
+        """
+        Nạp các dòng đang mở vào PnLEngine, đồng bộ đăng ký giá đẩy và thay PnL của
+        các dòng đó bằng PnL tính từ giá đánh dấu mới nhất (nếu đã có giá)
+
+        Args:
+            position_ids (set): ID các dòng lấy từ vị thế Binance. Vị thế (symbol, chiều) đã có dòng
+                từ Binance thì chỉ dòng đó được tính PnL; giao dịch local cùng vị thế không tính thêm lần nữa
+        """
+        open_trades = [trade for trade in trades if trade.get('status') in OPEN_STATUSES]
+        positions = {(trade.get('symbol'), trade.get('side')) for trade in open_trades
+                     if str(trade.get('id', '')) in position_ids}
+        open_trades = [trade for trade in open_trades
+                       if str(trade.get('id', '')) in position_ids
+                       or (trade.get('symbol'), trade.get('side')) not in positions]
+        with self.condition:
+            symbols = self.pnl_engine.set_positions(open_trades)
+            # Giá đánh dấu ban đầu lấy từ vị thế trong cache, chỉ cho cặp giao dịch chưa có giá đẩy
+            # (giá trong cache REST có thể cũ hơn giá đẩy đang giữ)
+            for position in self.data_model.get_positions() or []:
+                mark_price = float(position.get('markPrice', 0) or 0)
+                if mark_price > 0:
+                    self.pnl_engine.seed_mark(position.get('symbol'), mark_price)
+            live_pnl = self.pnl_engine.live_pnl()
+
+        for symbol in symbols - self.price_symbols:
+            self.data_model.subscribe_price(symbol)
+        for symbol in self.price_symbols - symbols:
+            self.data_model.unsubscribe_price(symbol)
+        self.price_symbols = symbols
+
+        if not live_pnl:
+            return trades
+        return [dict(trade, pnl=live_pnl[trade_id]) if trade_id in live_pnl else trade
+                for trade_id, trade in ((str(trade.get('id', '')), trade) for trade in trades)]
+
+    def _publish_pnl(self):
+        """Gửi các giá trị PnL/ROE/khoảng cách SL-TP đã đổi (gọi khi đang giữ condition)"""
+        self.prices_dirty = False
+        self.last_pnl_publish = time.monotonic()
+        trade_ids, values = self.pnl_engine.changes()
+        if trade_ids:
+            self.pnl_changed.emit(trade_ids, values)
+
+    def stop(self):
+        """Yêu cầu thread dừng - không chờ"""
+        with self.condition:
+            self.running = False
+            self.condition.notify()
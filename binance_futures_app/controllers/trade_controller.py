@@ -7,6 +7,7 @@ from binance.error import ClientError
 import logging
 from models import binance_data_singleton
 from .auto_trader import AutoTrader
+from .trade_aggregator import positions_to_trades
 
 # Tạo logger cho module này
 logger = setup_logger(__name__)
@@ -68,19 +69,18 @@ class TradeController(QObject):
             )
 
             if success:
-                # Lưu thông tin giao dịch với đòn bẩy
+                # Lưu thông tin giao dịch (giá, số lượng, đòn bẩy, SL/TP)
                 # Kết quả từ place_order() đã được chuyển đổi sang múi giờ +7
-                minimal_trade_info = {
+                trade_info = dict(result)
+                trade_info.update({
                     'id': result.get('id', str(int(time.time()))),
-                    'symbol': symbol,
-                    'side': side,
                     'source': 'Manual',
-                    'leverage': leverage,  # Thêm thông tin đòn bẩy
+                    'leverage': leverage,
                     'timestamp': result.get('timestamp', datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"))  # Sử dụng thời gian đã được chuyển đổi
-                }
+                })
 
                 # Lưu vào model
-                self.trade_model.add_trade(self.username, minimal_trade_info)
+                self.trade_model.add_trade(self.username, trade_info)
 
                 # Cập nhật giao diện
                 self.view.show_message(
@@ -125,6 +125,9 @@ class TradeController(QObject):
             
             # Kết nối tín hiệu đóng vị thế mới
             self.auto_trader.close_position_signal.connect(self.close_position)
+
+            # Đường chỉ báo của chiến lược lên biểu đồ
+            self.auto_trader.indicator_update.connect(self.view.update_chart_indicators)
             
             # Bắt đầu thread
             self.auto_trader.start()
@@ -185,118 +188,17 @@ class TradeController(QObject):
 
     # Lấy thông tin giao dịch
     def get_binance_trades(self):
-        """Lấy lịch sử giao dịch từ Binance API"""
+        """Lấy các vị thế đang mở từ cache của BinanceDataModel dưới dạng dòng giao dịch"""
         if not self.binance_client.is_connected():
             logger.warning("Cannot connect to Binance API - Check API key and secret")
             return []
         
         try:
-            # Lấy vị thế đang mở từ BinanceDataModel
-            positions = self.data_model.get_positions()
-            # Lấy thông tin tài khoản để đảm bảo có đòn bẩy
-            account_info = self.data_model.get_account_balance()
-            
-            # Tạo dict chứa thông tin đòn bẩy
-            leverage_info = {}
-            if account_info and 'positions' in account_info:
-                leverage_info = {p["symbol"]: int(p["leverage"]) for p in account_info["positions"]}
-            
-            binance_trades = []
-            
-            for position in positions:
-                # Chỉ xem xét các vị thế có số lượng khác 0
-                position_amount = float(position.get('positionAmt', 0))
-                if position_amount == 0:
-                    continue
-                
-                symbol = position['symbol']
-                entry_price = float(position['entryPrice'])
-                unrealized_pnl = float(position.get('unRealizedProfit', 0))
-                side = "BUY" if position_amount > 0 else "SELL"
-                
-                # Sử dụng ID mặc định trước (sẽ được cập nhật nếu tìm thấy lệnh)
-                position_id = f"POS_{symbol}_{side}"
-                
-                # Đòn bẩy
-                leverage = leverage_info.get(symbol, 1)
-                
-                trade_info = {
-                    'id': position_id,
-                    'symbol': symbol,
-                    'side': side,
-                    'price': entry_price,
-                    'quantity': abs(position_amount),
-                    'timestamp': datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                    'status': "OPEN",
-                    'pnl': unrealized_pnl,
-                    'source': "Binance",
-                    'order_type': "Đang mở",
-                    'leverage': leverage
-                }
-                
-                # Tìm lệnh SL/TP cho vị thế này
-                try:
-                    # Lấy lệnh đang mở cho symbol
-                    open_orders = self.data_model.get_open_orders(symbol)
-                    
-                    # Lọc lệnh đóng vị thế
-                    active_orders = []
-                    for order in open_orders:
-                        order_side = order.get('side', '')
-                        is_closing_order = (side == "BUY" and order_side == "SELL") or (side == "SELL" and order_side == "BUY")
-                        
-                        # Kiểm tra xem lệnh có closePosition=True không
-                        is_close_position = order.get('closePosition', False)
-                        
-                        # Nếu không có thuộc tính closePosition, kiểm tra type
-                        if not is_close_position:
-                            order_type = order.get('type', '')
-                            is_close_position = order_type in ["STOP_MARKET", "TAKE_PROFIT_MARKET"]
-                        
-                        # Lệnh phải đang mở (status = NEW)
-                        if is_closing_order and order.get('status', '') == 'NEW' and is_close_position:
-                            active_orders.append(order)
-                    
-                    # Nếu tìm thấy lệnh, sử dụng orderId của lệnh đầu tiên làm ID
-                    if active_orders:
-                        # Sử dụng orderId của lệnh đầu tiên
-                        order_id = active_orders[0].get('orderId')
-                        if order_id:
-                            trade_info['id'] = str(order_id)
-                    
-                    # Tìm SL/TP
-                    for order in active_orders:
-                        order_type = order.get('type', '')
-                        
-                        if order_type == "STOP_MARKET":
-                            sl_price = float(order.get('stopPrice', 0))
-                            # Tính % SL
-                            if side == "BUY":  # Long position
-                                sl_percent = round(((entry_price - sl_price) / entry_price) * 100, 2)
-                            else:  # Short position
-                                sl_percent = round(((sl_price - entry_price) / entry_price) * 100, 2)
-                                
-                            # Lưu cả giá thực và phần trăm
-                            trade_info['stop_loss'] = f"{sl_price} ({sl_percent}%)"
-                            
-                        elif order_type == "TAKE_PROFIT_MARKET":
-                            tp_price = float(order.get('stopPrice', 0))
-                            # Tính % TP
-                            if side == "BUY":  # Long position
-                                tp_percent = round(((tp_price - entry_price) / entry_price) * 100, 2)
-                            else:  # Short position
-                                tp_percent = round(((entry_price - tp_price) / entry_price) * 100, 2)
-                                
-                            # Lưu cả giá thực và phần trăm
-                            trade_info['take_profit'] = f"{tp_price} ({tp_percent}%)"
-                
-                except Exception as e:
-                    logger.error(f"Error finding SL/TP for {symbol}: {e}")
-                
-                binance_trades.append(trade_info)
-            
-            return binance_trades
-            
+            return positions_to_trades(
+                self.data_model.get_positions(),
+                self.data_model.get_account_balance(),
+                self.data_model.get_open_orders
+            )
         except Exception as e:
             logger.error(f"Overall error fetching data from Binance: {e}", exc_info=True)
             return []
@@ -346,17 +248,7 @@ class TradeController(QObject):
     def disable_close_button(self, trade_id):
         """Vô hiệu hóa nút đóng vị thế cho giao dịch có ID cụ thể"""
         try:
-            # Tìm và vô hiệu hóa nút trong bảng giao dịch
-            for row in range(self.view.tradeTable.rowCount()):
-                item = self.view.tradeTable.item(row, 0)  # Cột ID
-                if item and item.text() == str(trade_id):
-                    # Tìm thấy hàng có ID trùng khớp
-                    button = self.view.tradeTable.cellWidget(row, 11)  # Cột Trạng thái/Hành động
-                    if button:
-                        button.setEnabled(False)
-                        button.setText("Đang đóng...")
-                        button.setStyleSheet("background-color: #7f8c8d; color: white;")
-                    break
+            self.view.set_trade_closing(trade_id)
         except Exception as e:
             logger.error(f"Error disabling close button: {e}")
 
@@ -407,10 +299,6 @@ class TradeController(QObject):
     def remove_position_from_table(self, trade_id):
         """Xóa vị thế khỏi bảng hiển thị ngay lập tức"""
         try:
-            for row in range(self.view.tradeTable.rowCount()):
-                item = self.view.tradeTable.item(row, 0)  # Cột ID
-                if item and item.text() == str(trade_id):
-                    self.view.tradeTable.removeRow(row)
-                    break
+            self.view.remove_trade_row(trade_id)
         except Exception as e:
             logger.error(f"Error removing position from table: {e}")
\ No newline at end of file
@@ -76,13 +76,21 @@ def main():
     login_controller.show()
 
     # Chạy ứng dụng
-    return app.exec_()
+    exit_code = app.exec_()
+
+    # Các thread nền đã dừng hẳn trong aboutToQuit (MainController.shutdown).
+    # Ghi nốt các giao dịch trong hàng đợi ghi trễ, sau đó đóng các kết nối database dùng chung
+    from utils.write_behind import close_journals
+    from utils.database_manager import DatabaseManager
+    close_journals()
+    DatabaseManager.close_all()
+    return exit_code
 
 def initialize_database():
     """Khởi tạo cơ sở dữ liệu SQLite."""
     from utils.database_manager import DatabaseManager
     db_manager = DatabaseManager()
-    # DatabaseManager đã tự động tạo bảng trong __init__ nên không cần gọi create_tables()
+    # DatabaseManager tạo bảng một lần trong tiến trình (lần khởi tạo đầu tiên), các model sau dùng lại
 
 if __name__ == "__main__":
     try:
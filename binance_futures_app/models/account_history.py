@@ -0,0 +1,211 @@
+"""
+Lịch sử khớp lệnh và thu nhập của tài khoản Binance lưu trong SQLite.
+
+HistorySync ghi dữ liệu vào đây theo từng trang cùng với vị trí đã đồng bộ (trong cùng một
+transaction), nên lần chạy sau tiếp tục từ đúng chỗ đã dừng. Các truy vấn lịch sử/PnL đọc hoàn
+toàn từ database, không gọi API.
+"""
+import datetime
+from config.logging_config import setup_logger
+from models.closed_positions import ClosedPositionStore
+from utils.database_manager import DatabaseManager
+
+# Tạo logger cho module này
+logger = setup_logger(__name__)
+
+# Tên các luồng dữ liệu trong sync_cursors
+STREAM_TRADES = "trades"
+STREAM_INCOME = "income"
+
+
+class AccountHistoryStore:
+    def __init__(self, db=None):
+        self.db = db or DatabaseManager()
+        self.closed_positions = ClosedPositionStore(self.db)
+
+    def get_cursor(self, username, stream, symbol=""):
+        """Vị trí đã đồng bộ (ID khớp lệnh hoặc thời điểm ms), None nếu chưa đồng bộ"""
+        row = self.db.fetch_one(
+            "SELECT position FROM sync_cursors WHERE username = ? AND stream = ? AND symbol = ?",
+            (username, stream, symbol)
+        )
+        return row[0] if row else None
+
+    def get_trade_cursors(self, username):
+        """cặp giao dịch -> ID khớp lệnh cuối đã đồng bộ"""
+        rows = self.db.fetch_all(
+            "SELECT symbol, position FROM sync_cursors WHERE username = ? AND stream = ?",
+            (username, STREAM_TRADES)
+        )
+        return {row[0]: row[1] for row in rows}
+
+    def _set_cursor(self, conn, username, stream, symbol, position):
+        conn.execute("""
+            INSERT INTO sync_cursors (username, stream, symbol, position, updated_at)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (username, stream, symbol) DO UPDATE
+            SET position = MAX(position, excluded.position), updated_at = excluded.updated_at
+        """, (username, stream, symbol, position, datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+
+    def save_trades(self, username, symbol, fills):
+        """
+        Lưu một trang userTrades, ghi các vị thế vừa đóng và dời vị trí đồng bộ của cặp giao dịch tới ID lớn nhất
+
+        Returns:
+            int: Số lần khớp lệnh mới được lưu, None nếu lỗi
+        """
+        if not fills:
+            return 0
+        rows = [(
+            username, symbol, int(fill['id']), str(fill.get('orderId', '')), fill.get('side'),
+            fill.get('positionSide'), float(fill.get('price', 0)), float(fill.get('qty', 0)),
+            float(fill.get('quoteQty', 0)), float(fill.get('realizedPnl', 0)),
+            float(fill.get('commission', 0)), fill.get('commissionAsset'),
+            1 if fill.get('maker') else 0, int(fill.get('time', 0))
+        ) for fill in fills]
+        try:
+            with self.db.transaction() as conn:
+                cursor = conn.executemany("""
+                    INSERT OR IGNORE INTO account_trades (
+                        username, symbol, id, order_id, side, position_side, price, qty, quote_qty,
+                        realized_pnl, commission, commission_asset, maker, time
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """, rows)
+                saved = cursor.rowcount
+                self.closed_positions.record_fills(conn, username, symbol, fills)
+                self._set_cursor(conn, username, STREAM_TRADES, symbol, max(row[2] for row in rows))
+            return saved
+        except Exception as e:
+            logger.error(f"Lỗi khi lưu lịch sử khớp lệnh {symbol}: {e}")
+            return None
+
+    def save_income(self, username, records, position):
+        """
+        Lưu một trang lịch sử thu nhập và đặt vị trí đồng bộ (ms) của luồng income
+
+        Returns:
+            int: Số bản ghi mới được lưu, None nếu lỗi
+        """
+        rows = [(
+            username, int(record['tranId']), record.get('incomeType', ''), record.get('symbol', ''),
+            float(record.get('income', 0)), record.get('asset'), record.get('info'),
+            str(record.get('tradeId') or ''), int(record.get('time', 0))
+        ) for record in records]
+        try:
+            with self.db.transaction() as conn:
+                cursor = conn.executemany("""
+                    INSERT OR IGNORE INTO income_history (
+                        username, tran_id, income_type, symbol, income, asset, info, trade_id, time
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """, rows)
+                self._set_cursor(conn, username, STREAM_INCOME, "", position)
+            return cursor.rowcount
+        except Exception as e:
+            logger.error(f"Lỗi khi lưu lịch sử thu nhập: {e}")
+            return None
+
+    def pending_trade_symbols(self, username, since=None):
+        """
+        Các cặp giao dịch có khớp lệnh (theo tradeId trong lịch sử thu nhập) chưa được đồng bộ
+
+        Args:
+            since (int, optional): Chỉ xét thu nhập từ thời điểm này (ms)
+
+        Returns:
+            dict: cặp giao dịch -> ID khớp lệnh nhỏ nhất cần đọc
+        """
+        query = """
+            SELECT i.symbol, MIN(CAST(i.trade_id AS INTEGER)), MAX(CAST(i.trade_id AS INTEGER)), c.position
+            FROM income_history i
+            LEFT JOIN sync_cursors c ON c.username = i.username AND c.stream = ? AND c.symbol = i.symbol
+            WHERE i.username = ? AND i.trade_id != '' AND i.symbol != ''
+        """
+        params = [STREAM_TRADES, username]
+        if since is not None:
+            query += " AND i.time >= ?"
+            params.append(since)
+        query += " GROUP BY i.symbol"
+
+        pending = {}
+        for symbol, first_id, last_id, position in self.db.fetch_all(query, params):
+            if position is None:
+                pending[symbol] = first_id
+            elif last_id > position:
+                pending[symbol] = position + 1
+        return pending
+
+    def get_trades(self, username, symbol=None, start_time=None, end_time=None, limit=None):
+        """Các lần khớp lệnh đã đồng bộ, mới nhất trước"""
+        query = "SELECT * FROM account_trades WHERE username = ?"
+        params = [username]
+        if symbol:
+            query += " AND symbol = ?"
+            params.append(symbol)
+        if start_time is not None:
+            query += " AND time >= ?"
+            params.append(start_time)
+        if end_time is not None:
+            query += " AND time <= ?"
+            params.append(end_time)
+        query += " ORDER BY time DESC"
+        if limit:
+            query += " LIMIT ?"
+            params.append(limit)
+        return [dict(row) for row in self.db.fetch_all(query, params)]
+
+    def get_order_fills(self, username, order_id):
+        """Các lần khớp của một lệnh"""
+        rows = self.db.fetch_all(
+            "SELECT * FROM account_trades WHERE username = ? AND order_id = ? ORDER BY id",
+            (username, str(order_id))
+        )
+        return [dict(row) for row in rows]
+
+    def get_order_totals(self, username, order_ids, chunk_size=500):
+        """
+        Tổng các lần khớp đã đồng bộ theo lệnh
+
+        Returns:
+            dict: orderId -> {"qty", "quote", "commission", "commission_asset"}
+        """
+        order_ids = [str(order_id) for order_id in order_ids]
+        totals = {}
+        for start in range(0, len(order_ids), chunk_size):
+            chunk = order_ids[start:start + chunk_size]
+            rows = self.db.fetch_all(f"""
+                SELECT order_id, SUM(qty), SUM(quote_qty), SUM(commission), MAX(commission_asset)
+                FROM account_trades
+                WHERE username = ? AND order_id IN ({", ".join("?" for _ in chunk)})
+                GROUP BY order_id
+            """, [username] + chunk)
+            for order_id, qty, quote, commission, commission_asset in rows:
+                totals[order_id] = {"qty": qty or 0.0, "quote": quote or 0.0, "commission": commission or 0.0,
+                                    "commission_asset": commission_asset}
+        return totals
+
+    def income_summary(self, username, start_time=None, end_time=None):
+        """
+        Tổng thu nhập theo cặp giao dịch và loại thu nhập trong một khoảng thời gian
+
+        Returns:
+            dict: cặp giao dịch -> {loại thu nhập (REALIZED_PNL, COMMISSION, FUNDING_FEE...): tổng}
+        """
+        query = "SELECT symbol, income_type, SUM(income) FROM income_history WHERE username = ?"
+        params = [username]
+        if start_time is not None:
+            query += " AND time >= ?"
+            params.append(start_time)
+        if end_time is not None:
+            query += " AND time <= ?"
+            params.append(end_time)
+        query += " GROUP BY symbol, income_type"
+
+        summary = {}
+        for symbol, income_type, total in self.db.fetch_all(query, params):
+            summary.setdefault(symbol, {})[income_type] = total
+        return summary
+
+    def realized_pnl(self, username, start_time=None, end_time=None):
+        """PnL ròng (lãi/lỗ đã thực hiện + phí + funding) theo cặp giao dịch"""
+        return {symbol: sum(totals.values())
+                for symbol, totals in self.income_summary(username, start_time, end_time).items() if symbol}
@@ -0,0 +1,216 @@
+import time
+import numpy as np
+
+from config.logging_config import setup_logger
+from utils.helpers import format_timestamp
+from utils.indicators import METHOD_BASELINE, klines_to_arrays, generate_signals
+
+# Tạo logger cho module này
+logger = setup_logger(__name__)
+
+# Phí taker mặc định của Binance Futures (0.04%)
+DEFAULT_FEE_RATE = 0.0004
+# Trượt giá mặc định cho lệnh MARKET (0.02%)
+DEFAULT_SLIPPAGE = 0.0002
+
+
+class Backtester:
+    """
+    Kiểm thử chiến lược trên dữ liệu nến lịch sử (offline).
+
+    Tín hiệu được sinh bằng cùng một hàm với AutoTrader (utils.indicators), sau đó
+    được khớp lệnh mô phỏng theo đúng luồng của AutoTrader:
+    - Chỉ mở vị thế khi chưa có vị thế, giá khớp là giá đóng cửa của nến có tín hiệu
+    - Đóng vị thế khi có tín hiệu đóng, hoặc khi chạm stop loss / giá thanh lý trong nến
+    - Khối lượng = amount / giá (giống calculate_order_quantity), ký quỹ = amount / leverage
+    """
+
+    def __init__(self, trading_method=METHOD_BASELINE, amount=100.0, leverage=1, stop_loss=0,
+                 stop_loss_percent=0, fee_rate=DEFAULT_FEE_RATE, slippage=DEFAULT_SLIPPAGE,
+                 initial_balance=1000.0, strategy_params=None, symbol=""):
+        self.trading_method = trading_method
+        self.amount = amount
+        self.leverage = max(1, int(leverage))
+        self.stop_loss = stop_loss  # Giá stop loss thực (như execute_trade), 0 = không dùng
+        self.stop_loss_percent = stop_loss_percent  # Stop loss theo % giá vào lệnh, 0 = không dùng
+        self.fee_rate = fee_rate
+        self.slippage = slippage
+        self.initial_balance = initial_balance
+        self.strategy_params = strategy_params or {}
+        self.symbol = symbol
+
+    def run(self, data):
+        """
+        Chạy backtest
+
+        Args:
+            data (dict | list): Dữ liệu nến dạng mảng (open_time, open, high, low, close, close_time)
+                                hoặc list nến trả về từ Binance
+
+        Returns:
+            dict: trades (list), equity_curve (np.ndarray), equity_time (np.ndarray), stats (dict)
+        """
+        started = time.perf_counter()
+
+        arrays = klines_to_arrays(data)
+        signals = generate_signals(self.trading_method, arrays, self.strategy_params)
+        result = self.simulate(arrays, signals)
+
+        result["stats"]["elapsed"] = time.perf_counter() - started
+        logger.info(f"Backtest {self.symbol} {self.trading_method}: {len(arrays['close'])} nến, "
+                    f"{result['stats']['total_trades']} lệnh trong {result['stats']['elapsed']:.3f}s")
+        return result
+
+    def run_from_store(self, store, interval, start_time=None, end_time=None):
+        """Chạy backtest trực tiếp trên dữ liệu nến trong KlineStore (đọc qua memmap)"""
+        return self.run(store.load(self.symbol, interval, start_time, end_time))
+
+    def _stop_price(self, entry_price, direction):
+        """Xác định giá stop loss cho vị thế, None nếu không dùng hoặc không hợp lệ"""
+        if self.stop_loss and self.stop_loss > 0:
+            stop_price = float(self.stop_loss)
+            # Binance từ chối lệnh STOP_MARKET sẽ kích hoạt ngay lập tức
+            if (direction > 0 and stop_price >= entry_price) or (direction < 0 and stop_price <= entry_price):
+                return None
+            return stop_price
+
+        if self.stop_loss_percent and self.stop_loss_percent > 0:
+            return entry_price * (1 - direction * self.stop_loss_percent / 100)
+
+        return None
+
+    def simulate(self, arrays, signals):
+        """Khớp lệnh mô phỏng từ các mảng tín hiệu đã tính sẵn"""
+        open_ = arrays["open"]
+        high = arrays["high"]
+        low = arrays["low"]
+        close = arrays["close"]
+        times = arrays.get("close_time", arrays["open_time"])
+        n = len(close)
+
+        signal = signals["signal"]
+        entries = np.flatnonzero(signal)
+        close_long_idx = np.flatnonzero(signals["close_long"])
+        close_short_idx = np.flatnonzero(signals["close_short"])
+
+        realized = np.zeros(n)
+        unrealized = np.zeros(n)
+        trades = []
+        start = 0
+
+        while True:
+            k = np.searchsorted(entries, start)
+            if k >= len(entries):
+                break
+            e = int(entries[k])
+            if e >= n - 1:
+                break  # Không còn nến để theo dõi vị thế
+
+            direction = int(signal[e])
+            entry_price = float(close[e]) * (1 + direction * self.slippage)
+            quantity = self.amount / float(close[e])
+            entry_fee = entry_price * quantity * self.fee_rate
+
+            # Nến có tín hiệu đóng vị thế đầu tiên sau khi vào lệnh
+            exit_candidates = close_long_idx if direction > 0 else close_short_idx
+            c = np.searchsorted(exit_candidates, e, side="right")
+            if c < len(exit_candidates):
+                close_bar, exit_reason = int(exit_candidates[c]), "SIGNAL"
+            else:
+                close_bar, exit_reason = n - 1, "END"
+
+            # Mức bảo vệ gần giá vào lệnh nhất giữa stop loss và giá thanh lý
+            level = entry_price * (1 - direction / self.leverage)
+            level_reason = "LIQUIDATION"
+            stop_price = self._stop_price(entry_price, direction)
+            if stop_price is not None and (stop_price - level) * direction > 0:
+                level, level_reason = stop_price, "STOP_LOSS"
+
+            if direction > 0:
+                hits = np.flatnonzero(low[e + 1:close_bar + 1] <= level)
+            else:
+                hits = np.flatnonzero(high[e + 1:close_bar + 1] >= level)
+
+            if hits.size:
+                x = e + 1 + int(hits[0])
+                exit_reason = level_reason
+                # Nếu giá mở cửa đã vượt qua mức stop (gap), lệnh khớp tại giá mở cửa
+                raw_exit = min(float(open_[x]), level) if direction > 0 else max(float(open_[x]), level)
+            else:
+                x = close_bar
+                raw_exit = float(close[x])
+
+            exit_price = raw_exit * (1 - direction * self.slippage)
+            exit_fee = exit_price * quantity * self.fee_rate
+            pnl = (exit_price - entry_price) * quantity * direction - entry_fee - exit_fee
+
+            realized[x] += pnl
+            unrealized[e:x] = (close[e:x] - entry_price) * quantity * direction - entry_fee
+
+            trades.append({
+                'symbol': self.symbol,
+                'side': "BUY" if direction > 0 else "SELL",
+                'price': entry_price,
+                'exit_price': exit_price,
+                'quantity': quantity,
+                'leverage': self.leverage,
+                'stop_loss': stop_price or 0,
+                'entry_time': format_timestamp(int(times[e])),
+                'exit_time': format_timestamp(int(times[x])),
+                'entry_index': e,
+                'exit_index': x,
+                'fee': entry_fee + exit_fee,
+                'pnl': pnl,
+                'exit_reason': exit_reason,
+                'status': "CLOSED" if exit_reason != "END" else "OPEN",
+                'source': f"Backtest ({self.trading_method})"
+            })
+
+            if exit_reason == "END":
+                break
+            # AutoTrader có thể mở vị thế mới ngay trong lần phân tích sau khi đóng
+            start = x
+
+        equity = self.initial_balance + np.cumsum(realized) + unrealized
+        return {
+            "trades": trades,
+            "equity_curve": equity,
+            "equity_time": np.asarray(times),
+            "stats": self.calculate_stats(trades, equity)
+        }
+
+    def calculate_stats(self, trades, equity):
+        """Tính các chỉ số thống kê của kết quả backtest"""
+        pnls = np.array([t['pnl'] for t in trades], dtype=np.float64)
+        wins = pnls[pnls > 0]
+        losses = pnls[pnls < 0]
+
+        gross_profit = float(wins.sum())
+        gross_loss = float(-losses.sum())
+        if gross_loss > 0:
+            profit_factor = gross_profit / gross_loss
+        else:
+            profit_factor = float("inf") if gross_profit > 0 else 0.0
+
+        max_drawdown = 0.0
+        if len(equity):
+            running_max = np.maximum.accumulate(equity)
+            max_drawdown = float(np.max((running_max - equity) / running_max) * 100)
+
+        final_balance = float(equity[-1]) if len(equity) else self.initial_balance
+        return {
+            "total_trades": len(trades),
+            "winning_trades": int(wins.size),
+            "losing_trades": int(losses.size),
+            "win_rate": float(wins.size / len(pnls) * 100) if len(pnls) else 0.0,
+            "net_profit": float(pnls.sum()),
+            "gross_profit": gross_profit,
+            "gross_loss": gross_loss,
+            "profit_factor": profit_factor,
+            "average_pnl": float(pnls.mean()) if len(pnls) else 0.0,
+            "total_fees": float(sum(t['fee'] for t in trades)),
+            "max_drawdown": max_drawdown,
+            "initial_balance": self.initial_balance,
+            "final_balance": final_balance,
+            "return_percent": (final_balance - self.initial_balance) / self.initial_balance * 100
+        }
@@ -0,0 +1,69 @@
+"""
+Ảnh chụp số dư tài khoản đã được phân tích sẵn.
+
+Phản hồi account của Binance được chuyển một lần (khi cache cập nhật) thành các đối tượng
+gọn có __slots__ và một mã băm nội dung, để giao diện chỉ vẽ lại khi số dư thực sự thay đổi.
+"""
+
+
+class AssetBalance:
+    """Số dư của một tài sản"""
+    __slots__ = ("asset", "wallet_balance", "unrealized_pnl", "available_balance")
+
+    def __init__(self, asset, wallet_balance, unrealized_pnl, available_balance):
+        self.asset = asset
+        self.wallet_balance = wallet_balance  # Số dư ví
+        self.unrealized_pnl = unrealized_pnl  # Lãi/lỗ chưa thực hiện
+        self.available_balance = available_balance  # Số dư khả dụng
+
+    def key(self):
+        return (self.asset, self.wallet_balance, self.unrealized_pnl, self.available_balance)
+
+
+class BalanceSnapshot:
+    """Số dư các tài sản khác 0 tại một lần cập nhật tài khoản"""
+    __slots__ = ("assets", "total_usdt", "digest")
+
+    def __init__(self, assets, total_usdt=0.0):
+        self.assets = assets  # asset -> AssetBalance
+        self.total_usdt = total_usdt
+        self.digest = hash((total_usdt,) + tuple(balance.key() for balance in assets.values()))
+
+    @classmethod
+    def from_account(cls, account):
+        """Tạo ảnh chụp từ phản hồi account của Binance, None nếu phản hồi không có assets"""
+        if not account or 'assets' not in account:
+            return None
+
+        assets = {}
+        total_usdt = 0.0
+        for asset in account['assets']:
+            asset_name = asset['asset']
+            wallet_balance = float(asset['walletBalance'])
+            cross_un_pnl = float(asset.get('crossUnPnl', 0))
+
+            # Chỉ giữ những tài sản có số dư > 0
+            if wallet_balance > 0 or cross_un_pnl != 0:
+                assets[asset_name] = AssetBalance(asset_name, wallet_balance, cross_un_pnl,
+                                                  float(asset.get('availableBalance', 0)))
+
+            if asset_name == 'USDT':
+                total_usdt = wallet_balance
+
+        return cls(assets, total_usdt)
+
+    def get(self, asset):
+        """Số dư của một tài sản, None nếu không có"""
+        return self.assets.get(asset)
+
+    def __eq__(self, other):
+        # So mã băm trước, chỉ so chi tiết khi trùng mã băm
+        return (isinstance(other, BalanceSnapshot) and self.digest == other.digest and
+                self.total_usdt == other.total_usdt and
+                [b.key() for b in self.assets.values()] == [b.key() for b in other.assets.values()])
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        return self.digest
@@ -1,4 +1,5 @@
 import time
+import json
 import threading
 import logging
 import datetime
@@ -6,7 +7,11 @@ from collections import defaultdict
 
 from binance.um_futures import UMFutures
 from binance.error import ClientError
+from binance.websocket.um_futures.websocket_client import UMFuturesWebsocketClient
+from config.config import PAPER_TRADING
 from config.logging_config import setup_logger
+from models.paper_exchange import PaperUMFutures
+from models.balance_snapshot import BalanceSnapshot
 
 # Tạo logger cho module này
 logger = setup_logger(__name__)
@@ -17,10 +22,12 @@ class BinanceDataModel:
     Lưu trữ dữ liệu trong bộ nhớ cục bộ và tự động cập nhật sau mỗi khoảng thời gian.
     """
 
-    def __init__(self, api_key="", api_secret="", update_interval=15):
+    def __init__(self, api_key="", api_secret="", update_interval=15, client_factory=None):
         self.api_key = api_key
         self.api_secret = api_secret
         self.client = None
+        # Hàm tạo client (mặc định UMFutures, hoặc sàn mô phỏng khi bật PAPER_TRADING)
+        self.client_factory = client_factory or (PaperUMFutures if PAPER_TRADING else UMFutures)
         self.update_interval = update_interval  # Khoảng thời gian cập nhật (giây)
         
         # Lưu trữ dữ liệu trong bộ nhớ
@@ -28,6 +35,7 @@ class BinanceDataModel:
             "last_update": 0,
             "tickers": {},
             "account": None,
+            "balance": None,
             "positions": [],
             "open_orders": defaultdict(list),
             "exchange_info": None,
@@ -40,18 +48,40 @@ class BinanceDataModel:
         # Cờ để kiểm soát vòng lặp cập nhật
         self.running = False
         self.update_thread = None
+
+        # Các hàm nhận thông báo khi cache thay đổi: callback(kind, payload)
+        # kind: "price" (symbol, giá đánh dấu), "trade_price" (symbol, giá khớp gần nhất), "account",
+        # "balance" (chỉ khi số dư đổi), "positions", "open_orders"
+        self.listeners = []
+        self.listeners_lock = threading.Lock()
+
+        # Luồng giá đẩy: symbol -> số subscriber, websocket mark price hoặc REST khi không có websocket
+        self.price_subscriptions = {}
+        self.stream_lock = threading.RLock()
+        self.ws_client = None
+        self.ws_symbols = set()  # Các symbol websocket hiện tại đang mang
+        # Giá khớp (aggTrade) cho biểu đồ nến: symbol -> số subscriber, cùng websocket với mark price
+        self.trade_subscriptions = {}
+        self.ws_trade_symbols = set()
+        self.price_poll_thread = None
+        self.price_poll_interval = 1.0
+        self.price_poll_stop = threading.Event()
         
-        # Kết nối nếu có API key
-        if api_key and api_secret:
+        # Kết nối nếu có API key (sàn mô phỏng không cần API key)
+        if (api_key and api_secret) or not self._requires_api_key():
             self.connect()
     
+    def _requires_api_key(self):
+        """Chỉ Binance thật mới cần API key"""
+        return self.client_factory is UMFutures
+
     def connect(self):
         """Kết nối tới Binance API"""
-        if not self.api_key or not self.api_secret:
+        if self._requires_api_key() and (not self.api_key or not self.api_secret):
             return False, "API key hoặc API secret không được cung cấp"
         
         try:
-            self.client = UMFutures(key=self.api_key, secret=self.api_secret)
+            self.client = self.client_factory(key=self.api_key, secret=self.api_secret)
             
             # Kiểm tra kết nối
             server_time = self.client.time()
@@ -184,8 +214,15 @@ class BinanceDataModel:
         """Cập nhật thông tin tài khoản"""
         try:
             account_info = self.client.account()
+            # Phân tích số dư một lần cho mọi nơi hiển thị
+            snapshot = BalanceSnapshot.from_account(account_info)
             with self.cache_lock:
                 self.cache["account"] = account_info
+                changed = snapshot != self.cache["balance"]
+                self.cache["balance"] = snapshot
+            self._notify("account", account_info)
+            if changed:
+                self._notify("balance", snapshot)
         except Exception as e:
             logger.error(f"Lỗi khi cập nhật thông tin tài khoản: {e}")
     
@@ -195,11 +232,12 @@ class BinanceDataModel:
             positions = self.client.get_position_risk()
             with self.cache_lock:
                 self.cache["positions"] = positions
+            self._notify("positions", positions)
         except Exception as e:
             logger.error(f"Lỗi khi cập nhật thông tin vị thế: {e}")
     
-    def _update_ticker(self, symbol):
-        """Cập nhật giá cho một cặp giao dịch cụ thể"""
+    def _update_ticker(self, symbol, kinds=("price",)):
+        """Cập nhật giá cho một cặp giao dịch cụ thể, gửi tới listener dưới các loại sự kiện kinds"""
         try:
             ticker = self.client.ticker_price(symbol=symbol)
             with self.cache_lock:
@@ -207,6 +245,8 @@ class BinanceDataModel:
                     "price": float(ticker["price"]),
                     "time": time.time()
                 }
+            for kind in kinds:
+                self._notify(kind, (symbol, float(ticker["price"])))
             return float(ticker["price"])
         except Exception as e:
             logger.error(f"Lỗi khi cập nhật giá {symbol}: {e}")
@@ -243,9 +283,210 @@ class BinanceDataModel:
                         self.cache["open_orders"][symbol] = orders
                 except Exception as e:
                     logger.warning(f"Không thể lấy lệnh đang mở cho {symbol}: {e}")
+
+            with self.cache_lock:
+                open_orders = dict(self.cache["open_orders"])
+            self._notify("open_orders", open_orders)
         except Exception as e:
             logger.error(f"Lỗi khi cập nhật lệnh đang mở: {e}")
     
+    def add_listener(self, callback):
+        """Đăng ký hàm nhận thông báo khi cache thay đổi, callback(kind, payload)"""
+        with self.listeners_lock:
+            if callback not in self.listeners:
+                self.listeners.append(callback)
+
+    def remove_listener(self, callback):
+        """Hủy đăng ký hàm nhận thông báo"""
+        with self.listeners_lock:
+            if callback in self.listeners:
+                self.listeners.remove(callback)
+
+    def _notify(self, kind, payload):
+        """Gọi các listener (chạy trên thread đã cập nhật cache, listener phải xử lý nhanh)"""
+        with self.listeners_lock:
+            listeners = list(self.listeners)
+        for callback in listeners:
+            try:
+                callback(kind, payload)
+            except Exception as e:
+                logger.error(f"Lỗi trong listener {kind}: {e}")
+
+    def subscribe_price(self, symbol):
+        """
+        Đăng ký nhận giá đẩy cho một cặp giao dịch. Giá mới được ghi vào cache["tickers"]
+        và gửi tới listener dưới dạng ("price", (symbol, giá)).
+        """
+        with self.stream_lock:
+            count = self.price_subscriptions.get(symbol, 0)
+            self.price_subscriptions[symbol] = count + 1
+            if count == 0:
+                self._start_price_stream(symbol)
+
+    def unsubscribe_price(self, symbol):
+        """Hủy đăng ký giá đẩy, đóng stream khi không còn subscriber"""
+        with self.stream_lock:
+            count = self.price_subscriptions.get(symbol, 0)
+            if count > 1:
+                self.price_subscriptions[symbol] = count - 1
+                return
+            self.price_subscriptions.pop(symbol, None)
+            if symbol in self.ws_symbols:
+                self.ws_symbols.discard(symbol)
+                try:
+                    self.ws_client.mark_price(symbol=symbol.lower(), speed=1, action="UNSUBSCRIBE")
+                except Exception as e:
+                    logger.warning(f"Không thể hủy stream giá {symbol}: {e}")
+
+    def subscribe_trade_price(self, symbol):
+        """
+        Đăng ký nhận giá khớp lệnh (aggTrade) của một cặp giao dịch - giá dùng cho nến, khác với
+        giá đánh dấu của subscribe_price. Giá được gửi tới listener dưới dạng ("trade_price", (symbol, giá)).
+        """
+        with self.stream_lock:
+            count = self.trade_subscriptions.get(symbol, 0)
+            self.trade_subscriptions[symbol] = count + 1
+            if count == 0:
+                self._start_price_stream(symbol)
+
+    def unsubscribe_trade_price(self, symbol):
+        """Hủy đăng ký giá khớp lệnh"""
+        with self.stream_lock:
+            count = self.trade_subscriptions.get(symbol, 0)
+            if count > 1:
+                self.trade_subscriptions[symbol] = count - 1
+                return
+            self.trade_subscriptions.pop(symbol, None)
+            if symbol in self.ws_trade_symbols:
+                self.ws_trade_symbols.discard(symbol)
+                try:
+                    self.ws_client.agg_trade(symbol=symbol.lower(), action="UNSUBSCRIBE")
+                except Exception as e:
+                    logger.warning(f"Không thể hủy stream giá khớp {symbol}: {e}")
+
+    def _start_price_stream(self, symbol):
+        """
+        Mở stream mark price qua websocket, chuyển sang hỏi REST nếu không dùng được websocket.
+        Websocket mới (lần đầu hoặc sau khi websocket cũ bị đóng) đăng ký lại mọi symbol đang theo dõi.
+        """
+        # Sàn mô phỏng không có websocket, giá lấy từ chính client
+        if self.client_factory is UMFutures:
+            try:
+                if self.ws_client is None:
+                    self.ws_client = UMFuturesWebsocketClient(
+                        on_message=self._on_stream_message,
+                        on_close=self._on_stream_closed,
+                        on_error=self._on_stream_error
+                    )
+                    self.ws_symbols = set()
+                    self.ws_trade_symbols = set()
+                for name in [name for name in self.price_subscriptions if name not in self.ws_symbols]:
+                    self.ws_client.mark_price(symbol=name.lower(), speed=1)
+                    self.ws_symbols.add(name)
+                    logger.info(f"Đã mở stream giá {name}")
+                for name in [name for name in self.trade_subscriptions if name not in self.ws_trade_symbols]:
+                    self.ws_client.agg_trade(symbol=name.lower())
+                    self.ws_trade_symbols.add(name)
+                    logger.info(f"Đã mở stream giá khớp {name}")
+            except Exception as e:
+                logger.warning(f"Không mở được websocket giá {symbol}, dùng REST: {e}")
+                self._drop_ws_client()
+        # Symbol nào websocket không mang thì hỏi qua REST
+        self._ensure_price_poller()
+
+    def _drop_ws_client(self):
+        """Bỏ websocket hiện tại (gọi khi giữ stream_lock) và dừng nó trên thread riêng"""
+        ws_client, self.ws_client = self.ws_client, None
+        self.ws_symbols = set()
+        self.ws_trade_symbols = set()
+        if ws_client is not None:
+            # Callback đóng/lỗi chạy trên chính thread của websocket, không thể join tại chỗ
+            threading.Thread(target=self._stop_ws_client, args=(ws_client,), daemon=True).start()
+
+    @staticmethod
+    def _stop_ws_client(ws_client):
+        try:
+            ws_client.stop()
+        except Exception as e:
+            logger.warning(f"Lỗi khi đóng websocket giá: {e}")
+
+    def _on_stream_message(self, _, message):
+        """Xử lý tin nhắn markPriceUpdate và aggTrade từ websocket"""
+        try:
+            data = json.loads(message)
+        except (TypeError, ValueError):
+            return
+        if data.get("e") == "aggTrade":
+            self._notify("trade_price", (data["s"], float(data["p"])))
+            return
+        if data.get("e") != "markPriceUpdate":
+            return
+        symbol = data["s"]
+        price = float(data["p"])
+        with self.cache_lock:
+            self.cache["tickers"][symbol] = {"price": price, "time": time.time()}
+        self._notify("price", (symbol, price))
+
+    def _on_stream_error(self, socket_manager, error):
+        logger.error(f"Lỗi websocket giá: {error}")
+        self._on_stream_closed(socket_manager)
+
+    def _on_stream_closed(self, socket_manager):
+        """Websocket bị đóng: dừng websocket cũ và chuyển các symbol đang đăng ký sang hỏi REST"""
+        with self.stream_lock:
+            # Bỏ qua thông báo của websocket đã được thay thế
+            if self.ws_client is None or getattr(self.ws_client, "socket_manager", None) is not socket_manager:
+                return
+            self._drop_ws_client()
+            if self.price_subscriptions or self.trade_subscriptions:
+                logger.warning("Websocket giá bị đóng, chuyển sang lấy giá qua REST")
+                self._ensure_price_poller()
+
+    def _ensure_price_poller(self):
+        """Khởi động thread hỏi giá qua REST cho các symbol websocket không mang (gọi khi giữ stream_lock)"""
+        if self.price_poll_thread is not None:
+            return
+        # Mỗi poller có Event dừng riêng: poller cũ đang chờ dừng không ảnh hưởng poller mới
+        self.price_poll_stop = threading.Event()
+        self.price_poll_thread = threading.Thread(target=self._price_poll_loop, args=(self.price_poll_stop,),
+                                                  daemon=True)
+        self.price_poll_thread.start()
+
+    def _price_poll_loop(self, stop):
+        """Hỏi giá qua REST cho các symbol đã đăng ký mà websocket không mang, dừng khi không còn symbol nào"""
+        while not stop.is_set():
+            with self.stream_lock:
+                symbols = {}
+                for symbol in self.price_subscriptions:
+                    if symbol not in self.ws_symbols:
+                        symbols.setdefault(symbol, []).append("price")
+                for symbol in self.trade_subscriptions:
+                    if symbol not in self.ws_trade_symbols:
+                        # ticker_price là giá khớp gần nhất
+                        symbols.setdefault(symbol, []).append("trade_price")
+                if not symbols:
+                    # Đánh dấu đã dừng trong cùng khóa để lần đăng ký sau khởi động lại poller
+                    if self.price_poll_thread is threading.current_thread():
+                        self.price_poll_thread = None
+                    return
+            if self.is_connected():
+                for symbol, kinds in symbols.items():
+                    self._update_ticker(symbol, kinds)
+            stop.wait(self.price_poll_interval)
+
+    def close_price_streams(self):
+        """Đóng toàn bộ luồng giá đẩy"""
+        with self.stream_lock:
+            self.price_subscriptions.clear()
+            self.trade_subscriptions.clear()
+            ws_client, self.ws_client = self.ws_client, None
+            self.ws_symbols = set()
+            self.ws_trade_symbols = set()
+            self.price_poll_stop.set()
+            self.price_poll_thread = None
+        if ws_client is not None:
+            self._stop_ws_client(ws_client)
+
     def get_ticker_price(self, symbol):
         """Lấy giá hiện tại cho một cặp giao dịch"""
         if not self.is_connected():
@@ -281,6 +522,11 @@ class BinanceDataModel:
         with self.cache_lock:
             return self.cache["account"]
     
+    def get_balance_snapshot(self):
+        """Lấy số dư đã phân tích (BalanceSnapshot) từ lần cập nhật tài khoản gần nhất"""
+        with self.cache_lock:
+            return self.cache["balance"]
+
     def get_positions(self):
         """Lấy danh sách vị thế"""
         if not self.is_connected():
@@ -368,6 +614,7 @@ class BinanceDataModel:
                 return False, "Không thể lấy giá hiện tại"
             
             # Đặt đòn bẩy
+            send_started = time.perf_counter()
             self.client.change_leverage(symbol=symbol, leverage=leverage)
             
             # Đặt lệnh market
@@ -379,6 +626,7 @@ class BinanceDataModel:
             }
             
             order_response = self.client.new_order(**order_params)
+            acked = time.perf_counter()
             
             # Đặt stop loss nếu cần
             stop_order_id = None
@@ -453,6 +701,12 @@ class BinanceDataModel:
             self._update_positions()  # Cập nhật vị thế
             self._update_open_orders()  # Cập nhật lệnh đang mở
             
+            # Thời gian (ms): gửi lệnh đến khi nhận xác nhận, và xử lý sau xác nhận (SL/TP, làm mới cache)
+            trade_info['timings'] = {
+                'order_send': (acked - send_started) * 1000,
+                'ack': (time.perf_counter() - acked) * 1000
+            }
+            
             return True, trade_info
         except ClientError as e:
             return False, f"Lỗi Binance API: {e}"
@@ -531,6 +785,52 @@ class BinanceDataModel:
             logger.error(f"Lỗi khi lấy lịch sử giao dịch: {e}")
             return []
     
+    def get_account_trades(self, symbol, start_time=None, from_id=None, limit=1000):
+        """
+        Lấy một trang các lần khớp lệnh (userTrades) của một cặp giao dịch
+
+        Args:
+            start_time (int, optional): Từ thời điểm (ms) - Binance trả về tối đa 7 ngày từ mốc này
+            from_id (int, optional): Từ ID khớp lệnh (không giới hạn khoảng thời gian)
+
+        Returns:
+            list: Các lần khớp lệnh theo thứ tự ID tăng dần, None nếu lỗi
+        """
+        if not self.is_connected():
+            return None
+
+        params = {'symbol': symbol, 'limit': limit}
+        if from_id is not None:
+            params['fromId'] = from_id
+        elif start_time is not None:
+            params['startTime'] = start_time
+        try:
+            return self.client.get_account_trades(**params)
+        except Exception as e:
+            logger.error(f"Lỗi khi lấy lịch sử khớp lệnh {symbol}: {e}")
+            return None
+
+    def get_income_history(self, start_time=None, end_time=None, limit=1000):
+        """
+        Lấy một trang lịch sử thu nhập (mọi cặp giao dịch, mọi loại) theo thứ tự thời gian
+
+        Returns:
+            list: Các bản ghi income, None nếu lỗi
+        """
+        if not self.is_connected():
+            return None
+
+        params = {'limit': limit}
+        if start_time is not None:
+            params['startTime'] = start_time
+        if end_time is not None:
+            params['endTime'] = end_time
+        try:
+            return self.client.get_income_history(**params)
+        except Exception as e:
+            logger.error(f"Lỗi khi lấy lịch sử thu nhập: {e}")
+            return None
+
     def validate_api_permissions(self):
         """Kiểm tra quyền của API key"""
         if not self.is_connected():
@@ -0,0 +1,310 @@
+"""
+Vị thế đã đóng, tổng hợp lãi/lỗ theo ngày và thống kê hiệu suất (tổng, theo cặp giao dịch, theo chiến lược).
+
+Vị thế đóng được suy ra từ các lần khớp lệnh có realizedPnl khác 0 (lệnh đóng bằng tay,
+AutoTrader hay SL/TP kích hoạt trên sàn đều như nhau), gộp theo lệnh đóng. Dòng closed_positions,
+các bảng tổng hợp và trạng thái của giao dịch local được ghi trong cùng transaction với các lần
+khớp lệnh, nên đọc tổng lãi/lỗ hay tỷ lệ thắng chỉ là tra một vài dòng.
+
+Thống kê hiệu suất (performance_stats) được cộng dồn theo thứ tự thời gian đóng: vốn, đỉnh vốn và
+sụt giảm lớn nhất cập nhật từ dòng trước mà không đọc lại lịch sử. Chỉ khi vị thế đến không theo
+thứ tự hoặc bị sửa thì khóa liên quan mới được tính lại từ closed_positions.
+"""
+import datetime
+from config.logging_config import setup_logger
+from models.trade_model import TRADE_COLUMNS
+from utils.database_manager import DatabaseManager, rebuild_performance_stats
+from utils.helpers import format_timestamp
+
+# Tạo logger cho module này
+logger = setup_logger(__name__)
+
+
+# Sai số tương đối khi so sánh số lượng (tổng float của các lần khớp)
+QTY_TOLERANCE = 1e-9
+
+# Các cột của dòng tách ra khi giao dịch local chỉ bị đóng một phần (theo thứ tự tham số)
+SPLIT_OVERRIDES = ("id", "quantity", "filled_quantity", "exit_price", "exit_time", "pnl", "status", "updated_at")
+
+
+def _contribution(pnl, commission):
+    """Phần đóng góp của một vị thế vào bảng tổng hợp"""
+    return (1, 1 if pnl > 0 else 0, 1 if pnl < 0 else 0, max(pnl, 0.0), max(-pnl, 0.0), commission, pnl)
+
+
+def _stats_summary(row):
+    """Dòng performance_stats -> dict thống kê (profit_factor None nếu chưa có lệnh lỗ)"""
+    trades = row["trades"] if row else 0
+    gross_loss = row["gross_loss"] if row else 0.0
+    return {
+        "key": row["key"] if row else "",
+        "trades": trades,
+        "total_profit": row["pnl"] if row else 0.0,
+        "win_rate": row["wins"] / trades * 100 if trades else 0.0,
+        "profit_factor": row["gross_profit"] / gross_loss if gross_loss else None,
+        "max_drawdown": row["max_drawdown"] if row else 0.0,
+        "commission": row["commission"] if row else 0.0,
+    }
+
+
+class ClosedPositionStore:
+    def __init__(self, db=None):
+        self.db = db or DatabaseManager()
+
+    def record_fills(self, conn, username, symbol, fills):
+        """
+        Ghi/cập nhật vị thế đóng từ các lần khớp lệnh vừa lưu vào account_trades
+        (gọi trong transaction của AccountHistoryStore.save_trades)
+
+        Returns:
+            int: Số vị thế đóng mới
+        """
+        order_ids = sorted({str(fill.get('orderId', '')) for fill in fills
+                            if float(fill.get('realizedPnl', 0) or 0) != 0})
+        if not order_ids:
+            return 0
+        placeholders = ", ".join("?" for _ in order_ids)
+
+        # Tính lại từ toàn bộ lần khớp của lệnh đóng: gọi lại với lần khớp đã có không làm sai tổng
+        totals = conn.execute(f"""
+            SELECT order_id, side, SUM(qty), SUM(quote_qty), SUM(realized_pnl), SUM(commission), MAX(time)
+            FROM account_trades
+            WHERE username = ? AND symbol = ? AND order_id IN ({placeholders}) AND realized_pnl != 0
+            GROUP BY order_id
+            ORDER BY MAX(time)
+        """, [username, symbol] + order_ids).fetchall()
+        existing = {row[0]: tuple(row)[1:] for row in conn.execute(f"""
+            SELECT order_id, quantity, pnl, commission, close_time, source FROM closed_positions
+            WHERE username = ? AND symbol = ? AND order_id IN ({placeholders})
+        """, [username, symbol] + order_ids)}
+
+        # Theo thứ tự thời gian: mỗi lệnh đóng chỉ đóng các giao dịch mở trước nó
+        created = 0
+        for order_id, fill_side, total, quote, pnl, commission, close_time in totals:
+            if not total:
+                continue
+            # Lệnh đóng SELL đóng vị thế Long và ngược lại
+            direction = 1 if fill_side == "SELL" else -1
+            side = "BUY" if direction == 1 else "SELL"
+            exit_price = quote / total
+            close_text = format_timestamp(close_time)
+
+            old = existing.get(order_id)
+            if old is None:
+                quantity, source, leverage = self._close_local_trades(
+                    conn, username, symbol, side, order_id, total, exit_price, close_text, pnl)
+            else:
+                # Phần mở vị thế mới của lệnh đảo chiều đã được tách ra ở lần ghi đầu
+                quantity = total - self._open_part(conn, username, order_id, fill_side)
+                if not quantity > 0:
+                    quantity = total
+                if old[:4] == (quantity, pnl, commission, close_time):
+                    continue
+                self._apply_daily(conn, username, old[3], old[1], old[2], -1)
+            entry_price = exit_price - pnl / (quantity * direction)
+
+            if old is None:
+                conn.execute("""
+                    INSERT INTO closed_positions (
+                        username, order_id, symbol, side, entry_price, exit_price, quantity, leverage,
+                        pnl, commission, source, timestamp, close_time
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """, (username, order_id, symbol, side, entry_price, exit_price,
+                      quantity, leverage, pnl, commission, source, close_text, close_time))
+                created += 1
+                self._add_to_stats(conn, username, {"all": "", "symbol": symbol, "strategy": source},
+                                   close_time, pnl, commission)
+            else:
+                conn.execute("""
+                    UPDATE closed_positions
+                    SET entry_price = ?, exit_price = ?, quantity = ?, pnl = ?, commission = ?, timestamp = ?, close_time = ?
+                    WHERE username = ? AND symbol = ? AND order_id = ?
+                """, (entry_price, exit_price, quantity, pnl, commission, close_text, close_time,
+                      username, symbol, order_id))
+                for scope, key in (("all", ""), ("symbol", symbol), ("strategy", old[4] or "")):
+                    rebuild_performance_stats(conn, scope, username, key)
+            self._apply_daily(conn, username, close_time, pnl, commission, 1)
+
+        if created:
+            logger.info(f"Ghi {created} vị thế đã đóng của {symbol} cho {username}")
+        return created
+
+    def _close_local_trades(self, conn, username, symbol, side, order_id, total, exit_price, exit_time, pnl):
+        """
+        Đóng các giao dịch local đang mở cùng chiều của cặp giao dịch theo thứ tự vào lệnh (FIFO),
+        chỉ tới số lượng lệnh đóng đã đóng, chia PnL theo số lượng. Giao dịch chỉ bị đóng một phần được
+        tách thành dòng đã đóng (ID "<id>-<orderId lệnh đóng>") và dòng còn mở với số lượng còn lại.
+
+        Nếu chính lệnh đóng là giao dịch local (lệnh ngược chiều đặt từ ứng dụng) thì phần vượt quá các
+        giao dịch đang mở là phần mở vị thế mới: dòng đó giữ số lượng phần mở, hoặc được đóng nếu không còn.
+
+        Returns:
+            tuple: (số lượng đã đóng, nguồn, đòn bẩy) - nguồn/đòn bẩy của giao dịch mới nhất bị đóng,
+                ('Binance', None) nếu không có
+        """
+        rows = conn.execute("""
+            SELECT id, quantity, source, leverage FROM trades
+            WHERE username = ? AND status = 'OPEN' AND timestamp <= ? AND symbol = ? AND side = ?
+            ORDER BY timestamp, id
+        """, (username, exit_time, symbol, side)).fetchall()
+        closing = conn.execute("""
+            SELECT id FROM trades WHERE id = ? AND username = ? AND status = 'OPEN' AND side != ?
+        """, (order_id, username, side)).fetchone()
+
+        quantity = total
+        open_total = sum(row[1] for row in rows if row[1] and row[1] > 0)
+        if closing is not None and open_total > 0:
+            quantity = min(total, open_total)
+        updated_at = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        if closing is not None:
+            opened = total - quantity
+            if opened > total * QTY_TOLERANCE:
+                conn.execute("UPDATE trades SET quantity = ?, updated_at = ? WHERE id = ? AND username = ?",
+                             (opened, updated_at, order_id, username))
+            else:
+                conn.execute("""
+                    UPDATE trades SET exit_price = ?, exit_time = ?, pnl = 0, status = 'CLOSED', updated_at = ?
+                    WHERE id = ? AND username = ?
+                """, (exit_price, exit_time, updated_at, order_id, username))
+        if not rows:
+            return quantity, "Binance", None
+
+        remaining = quantity
+        closed = []
+        for trade_id, trade_quantity, source, leverage in rows:
+            if remaining <= quantity * QTY_TOLERANCE:
+                break
+            if not trade_quantity or trade_quantity <= 0:
+                # Không biết số lượng: đóng cả giao dịch, không chia PnL
+                closed.append((trade_id, None, 0.0, source, leverage))
+                continue
+            part = min(trade_quantity, remaining)
+            remaining -= part
+            closed.append((trade_id, trade_quantity, part, source, leverage))
+
+        closed_total = sum(part for _, _, part, _, _ in closed)
+        for trade_id, trade_quantity, part, _, _ in closed:
+            share = part / closed_total if closed_total else 1.0 / len(closed)
+            if trade_quantity is not None and trade_quantity - part > trade_quantity * QTY_TOLERANCE:
+                # Đóng một phần: tách phần đã đóng thành dòng riêng, dòng gốc còn mở với số lượng còn lại
+                columns = [column for column in TRADE_COLUMNS if column not in SPLIT_OVERRIDES]
+                conn.execute(f"""
+                    INSERT OR IGNORE INTO trades ({", ".join(columns + list(SPLIT_OVERRIDES))})
+                    SELECT {", ".join(columns)}, ?, ?, ?, ?, ?, ?, 'CLOSED', ? FROM trades
+                    WHERE id = ? AND username = ?
+                """, (f"{trade_id}-{order_id}", part, part, exit_price, exit_time, pnl * share, updated_at,
+                      trade_id, username))
+                conn.execute("UPDATE trades SET quantity = ?, updated_at = ? WHERE id = ? AND username = ?",
+                             (trade_quantity - part, updated_at, trade_id, username))
+            else:
+                conn.execute("""
+                    UPDATE trades SET exit_price = ?, exit_time = ?, pnl = ?, status = 'CLOSED', updated_at = ?
+                    WHERE id = ? AND username = ?
+                """, (exit_price, exit_time, pnl * share, updated_at, trade_id, username))
+        return quantity, closed[-1][3] or "Binance", closed[-1][4]
+
+    def _open_part(self, conn, username, order_id, fill_side):
+        """Số lượng phần mở vị thế mới còn lại trên giao dịch local của lệnh đóng (0 nếu không có)"""
+        row = conn.execute("""
+            SELECT quantity FROM trades WHERE id = ? AND username = ? AND status = 'OPEN' AND side = ?
+        """, (order_id, username, fill_side)).fetchone()
+        return (row[0] or 0.0) if row else 0.0
+
+    def _apply_daily(self, conn, username, close_time, pnl, commission, sign):
+        """Cộng (sign=1) hoặc trừ (sign=-1) một vị thế vào daily_pnl"""
+        values = [sign * value for value in _contribution(pnl, commission)]
+        conn.execute("""
+            INSERT INTO daily_pnl (username, day, trades, wins, losses, gross_profit, gross_loss, commission, pnl)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (username, day) DO UPDATE SET
+                trades = trades + excluded.trades,
+                wins = wins + excluded.wins,
+                losses = losses + excluded.losses,
+                gross_profit = gross_profit + excluded.gross_profit,
+                gross_loss = gross_loss + excluded.gross_loss,
+                commission = commission + excluded.commission,
+                pnl = pnl + excluded.pnl
+        """, [username, format_timestamp(close_time)[:10]] + values)
+
+    def _add_to_stats(self, conn, username, keys, close_time, pnl, commission):
+        """
+        Cộng một vị thế mới đóng vào performance_stats của từng phạm vi
+
+        Args:
+            keys (dict): phạm vi ("all", "symbol", "strategy") -> khóa
+        """
+        for scope, key in keys.items():
+            row = conn.execute("""
+                SELECT pnl, peak, max_drawdown, last_close_time FROM performance_stats
+                WHERE username = ? AND scope = ? AND key = ?
+            """, (username, scope, key)).fetchone()
+            if row is not None and row[3] is not None and close_time < row[3]:
+                # Vị thế cũ hơn vị thế cuối đã tính: đỉnh vốn/sụt giảm phải tính lại theo thứ tự
+                rebuild_performance_stats(conn, scope, username, key)
+                continue
+
+            equity = (row[0] if row else 0.0) + pnl
+            peak = max(row[1] if row else 0.0, equity)
+            max_drawdown = max(row[2] if row else 0.0, peak - equity)
+            trades, wins, losses, gross_profit, gross_loss, commission_total, _ = _contribution(pnl, commission)
+            conn.execute("""
+                INSERT INTO performance_stats (
+                    username, scope, key, trades, wins, losses, gross_profit, gross_loss, commission,
+                    pnl, peak, max_drawdown, last_close_time
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (username, scope, key) DO UPDATE SET
+                    trades = trades + excluded.trades,
+                    wins = wins + excluded.wins,
+                    losses = losses + excluded.losses,
+                    gross_profit = gross_profit + excluded.gross_profit,
+                    gross_loss = gross_loss + excluded.gross_loss,
+                    commission = commission + excluded.commission,
+                    pnl = excluded.pnl,
+                    peak = excluded.peak,
+                    max_drawdown = excluded.max_drawdown,
+                    last_close_time = excluded.last_close_time
+            """, (username, scope, key, trades, wins, losses, gross_profit, gross_loss, commission_total,
+                  equity, peak, max_drawdown, close_time))
+
+    def get_closed_positions(self, username, symbol=None, limit=None):
+        """Các vị thế đã đóng, mới nhất trước"""
+        query = "SELECT * FROM closed_positions WHERE username = ?"
+        params = [username]
+        if symbol:
+            query += " AND symbol = ?"
+            params.append(symbol)
+        query += " ORDER BY close_time DESC"
+        if limit:
+            query += " LIMIT ?"
+            params.append(limit)
+        return [dict(row) for row in self.db.fetch_all(query, params)]
+
+    def get_daily(self, username, start_day=None):
+        """Tổng hợp theo ngày (YYYY-MM-DD, múi giờ +7), cũ nhất trước"""
+        query = "SELECT * FROM daily_pnl WHERE username = ?"
+        params = [username]
+        if start_day:
+            query += " AND day >= ?"
+            params.append(start_day)
+        return [dict(row) for row in self.db.fetch_all(query + " ORDER BY day", params)]
+
+    def get_breakdown(self, username, scope):
+        """Thống kê theo cặp giao dịch (scope="symbol") hoặc theo chiến lược (scope="strategy"), lãi nhiều nhất trước"""
+        rows = self.db.fetch_all(
+            "SELECT * FROM performance_stats WHERE username = ? AND scope = ? ORDER BY pnl DESC",
+            (username, scope)
+        )
+        return [_stats_summary(row) for row in rows]
+
+    def get_summary(self, username):
+        """
+        Thống kê tổng (một dòng của performance_stats, không phụ thuộc độ dài lịch sử)
+
+        Returns:
+            dict: total_profit, win_rate (%), profit_factor, max_drawdown, trades, commission
+        """
+        row = self.db.fetch_one(
+            "SELECT * FROM performance_stats WHERE username = ? AND scope = 'all' AND key = ''",
+            (username,)
+        )
+        return _stats_summary(row)
@@ -0,0 +1,141 @@
+"""
+Kho dữ liệu nến lịch sử lưu trên đĩa theo dạng cột.
+
+Mỗi (symbol, interval) là một thư mục, mỗi cột là một file nhị phân độ rộng cố định
+(int64/float64, little-endian). Dữ liệu được đọc bằng np.memmap nên không cần phân tích
+cú pháp và bộ nhớ sử dụng không phụ thuộc vào số tháng dữ liệu.
+"""
+import os
+import threading
+import numpy as np
+
+from config.config import KLINES_DIR
+from config.logging_config import setup_logger
+
+# Tạo logger cho module này
+logger = setup_logger(__name__)
+
+# Tên cột -> kiểu dữ liệu trên đĩa
+KLINE_COLUMNS = {
+    "open_time": np.dtype("<i8"),
+    "open": np.dtype("<f8"),
+    "high": np.dtype("<f8"),
+    "low": np.dtype("<f8"),
+    "close": np.dtype("<f8"),
+    "volume": np.dtype("<f8"),
+    "close_time": np.dtype("<i8"),
+}
+
+
+class KlineStore:
+    """Đọc/ghi dữ liệu nến dạng cột với np.memmap"""
+
+    def __init__(self, root=KLINES_DIR):
+        self.root = root
+        self.lock = threading.RLock()
+
+    def _series_dir(self, symbol, interval):
+        return os.path.join(self.root, symbol.upper(), interval)
+
+    def _column_path(self, symbol, interval, column):
+        return os.path.join(self._series_dir(symbol, interval), f"{column}.bin")
+
+    def series(self):
+        """Danh sách (symbol, interval) đang có dữ liệu"""
+        result = []
+        if not os.path.exists(self.root):
+            return result
+        for symbol in sorted(os.listdir(self.root)):
+            symbol_dir = os.path.join(self.root, symbol)
+            if os.path.isdir(symbol_dir):
+                result.extend((symbol, interval) for interval in sorted(os.listdir(symbol_dir)))
+        return result
+
+    def count(self, symbol, interval):
+        """
+        Số nến hoàn chỉnh đang lưu. Nếu lần ghi trước bị gián đoạn giữa chừng,
+        các cột có thể dài khác nhau - chỉ tính phần mà mọi cột đều có.
+        """
+        sizes = []
+        for column, dtype in KLINE_COLUMNS.items():
+            path = self._column_path(symbol, interval, column)
+            if not os.path.exists(path):
+                return 0
+            sizes.append(os.path.getsize(path) // dtype.itemsize)
+        return min(sizes)
+
+    def _repair(self, symbol, interval):
+        """Cắt các cột về cùng độ dài sau một lần ghi bị gián đoạn"""
+        rows = self.count(symbol, interval)
+        for column, dtype in KLINE_COLUMNS.items():
+            path = self._column_path(symbol, interval, column)
+            if os.path.exists(path) and os.path.getsize(path) != rows * dtype.itemsize:
+                logger.warning(f"Sửa file {path} về {rows} nến")
+                with open(path, "r+b") as f:
+                    f.truncate(rows * dtype.itemsize)
+        return rows
+
+    def last_open_time(self, symbol, interval):
+        """Thời gian mở của nến cuối cùng đã lưu (ms), None nếu chưa có dữ liệu"""
+        rows = self.count(symbol, interval)
+        if rows == 0:
+            return None
+        open_time = np.memmap(self._column_path(symbol, interval, "open_time"),
+                              dtype=KLINE_COLUMNS["open_time"], mode="r", shape=(rows,))
+        return int(open_time[-1])
+
+    def append(self, symbol, interval, klines):
+        """
+        Ghi thêm nến vào cuối kho. Các nến có open_time không mới hơn nến cuối cùng sẽ bị bỏ qua.
+
+        Args:
+            klines (list): Danh sách nến trả về từ Binance
+
+        Returns:
+            int: Số nến đã ghi
+        """
+        if not klines:
+            return 0
+
+        with self.lock:
+            os.makedirs(self._series_dir(symbol, interval), exist_ok=True)
+            self._repair(symbol, interval)
+
+            last_time = self.last_open_time(symbol, interval)
+            if last_time is not None:
+                klines = [k for k in klines if int(k[0]) > last_time]
+            if not klines:
+                return 0
+
+            raw = np.array([k[:len(KLINE_COLUMNS)] for k in klines], dtype=object)
+            for i, (column, dtype) in enumerate(KLINE_COLUMNS.items()):
+                values = raw[:, i].astype(np.float64 if dtype.kind == "f" else np.int64).astype(dtype)
+                with open(self._column_path(symbol, interval, column), "ab") as f:
+                    f.write(values.tobytes())
+
+            return len(klines)
+
+    def load(self, symbol, interval, start_time=None, end_time=None):
+        """
+        Đọc dữ liệu nến trong khoảng thời gian (theo open_time, ms)
+
+        Returns:
+            dict: Tên cột -> np.memmap chỉ đọc (dùng trực tiếp cho Backtester/utils.indicators)
+        """
+        rows = self.count(symbol, interval)
+        columns = {}
+        for column, dtype in KLINE_COLUMNS.items():
+            if rows:
+                columns[column] = np.memmap(self._column_path(symbol, interval, column),
+                                            dtype=dtype, mode="r", shape=(rows,))
+            else:
+                columns[column] = np.empty(0, dtype=dtype)
+
+        start = 0 if start_time is None else int(np.searchsorted(columns["open_time"], start_time, side="left"))
+        end = rows if end_time is None else int(np.searchsorted(columns["open_time"], end_time, side="right"))
+        return {column: values[start:end] for column, values in columns.items()}
+
+    def tail(self, symbol, interval, limit=200):
+        """Đọc `limit` nến gần nhất - dùng để làm nóng chỉ báo"""
+        data = self.load(symbol, interval)
+        return {column: values[-limit:] for column, values in data.items()}
@@ -0,0 +1,600 @@
+"""
+Sàn Futures mô phỏng chạy trong process (paper trading).
+
+PaperUMFutures cài đặt các phương thức của binance.um_futures.UMFutures mà ứng dụng sử dụng,
+trả về dữ liệu cùng định dạng với Binance. Giá được lấy từ dữ liệu nến ghi sẵn (KlineStore)
+hoặc sinh ngẫu nhiên có seed, nên cùng seed và cùng chuỗi lệnh luôn cho cùng kết quả.
+Dùng để chạy toàn bộ ứng dụng, kiểm thử và load-test mà không cần API key.
+"""
+import time
+import zlib
+import threading
+import numpy as np
+
+from binance.error import ClientError
+from config.logging_config import setup_logger
+from utils.indicators import INTERVAL_MS, resample_klines
+
+# Tạo logger cho module này
+logger = setup_logger(__name__)
+
+CANDLE_MS = INTERVAL_MS["1m"]
+
+# Thông số mặc định cho các cặp giao dịch: giá khởi điểm, bước khối lượng, bước giá
+SYMBOL_SPECS = {
+    "BTCUSDT": (60000.0, "0.001", "0.10"),
+    "ETHUSDT": (3000.0, "0.001", "0.01"),
+    "BNBUSDT": (500.0, "0.01", "0.010"),
+    "ADAUSDT": (0.5, "1", "0.00010"),
+    "DOGEUSDT": (0.15, "1", "0.000010"),
+    "XRPUSDT": (0.6, "0.1", "0.0001"),
+    "SOLUSDT": (150.0, "1", "0.0100"),
+    "AVAXUSDT": (30.0, "1", "0.0010"),
+    "DOTUSDT": (7.0, "0.1", "0.001"),
+    "MATICUSDT": (0.7, "1", "0.0001"),
+    "LINKUSDT": (15.0, "0.01", "0.001"),
+}
+
+
+def _client_error(error_code, message, status_code=400):
+    """Tạo ClientError giống lỗi trả về từ Binance"""
+    return ClientError(status_code, error_code, message, {})
+
+
+class PriceSeries:
+    """Chuỗi nến 1m của một cặp giao dịch, từ dữ liệu ghi sẵn hoặc sinh ngẫu nhiên có seed"""
+
+    def __init__(self, symbol, start_time, data=None, seed=0, base_price=100.0, volatility=0.001):
+        self.symbol = symbol
+        self.start_time = start_time
+        self.recorded = data is not None
+        self.rng = np.random.default_rng(seed + zlib.crc32(symbol.encode()))
+        # Bộ sinh riêng cho khối lượng để chuỗi giá không phụ thuộc vào cách chia các lần sinh
+        self.volume_rng = np.random.default_rng(seed + zlib.crc32(symbol.encode()) + 1)
+        self.volatility = volatility
+
+        if data is not None:
+            self.open_time = np.asarray(data["open_time"], dtype=np.int64)
+            self.open = np.asarray(data["open"], dtype=np.float64)
+            self.high = np.asarray(data["high"], dtype=np.float64)
+            self.low = np.asarray(data["low"], dtype=np.float64)
+            self.close = np.asarray(data["close"], dtype=np.float64)
+            self.volume = np.asarray(data["volume"], dtype=np.float64)
+        else:
+            self.open_time = np.empty(0, dtype=np.int64)
+            self.open = self.high = self.low = self.close = self.volume = np.empty(0)
+            self._last_close = base_price
+            self.extend(start_time + CANDLE_MS)
+
+    def extend(self, until_time):
+        """Sinh thêm nến ngẫu nhiên (theo chuyển động Brown hình học) đến `until_time`"""
+        if self.recorded:
+            return
+        first_time = self.open_time[-1] + CANDLE_MS if len(self.open_time) else self.start_time
+        count = int((until_time - first_time) // CANDLE_MS) + 1
+        if count <= 0:
+            return
+
+        # Mỗi nến gồm 4 bước giá để tạo open/high/low/close
+        steps = self.rng.normal(0, self.volatility / 2, (count, 4))
+        path = self._last_close * np.exp(np.cumsum(steps.ravel())).reshape(count, 4)
+        open_ = np.r_[self._last_close, path[:-1, 3]]
+        close = path[:, 3]
+        high = np.maximum(path.max(axis=1), open_)
+        low = np.minimum(path.min(axis=1), open_)
+        self._last_close = float(close[-1])
+
+        self.open_time = np.r_[self.open_time, first_time + np.arange(count, dtype=np.int64) * CANDLE_MS]
+        self.open = np.r_[self.open, open_]
+        self.high = np.r_[self.high, high]
+        self.low = np.r_[self.low, low]
+        self.close = np.r_[self.close, close]
+        self.volume = np.r_[self.volume, self.volume_rng.uniform(10, 100, count)]
+
+    def index_at(self, timestamp):
+        """Chỉ số nến đang hình thành tại thời điểm `timestamp`"""
+        self.extend(timestamp)
+        index = int(np.searchsorted(self.open_time, timestamp, side="right")) - 1
+        return min(max(index, 0), len(self.open_time) - 1)
+
+    def price_at(self, timestamp):
+        """Giá tại thời điểm: giá đóng cửa của nến gần nhất đã hoàn thành"""
+        index = self.index_at(timestamp)
+        if timestamp >= self.open_time[index] + CANDLE_MS:
+            return float(self.close[index])
+        return float(self.open[index])
+
+    def path(self, index):
+        """Đường đi giá trong một nến: open -> đỉnh/đáy gần hơn -> đỉnh/đáy còn lại -> close"""
+        if self.close[index] >= self.open[index]:
+            return (self.open[index], self.low[index], self.high[index], self.close[index])
+        return (self.open[index], self.high[index], self.low[index], self.close[index])
+
+
+class PaperUMFutures:
+    """
+    Sàn Futures mô phỏng thay thế cho UMFutures (chế độ one-way, ký quỹ cross).
+
+    Thời gian của sàn:
+    - realtime=True: đồng hồ chạy theo thời gian thực (nhân với speed) - dùng khi chạy ứng dụng
+    - realtime=False: đồng hồ chỉ tiến khi gọi advance() - dùng cho kiểm thử tất định
+    """
+
+    def __init__(self, key="", secret="", initial_balance=10000.0, seed=42, start_time=None,
+                 recorded_klines=None, realtime=True, speed=1.0, fee_rate=0.0004, slippage=0.0002,
+                 history_candles=20000):
+        self.key = key
+        self.secret = secret
+        self.seed = seed
+        self.realtime = realtime
+        self.speed = speed
+        self.fee_rate = fee_rate
+        self.slippage = slippage
+        self.lock = threading.RLock()
+
+        # Dữ liệu ghi sẵn: symbol -> dict mảng nến 1m (ví dụ KlineStore.load(symbol, "1m"))
+        self.recorded_klines = recorded_klines or {}
+        if start_time is None:
+            if self.recorded_klines:
+                # Bắt đầu sau phần dữ liệu dùng làm lịch sử cho chỉ báo
+                first = next(iter(self.recorded_klines.values()))["open_time"]
+                start_time = int(first[min(history_candles, len(first) - 1)])
+            else:
+                start_time = (int(time.time() * 1000) // CANDLE_MS) * CANDLE_MS
+        self.history_start = start_time - history_candles * CANDLE_MS
+        self.now = start_time
+        self._wall_start = time.time()
+        self._clock_start = start_time
+
+        self.series = {}
+        self.wallet_balance = float(initial_balance)
+        self.positions = {}  # symbol -> {"amount", "entry_price"}
+        self.leverage = {}  # symbol -> đòn bẩy
+        self.open_orders = {}  # orderId -> lệnh đang chờ kích hoạt
+        self.orders = {}  # orderId -> tất cả lệnh
+        self.trades = []  # Lịch sử khớp lệnh (định dạng userTrades)
+        self.income = []  # Lịch sử thu nhập (định dạng income)
+        self._next_order_id = 1
+        self._next_trade_id = 1
+        self._last_candle = {}  # symbol -> chỉ số nến cuối cùng đã xử lý khớp lệnh
+
+    # ------------------------------------------------------------------
+    # Đồng hồ và giá
+    # ------------------------------------------------------------------
+
+    def _series(self, symbol):
+        if symbol not in self.series:
+            if symbol in self.recorded_klines:
+                self.series[symbol] = PriceSeries(symbol, self.history_start, data=self.recorded_klines[symbol])
+            elif symbol in SYMBOL_SPECS or not self.recorded_klines:
+                base_price = SYMBOL_SPECS.get(symbol, (100.0,))[0]
+                self.series[symbol] = PriceSeries(symbol, self.history_start, seed=self.seed, base_price=base_price)
+            else:
+                raise _client_error(-1121, "Invalid symbol.")
+            self._last_candle[symbol] = self.series[symbol].index_at(self.now)
+        return self.series[symbol]
+
+    def _sync(self):
+        """Cập nhật đồng hồ theo thời gian thực (nếu bật) và xử lý các lệnh chờ"""
+        if self.realtime:
+            target = self._clock_start + int((time.time() - self._wall_start) * 1000 * self.speed)
+            if target > self.now:
+                self.advance(target - self.now)
+
+    def advance(self, milliseconds):
+        """Cho đồng hồ của sàn tiến thêm `milliseconds` và khớp các lệnh stop bị kích hoạt"""
+        with self.lock:
+            self.now += int(milliseconds)
+            for symbol in list(self.series):
+                series = self.series[symbol]
+                current = series.index_at(self.now)
+                # Xử lý từng nến đã hoàn thành kể từ lần trước
+                for index in range(self._last_candle[symbol], current):
+                    for price in series.path(index):
+                        self._match_stops(symbol, float(price), int(series.open_time[index]) + CANDLE_MS - 1)
+                self._last_candle[symbol] = current
+
+    def _price(self, symbol):
+        return self._series(symbol).price_at(self.now)
+
+    # ------------------------------------------------------------------
+    # Khớp lệnh
+    # ------------------------------------------------------------------
+
+    def _step_size(self, symbol):
+        return float(SYMBOL_SPECS.get(symbol, (100.0, "0.001", "0.01"))[1])
+
+    def _unrealized(self, symbol, price=None):
+        position = self.positions.get(symbol)
+        if not position or position["amount"] == 0:
+            return 0.0
+        price = self._price(symbol) if price is None else price
+        return (price - position["entry_price"]) * position["amount"]
+
+    def _used_margin(self):
+        return sum(abs(p["amount"]) * p["entry_price"] / self.leverage.get(s, 20)
+                   for s, p in self.positions.items() if p["amount"] != 0)
+
+    def _available_balance(self):
+        unrealized = sum(self._unrealized(s) for s in self.positions)
+        return self.wallet_balance + unrealized - self._used_margin()
+
+    def _fill(self, symbol, side, quantity, price, order_id, reduce_only=False):
+        """Khớp lệnh MARKET và cập nhật vị thế, số dư, lịch sử giao dịch"""
+        direction = 1 if side == "BUY" else -1
+        fill_price = price * (1 + direction * self.slippage)
+        position = self.positions.setdefault(symbol, {"amount": 0.0, "entry_price": 0.0})
+        amount = position["amount"]
+
+        if reduce_only:
+            if amount == 0 or (amount > 0) == (direction > 0):
+                raise _client_error(-2022, "ReduceOnly Order is rejected.")
+            quantity = min(quantity, abs(amount))
+
+        signed = direction * quantity
+        realized = 0.0
+        if amount == 0 or (amount > 0) == (signed > 0):
+            # Mở mới hoặc tăng vị thế: giá vào lệnh bình quân
+            new_amount = amount + signed
+            position["entry_price"] = (position["entry_price"] * abs(amount) + fill_price * quantity) / abs(new_amount)
+            position["amount"] = new_amount
+        else:
+            # Giảm, đóng hoặc đảo vị thế
+            closed = min(quantity, abs(amount))
+            realized = (fill_price - position["entry_price"]) * closed * (1 if amount > 0 else -1)
+            new_amount = amount + signed
+            if abs(new_amount) < 1e-12:
+                position["amount"], position["entry_price"] = 0.0, 0.0
+            else:
+                if (new_amount > 0) != (amount > 0):
+                    position["entry_price"] = fill_price
+                position["amount"] = new_amount
+
+        commission = fill_price * quantity * self.fee_rate
+        self.wallet_balance += realized - commission
+
+        trade = {
+            "symbol": symbol,
+            "id": self._next_trade_id,
+            "orderId": order_id,
+            "side": side,
+            "price": str(fill_price),
+            "qty": str(quantity),
+            "realizedPnl": str(realized),
+            "marginAsset": "USDT",
+            "quoteQty": str(fill_price * quantity),
+            "commission": str(commission),
+            "commissionAsset": "USDT",
+            "time": self.now,
+            "positionSide": "BOTH",
+            "buyer": side == "BUY",
+            "maker": False
+        }
+        self._next_trade_id += 1
+        self.trades.append(trade)
+
+        if realized:
+            self.income.append(self._income_record(symbol, "REALIZED_PNL", realized, trade["id"]))
+        self.income.append(self._income_record(symbol, "COMMISSION", -commission, trade["id"]))
+        return fill_price, quantity
+
+    def _income_record(self, symbol, income_type, amount, trade_id):
+        return {
+            "symbol": symbol,
+            "incomeType": income_type,
+            "income": str(amount),
+            "asset": "USDT",
+            "info": "",
+            "time": self.now,
+            "tranId": len(self.income) + 1,
+            "tradeId": str(trade_id)
+        }
+
+    def _match_stops(self, symbol, price, timestamp):
+        """Kích hoạt các lệnh STOP_MARKET/TAKE_PROFIT_MARKET khi giá chạm stopPrice"""
+        for order_id, order in list(self.open_orders.items()):
+            if order["symbol"] != symbol:
+                continue
+            stop_price = float(order["stopPrice"])
+            if not self._is_triggered(order, price, stop_price):
+                continue
+
+            del self.open_orders[order_id]
+            position = self.positions.get(symbol, {"amount": 0.0})
+            if position["amount"] == 0:
+                order["status"] = "EXPIRED"
+                continue
+
+            saved_now, self.now = self.now, timestamp
+            try:
+                quantity = abs(position["amount"]) if order["closePosition"] else float(order["origQty"])
+                fill_price, filled = self._fill(symbol, order["side"], quantity, stop_price, order_id,
+                                                reduce_only=True)
+            except ClientError:
+                # Lệnh cùng chiều với vị thế không thể giảm vị thế
+                order["status"] = "EXPIRED"
+                continue
+            finally:
+                self.now = saved_now
+            order.update({"status": "FILLED", "executedQty": str(filled), "avgPrice": str(fill_price),
+                          "updateTime": timestamp})
+            logger.info(f"Lệnh {order['type']} {symbol} #{order_id} đã kích hoạt tại {fill_price}")
+
+            # Vị thế đã đóng: các lệnh closePosition còn lại hết hiệu lực
+            if self.positions[symbol]["amount"] == 0:
+                for other_id, other in list(self.open_orders.items()):
+                    if other["symbol"] == symbol and other["closePosition"]:
+                        other["status"] = "EXPIRED"
+                        del self.open_orders[other_id]
+
+    @staticmethod
+    def _is_triggered(order, price, stop_price):
+        # Lệnh BÁN: STOP kích hoạt khi giá giảm xuống, TAKE_PROFIT khi giá tăng lên (ngược lại với lệnh MUA)
+        rising = (order["type"] == "TAKE_PROFIT_MARKET") == (order["side"] == "SELL")
+        return price >= stop_price if rising else price <= stop_price
+
+    # ------------------------------------------------------------------
+    # Các phương thức tương thích UMFutures
+    # ------------------------------------------------------------------
+
+    def ping(self):
+        return {}
+
+    def time(self):
+        with self.lock:
+            self._sync()
+            return {"serverTime": self.now}
+
+    def exchange_info(self):
+        symbols = set(SYMBOL_SPECS) | set(self.recorded_klines)
+        info = []
+        for symbol in sorted(symbols):
+            _, step_size, tick_size = SYMBOL_SPECS.get(symbol, (100.0, "0.001", "0.01"))
+            info.append({
+                "symbol": symbol,
+                "pair": symbol,
+                "contractType": "PERPETUAL",
+                "status": "TRADING",
+                "baseAsset": symbol[:-4],
+                "quoteAsset": "USDT",
+                "marginAsset": "USDT",
+                "filters": [
+                    {"filterType": "PRICE_FILTER", "tickSize": tick_size, "minPrice": tick_size, "maxPrice": "1000000"},
+                    {"filterType": "LOT_SIZE", "stepSize": step_size, "minQty": step_size, "maxQty": "100000"},
+                    {"filterType": "MARKET_LOT_SIZE", "stepSize": step_size, "minQty": step_size, "maxQty": "10000"},
+                ]
+            })
+        return {"timezone": "UTC", "serverTime": self.now, "symbols": info}
+
+    def change_leverage(self, symbol, leverage, **kwargs):
+        with self.lock:
+            if not 1 <= int(leverage) <= 125:
+                raise _client_error(-4028, "Leverage is not valid")
+            self._series(symbol)
+            self.leverage[symbol] = int(leverage)
+            return {"symbol": symbol, "leverage": int(leverage), "maxNotionalValue": "1000000"}
+
+    def ticker_price(self, symbol=None, **kwargs):
+        with self.lock:
+            self._sync()
+            if symbol is None:
+                return [{"symbol": s, "price": str(self._price(s)), "time": self.now} for s in self.series]
+            return {"symbol": symbol, "price": str(self._price(symbol)), "time": self.now}
+
+    def mark_price(self, symbol=None, **kwargs):
+        with self.lock:
+            self._sync()
+            return {"symbol": symbol, "markPrice": str(self._price(symbol)), "time": self.now}
+
+    def klines(self, symbol, interval, limit=500, startTime=None, endTime=None, **kwargs):
+        with self.lock:
+            self._sync()
+            series = self._series(symbol)
+            current = series.index_at(self.now)
+            end = current + 1
+            start = 0
+            if startTime is not None:
+                start = int(np.searchsorted(series.open_time, startTime, side="left"))
+            if endTime is not None:
+                end = min(end, int(np.searchsorted(series.open_time, endTime, side="right")))
+
+            data = {
+                "open_time": series.open_time[start:end], "open": series.open[start:end],
+                "high": series.high[start:end], "low": series.low[start:end],
+                "close": series.close[start:end], "volume": series.volume[start:end],
+                "close_time": series.open_time[start:end] + CANDLE_MS - 1,
+            }
+            if interval != "1m":
+                data = resample_klines(data, interval)
+
+            if startTime is not None:
+                rows = range(0, min(limit, len(data["open_time"])))
+            else:
+                rows = range(max(0, len(data["open_time"]) - limit), len(data["open_time"]))
+
+            return [[int(data["open_time"][i]), str(data["open"][i]), str(data["high"][i]),
+                     str(data["low"][i]), str(data["close"][i]), str(data["volume"][i]),
+                     int(data["close_time"][i]), str(data["volume"][i] * data["close"][i]), 0,
+                     "0", "0", "0"] for i in rows]
+
+    def account(self, **kwargs):
+        with self.lock:
+            self._sync()
+            unrealized = sum(self._unrealized(s) for s in self.positions)
+            available = self._available_balance()
+            return {
+                "canTrade": True,
+                "canDeposit": True,
+                "canWithdraw": True,
+                "totalWalletBalance": str(self.wallet_balance),
+                "totalUnrealizedProfit": str(unrealized),
+                "totalMarginBalance": str(self.wallet_balance + unrealized),
+                "availableBalance": str(available),
+                "assets": [{
+                    "asset": "USDT",
+                    "walletBalance": str(self.wallet_balance),
+                    "unrealizedProfit": str(unrealized),
+                    "marginBalance": str(self.wallet_balance + unrealized),
+                    "crossWalletBalance": str(self.wallet_balance),
+                    "crossUnPnl": str(unrealized),
+                    "availableBalance": str(available),
+                    "updateTime": self.now
+                }],
+                "positions": [{
+                    "symbol": symbol,
+                    "leverage": str(self.leverage.get(symbol, 20)),
+                    "positionAmt": str(self.positions.get(symbol, {}).get("amount", 0.0)),
+                    "entryPrice": str(self.positions.get(symbol, {}).get("entry_price", 0.0)),
+                    "unrealizedProfit": str(self._unrealized(symbol)),
+                    "positionSide": "BOTH",
+                    "updateTime": self.now
+                } for symbol in self.series]
+            }
+
+    def balance(self, **kwargs):
+        return self.account()["assets"]
+
+    def get_position_risk(self, symbol=None, **kwargs):
+        with self.lock:
+            self._sync()
+            symbols = [symbol] if symbol else list(self.series)
+            result = []
+            for s in symbols:
+                position = self.positions.get(s, {"amount": 0.0, "entry_price": 0.0})
+                leverage = self.leverage.get(s, 20)
+                mark_price = self._price(s)
+                liquidation = 0.0
+                if position["amount"]:
+                    direction = 1 if position["amount"] > 0 else -1
+                    liquidation = position["entry_price"] * (1 - direction / leverage)
+                result.append({
+                    "symbol": s,
+                    "positionAmt": str(position["amount"]),
+                    "entryPrice": str(position["entry_price"]),
+                    "markPrice": str(mark_price),
+                    "unRealizedProfit": str(self._unrealized(s, mark_price)),
+                    "liquidationPrice": str(liquidation),
+                    "leverage": str(leverage),
+                    "marginType": "cross",
+                    "positionSide": "BOTH",
+                    "notional": str(position["amount"] * mark_price),
+                    "updateTime": self.now
+                })
+            return result
+
+    def get_open_orders(self, symbol=None, **kwargs):
+        with self.lock:
+            self._sync()
+            return [dict(o) for o in self.open_orders.values() if symbol is None or o["symbol"] == symbol]
+
+    # Tên phương thức tương ứng trong binance-futures-connector
+    get_orders = get_open_orders
+
+    def get_all_orders(self, symbol, **kwargs):
+        with self.lock:
+            return [dict(o) for o in self.orders.values() if o["symbol"] == symbol]
+
+    def query_order(self, symbol, orderId=None, **kwargs):
+        with self.lock:
+            order = self.orders.get(int(orderId)) if orderId is not None else None
+            if not order or order["symbol"] != symbol:
+                raise _client_error(-2013, "Order does not exist.")
+            return dict(order)
+
+    def new_order_test(self, symbol, side, type, **kwargs):
+        self._series(symbol)
+        return {}
+
+    def new_order(self, symbol, side, type, quantity=None, stopPrice=None, closePosition=False,
+                  reduceOnly=False, price=None, timeInForce=None, **kwargs):
+        with self.lock:
+            self._sync()
+            series = self._series(symbol)
+            closePosition = str(closePosition).lower() == "true"
+            reduceOnly = str(reduceOnly).lower() == "true"
+
+            order_id = self._next_order_id
+            self._next_order_id += 1
+            order = {
+                "orderId": order_id,
+                "symbol": symbol,
+                "status": "NEW",
+                "clientOrderId": kwargs.get("newClientOrderId", f"paper_{order_id}"),
+                "price": str(price or 0),
+                "avgPrice": "0",
+                "origQty": str(quantity or 0),
+                "executedQty": "0",
+                "type": type,
+                "side": side,
+                "stopPrice": str(stopPrice or 0),
+                "closePosition": closePosition,
+                "reduceOnly": reduceOnly,
+                "positionSide": "BOTH",
+                "timeInForce": timeInForce or "GTC",
+                "time": self.now,
+                "updateTime": self.now
+            }
+
+            if type == "MARKET":
+                if not quantity or float(quantity) <= 0:
+                    raise _client_error(-4003, "Quantity less than or equal to zero.")
+                quantity = float(quantity)
+                step = self._step_size(symbol)
+                if abs(round(quantity / step) * step - quantity) > step * 1e-6:
+                    raise _client_error(-1111, "Precision is over the maximum defined for this asset.")
+
+                # Kiểm tra ký quỹ cho phần mở thêm vị thế
+                position = self.positions.get(symbol, {"amount": 0.0})
+                direction = 1 if side == "BUY" else -1
+                opening = quantity if position["amount"] * direction >= 0 else max(0.0, quantity - abs(position["amount"]))
+                if not reduceOnly and opening > 0:
+                    margin = opening * series.price_at(self.now) / self.leverage.get(symbol, 20)
+                    if margin > self._available_balance():
+                        raise _client_error(-2019, "Margin is insufficient.")
+
+                fill_price, filled = self._fill(symbol, side, quantity, self._price(symbol), order_id, reduceOnly)
+                order.update({"status": "FILLED", "avgPrice": str(fill_price), "executedQty": str(filled),
+                              "cumQuote": str(fill_price * filled)})
+            elif type in ("STOP_MARKET", "TAKE_PROFIT_MARKET"):
+                if not stopPrice:
+                    raise _client_error(-1102, "Mandatory parameter 'stopPrice' was not sent, was empty/null, or malformed.")
+                if not closePosition and not quantity:
+                    raise _client_error(-1102, "Mandatory parameter 'quantity' was not sent, was empty/null, or malformed.")
+                if self._is_triggered(order, self._price(symbol), float(stopPrice)):
+                    raise _client_error(-2021, "Order would immediately trigger.")
+                self.open_orders[order_id] = order
+            else:
+                raise _client_error(-1116, "Invalid orderType.")
+
+            self.orders[order_id] = order
+            # Phản hồi của Binance có updateTime cho lệnh vừa đặt
+            response = dict(order)
+            response["updateTime"] = self.now
+            return response
+
+    def cancel_all_open_orders(self, symbol, **kwargs):
+        with self.lock:
+            for order_id, order in list(self.open_orders.items()):
+                if order["symbol"] == symbol:
+                    order["status"] = "CANCELED"
+                    del self.open_orders[order_id]
+            return {"code": 200, "msg": "The operation of cancel all open order is done."}
+
+    # Tên phương thức tương ứng trong binance-futures-connector
+    cancel_open_orders = cancel_all_open_orders
+
+    def get_account_trades(self, symbol, startTime=None, endTime=None, fromId=None, limit=500, **kwargs):
+        with self.lock:
+            result = [t for t in self.trades if t["symbol"] == symbol
+                      and (startTime is None or t["time"] >= startTime)
+                      and (endTime is None or t["time"] <= endTime)
+                      and (fromId is None or t["id"] >= fromId)]
+            return result[:limit]
+
+    def get_income_history(self, symbol=None, incomeType=None, startTime=None, endTime=None, limit=100, **kwargs):
+        with self.lock:
+            result = [i for i in self.income if (symbol is None or i["symbol"] == symbol)
+                      and (incomeType is None or i["incomeType"] == incomeType)
+                      and (startTime is None or i["time"] >= startTime)
+                      and (endTime is None or i["time"] <= endTime)]
+            return result[:limit]
@@ -0,0 +1,136 @@
+"""
+Tính lãi/lỗ trực tiếp cho các vị thế đang mở.
+
+Vị thế được giữ thành các mảng NumPy (giá vào, số lượng, chiều, đòn bẩy, SL, TP) cùng một mảng
+giá đánh dấu theo cặp giao dịch. Mỗi lần giá thay đổi, PnL chưa thực hiện, ROE và khoảng cách
+tới SL/TP của mọi vị thế được tính lại trong một lượt NumPy, và chỉ những vị thế có giá trị
+(đã làm tròn) thay đổi mới được gửi lên giao diện.
+"""
+import numpy as np
+
+from models.trade_store import parse_number
+
+# Các giá trị tính trực tiếp, theo thứ tự hàng của ma trận kết quả
+LIVE_FIELDS = ("pnl", "roe", "sl_distance", "tp_distance")
+
+
+class PnLEngine:
+    """Bộ tính PnL/ROE/khoảng cách SL-TP theo lô cho các vị thế đang mở"""
+
+    def __init__(self, decimals=2):
+        self.decimals = decimals  # Số chữ số thập phân dùng để so sánh thay đổi
+        self.ids = []
+        self.symbols = []  # Các cặp giao dịch có vị thế
+        self.symbol_index = {}  # cặp giao dịch -> vị trí trong marks
+        self.marks = np.empty(0)  # Giá đánh dấu theo cặp giao dịch (NaN = chưa có)
+        self.symbol_codes = np.empty(0, dtype=np.int64)  # vị thế -> vị trí trong marks
+        self.entry = np.empty(0)
+        self.quantity = np.empty(0)
+        self.direction = np.empty(0)  # 1 = Long, -1 = Short
+        self.leverage = np.empty(0)
+        self.stop_loss = np.empty(0)
+        self.take_profit = np.empty(0)
+        self.last = np.empty((len(LIVE_FIELDS), 0))  # Giá trị đã gửi lần trước
+
+    def __len__(self):
+        return len(self.ids)
+
+    def set_positions(self, trades):
+        """
+        Thay danh sách vị thế (các dòng giao dịch đang mở). Giá đánh dấu của các cặp giao dịch
+        vẫn còn vị thế được giữ lại; lần changes() tiếp theo sẽ gửi lại toàn bộ giá trị.
+
+        Returns:
+            set: Các cặp giao dịch có vị thế
+        """
+        positions = [trade for trade in trades
+                     if parse_number(trade.get('price')) > 0 and parse_number(trade.get('quantity')) > 0]
+
+        symbols = []
+        symbol_index = {}
+        for trade in positions:
+            symbol = trade.get('symbol', '')
+            if symbol not in symbol_index:
+                symbol_index[symbol] = len(symbols)
+                symbols.append(symbol)
+
+        marks = np.full(len(symbols), np.nan)
+        for symbol, index in symbol_index.items():
+            old = self.symbol_index.get(symbol)
+            if old is not None:
+                marks[index] = self.marks[old]
+
+        self.ids = [str(trade.get('id', '')) for trade in positions]
+        self.symbols = symbols
+        self.symbol_index = symbol_index
+        self.marks = marks
+        self.symbol_codes = np.array([symbol_index[trade.get('symbol', '')] for trade in positions], dtype=np.int64)
+        self.entry = np.array([parse_number(trade.get('price')) for trade in positions])
+        self.quantity = np.array([parse_number(trade.get('quantity')) for trade in positions])
+        self.direction = np.array([-1.0 if trade.get('side') == "SELL" else 1.0 for trade in positions])
+        leverage = np.array([parse_number(trade.get('leverage')) for trade in positions])
+        self.leverage = np.where(leverage > 0, leverage, 1.0)  # NaN hoặc 0 -> 1x
+        self.stop_loss = np.array([parse_number(trade.get('stop_loss')) for trade in positions])
+        self.take_profit = np.array([parse_number(trade.get('take_profit')) for trade in positions])
+        self.last = np.full((len(LIVE_FIELDS), len(positions)), np.nan)
+        return set(symbols)
+
+    def set_mark(self, symbol, price):
+        """Cập nhật giá đánh dấu, trả về True nếu cặp giao dịch có vị thế và giá thay đổi"""
+        index = self.symbol_index.get(symbol)
+        if index is None or self.marks[index] == price:
+            return False
+        self.marks[index] = price
+        return True
+
+    def seed_mark(self, symbol, price):
+        """Đặt giá đánh dấu ban đầu (từ ảnh chụp REST) chỉ khi cặp giao dịch chưa có giá đẩy nào"""
+        index = self.symbol_index.get(symbol)
+        if index is None or not np.isnan(self.marks[index]):
+            return False
+        self.marks[index] = price
+        return True
+
+    def compute(self):
+        """
+        Tính lại toàn bộ trong một lượt
+
+        Returns:
+            numpy.ndarray: Ma trận (len(LIVE_FIELDS), số vị thế), NaN nếu chưa có giá hoặc không có SL/TP
+        """
+        mark = self.marks[self.symbol_codes]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            pnl = (mark - self.entry) * self.quantity * self.direction
+            margin = self.entry * self.quantity / self.leverage
+            roe = pnl / margin * 100
+            # Khoảng cách (% giá hiện tại): dương = giá còn ở phía an toàn so với SL / chưa tới TP
+            sl_distance = (mark - self.stop_loss) * self.direction / mark * 100
+            tp_distance = (self.take_profit - mark) * self.direction / mark * 100
+        return np.vstack((pnl, roe, sl_distance, tp_distance))
+
+    def changes(self):
+        """
+        Các vị thế có giá trị thay đổi so với lần gọi trước
+
+        Returns:
+            tuple: (danh sách ID, {tên trong LIVE_FIELDS: mảng giá trị theo thứ tự ID})
+        """
+        if not self.ids:
+            return [], {}
+        values = np.round(self.compute(), self.decimals)
+        last = self.last
+        differs = ~((values == last) | (np.isnan(values) & np.isnan(last)))
+        # Vị thế chưa có giá đánh dấu thì giữ nguyên PnL đang hiển thị
+        changed = np.flatnonzero(differs.any(axis=0) & ~np.isnan(self.marks[self.symbol_codes]))
+        if not len(changed):
+            return [], {}
+        last[:, changed] = values[:, changed]
+        ids = [self.ids[index] for index in changed]
+        return ids, {name: values[row, changed] for row, name in enumerate(LIVE_FIELDS)}
+
+    def live_pnl(self):
+        """ID -> PnL hiện tại (đã làm tròn) của các vị thế đã có giá đánh dấu"""
+        if not self.ids:
+            return {}
+        pnl = np.round(self.compute()[0], self.decimals)
+        return {trade_id: float(value) for trade_id, value in zip(self.ids, pnl) if value == value}
@@ -1,137 +1,187 @@
-import os
-import json
-from config.config import SETTINGS_FILE
+"""
+Cài đặt của người dùng lưu trong bảng settings.
 
-class SettingsModel:
-    def __init__(self):
-        self.settings_file = SETTINGS_FILE
-        self._ensure_settings_file_exists()
-    
-    def _ensure_settings_file_exists(self):
-        """Đảm bảo file settings.json tồn tại"""
-        if not os.path.exists(os.path.dirname(self.settings_file)):
-            os.makedirs(os.path.dirname(self.settings_file))
-        
-        if not os.path.exists(self.settings_file):
-            default_settings = {
-                "theme": "light",
-                "chart_style": "candles",
-                "price_alerts": [],
-                "auto_refresh": True,
-                "refresh_interval": 30000  # ms
-            }
-            
-            with open(self.settings_file, "w") as f:
-                json.dump(default_settings, f)
-    
-    def get_settings(self):
-        """Lấy tất cả cài đặt"""
-        try:
-            with open(self.settings_file, "r") as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            # Nếu file không tồn tại hoặc rỗng, tạo dữ liệu mặc định
-            default_settings = {
-                "theme": "light",
-                "chart_style": "candles",
-                "price_alerts": [],
-                "auto_refresh": True,
-                "refresh_interval": 30000  # ms
-            }
-            
-            # Lưu dữ liệu mặc định vào file
-            with open(self.settings_file, "w") as f:
-                json.dump(default_settings, f, indent=4)
-            
-            return default_settings
-    
-    def get_setting(self, key, default=None):
-        """Lấy một cài đặt cụ thể"""
-        settings = self.get_settings()
-        return settings.get(key, default)
-    
-    def update_setting(self, key, value):
-        """Cập nhật một cài đặt"""
-        settings = self.get_settings()
-        settings[key] = value
-        
-        with open(self.settings_file, "w") as f:
-            json.dump(settings, f)
-        
-        return True
-    
-    def update_settings(self, settings_dict):
-        """Cập nhật nhiều cài đặt cùng lúc"""
-        settings = self.get_settings()
-        settings.update(settings_dict)
-        
-        with open(self.settings_file, "w") as f:
-            json.dump(settings, f)
-        
-        return True
-import os
+Cài đặt của mỗi người dùng được đọc từ database một lần rồi giữ trong bộ nhớ (dùng chung trong
+tiến trình), nên các chỗ đọc thường xuyên như thời gian làm mới không chạm tới SQLite. Ghi là
+ghi xuyên: một câu UPSERT rồi cập nhật bộ nhớ và báo cho các listener.
+
+Giá trị được lưu dưới dạng JSON nên đọc lại đúng kiểu (int, bool, list...); các dòng cũ lưu bằng
+str() vẫn đọc được. Giá trị trả về là bản sao sâu, nên sửa list/dict đã đọc không làm đổi bộ nhớ dùng chung.
+"""
+import ast
+import copy
 import json
-from config.config import SETTINGS_FILE, DATABASE_PATH
-from utils.database_manager import DatabaseManager
+import threading
 from config.logging_config import setup_logger
+from utils.database_manager import DatabaseManager
 
 logger = setup_logger(__name__)
 
+# Giá trị mặc định khi người dùng chưa đặt
+DEFAULT_SETTINGS = {
+    "theme": "light",
+    "chart_style": "candles",
+    "price_alerts": [],
+    "auto_refresh": True,
+    "refresh_interval": 10000,  # ms
+}
+
+# username -> {key: giá trị}, dùng chung cho mọi SettingsModel
+_cache = {}
+_cache_lock = threading.RLock()
+
+_listeners = []
+_listeners_lock = threading.Lock()
+
+
+def encode_value(value):
+    """Giá trị -> chuỗi lưu trong cột value"""
+    return json.dumps(value, ensure_ascii=False)
+
+
+def decode_value(text):
+    """Chuỗi trong cột value -> giá trị (JSON, hoặc repr của Python với dòng cũ)"""
+    if text is None:
+        return None
+    try:
+        return json.loads(text)
+    except ValueError:
+        pass
+    try:
+        return ast.literal_eval(text)
+    except (ValueError, SyntaxError):
+        # Không chuyển đổi được: giữ nguyên chuỗi
+        return text
+
+
 class SettingsModel:
-    def __init__(self):
-        self.db = DatabaseManager()
-    
+    def __init__(self, db=None):
+        self.db = db or DatabaseManager()
+
+    def _load(self, username):
+        """Cài đặt của người dùng trong bộ nhớ, đọc từ database ở lần đầu"""
+        settings = _cache.get(username)
+        if settings is not None:
+            return settings
+        with _cache_lock:
+            settings = _cache.get(username)
+            if settings is None:
+                rows = self.db.fetch_all("SELECT key, value FROM settings WHERE username = ?", (username,))
+                settings = _cache[username] = {row[0]: decode_value(row[1]) for row in rows}
+            return settings
+
     def get_user_settings(self, username):
-        """Lấy cài đặt của người dùng"""
-        settings = {}
-        rows = self.db.fetch_all("SELECT * FROM settings WHERE username = ?", (username,))
-        
-        for row in rows:
-            try:
-                # Thử chuyển đổi value từ chuỗi thành giá trị tương ứng
-                import ast
-                value = ast.literal_eval(row['value'])
-            except (ValueError, SyntaxError):
-                # Nếu không chuyển đổi được, giữ nguyên giá trị chuỗi
-                value = row['value']
-            
-            settings[row['key']] = value
-        
-        return settings
-    
+        """Lấy cài đặt của người dùng (bản sao)"""
+        settings = self._load(username)
+        with _cache_lock:
+            return copy.deepcopy(settings)
+
+    def get_user_setting(self, username, key, default=None):
+        """Lấy một cài đặt (bản sao), rơi về DEFAULT_SETTINGS rồi default nếu chưa đặt"""
+        settings = self._load(username)
+        with _cache_lock:
+            value = settings[key] if key in settings else DEFAULT_SETTINGS.get(key, default)
+            return copy.deepcopy(value)
+
     def save_user_setting(self, username, key, value):
         """Lưu một cài đặt của người dùng"""
-        # Chuyển đổi giá trị thành chuỗi để lưu vào database
-        str_value = str(value)
-        
-        # Kiểm tra xem cài đặt đã tồn tại chưa
-        row = self.db.fetch_one("SELECT * FROM settings WHERE username = ? AND key = ?", (username, key))
-        
-        if row:
-            # Cập nhật cài đặt hiện có
-            success = self.db.execute_query(
-                "UPDATE settings SET value = ? WHERE username = ? AND key = ?",
-                (str_value, username, key)
-            )
-        else:
-            # Thêm cài đặt mới
-            success = self.db.execute_query(
-                "INSERT INTO settings (username, key, value) VALUES (?, ?, ?)",
-                (username, key, str_value)
-            )
-        
-        return success
-    
+        with _cache_lock:
+            settings = self._load(username)
+            # So sánh theo giá trị đã mã hóa: True và 1 là hai giá trị khác nhau khi lưu
+            text = encode_value(value)
+            if key in settings and encode_value(settings[key]) == text:
+                return True
+            success = self.db.execute_query("""
+                INSERT INTO settings (username, key, value) VALUES (?, ?, ?)
+                ON CONFLICT (username, key) DO UPDATE SET value = excluded.value
+            """, (username, key, text))
+            if not success:
+                return False
+            settings[key] = decode_value(text)
+        self._notify(username, key, decode_value(text))
+        return True
+
+    def save_user_settings(self, username, values):
+        """Lưu nhiều cài đặt trong một transaction"""
+        with _cache_lock:
+            settings = self._load(username)
+            changed = {}
+            for key, value in values.items():
+                text = encode_value(value)
+                if key not in settings or encode_value(settings[key]) != text:
+                    changed[key] = text
+            if not changed:
+                return True
+            success = self.db.execute_many("""
+                INSERT INTO settings (username, key, value) VALUES (?, ?, ?)
+                ON CONFLICT (username, key) DO UPDATE SET value = excluded.value
+            """, [(username, key, text) for key, text in changed.items()])
+            if not success:
+                return False
+            settings.update({key: decode_value(text) for key, text in changed.items()})
+        for key, text in changed.items():
+            self._notify(username, key, decode_value(text))
+        return True
+
     def delete_user_setting(self, username, key):
         """Xóa một cài đặt của người dùng"""
-        return self.db.execute_query(
-            "DELETE FROM settings WHERE username = ? AND key = ?",
-            (username, key)
-        )
-    
+        with _cache_lock:
+            success = self.db.execute_query(
+                "DELETE FROM settings WHERE username = ? AND key = ?",
+                (username, key)
+            )
+            if not success:
+                return False
+            existed = key in _cache.get(username, {})
+            _cache.get(username, {}).pop(key, None)
+        if existed:
+            self._notify(username, key, None)
+        return True
+
     def delete_all_user_settings(self, username):
         """Xóa tất cả cài đặt của người dùng"""
-        return self.db.execute_query(
-            "DELETE FROM settings WHERE username = ?",
-            (username,)
-        )
+        with _cache_lock:
+            success = self.db.execute_query(
+                "DELETE FROM settings WHERE username = ?",
+                (username,)
+            )
+            if not success:
+                return False
+            removed = _cache.pop(username, {})
+        for key in removed:
+            self._notify(username, key, None)
+        return True
+
+    @staticmethod
+    def invalidate(username=None):
+        """Bỏ cài đặt trong bộ nhớ (sau khi bảng settings bị sửa trực tiếp), lần đọc sau sẽ đọc lại"""
+        with _cache_lock:
+            if username is None:
+                _cache.clear()
+            else:
+                _cache.pop(username, None)
+
+    @staticmethod
+    def add_listener(callback):
+        """Đăng ký hàm nhận thông báo khi cài đặt thay đổi, callback(username, key, giá trị) - None khi bị xóa"""
+        with _listeners_lock:
+            if callback not in _listeners:
+                _listeners.append(callback)
+
+    @staticmethod
+    def remove_listener(callback):
+        """Hủy đăng ký hàm nhận thông báo"""
+        with _listeners_lock:
+            if callback in _listeners:
+                _listeners.remove(callback)
+
+    @staticmethod
+    def _notify(username, key, value):
+        """Gọi các listener (chạy trên thread đã ghi cài đặt, listener phải xử lý nhanh)"""
+        with _listeners_lock:
+            listeners = list(_listeners)
+        for callback in listeners:
+            try:
+                callback(username, key, value)
+            except Exception as e:
+                logger.error(f"Lỗi trong listener cài đặt {key}: {e}")
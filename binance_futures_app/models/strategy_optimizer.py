@@ -0,0 +1,191 @@
+"""
+Tối ưu tham số chiến lược bằng cách chạy song song nhiều backtest trên ProcessPoolExecutor.
+
+Dữ liệu nến của mỗi symbol được đặt một lần vào shared memory; các task chỉ mang theo
+tên vùng nhớ và tham số nên chi phí truyền giữa các process gần như không đổi theo số nến.
+"""
+import os
+import json
+import time
+import random
+import datetime
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from config.logging_config import setup_logger
+from models.backtester import Backtester
+from utils.database_manager import DatabaseManager
+from utils.indicators import METHOD_BASELINE, resample_klines
+
+# Tạo logger cho module này
+logger = setup_logger(__name__)
+
+# Thứ tự các cột khi đóng gói dữ liệu nến vào shared memory
+SHARED_COLUMNS = ("open_time", "open", "high", "low", "close", "volume", "close_time")
+
+# Các tham số được truyền trực tiếp cho Backtester, phần còn lại là tham số chỉ báo
+BACKTEST_PARAMS = ("amount", "leverage", "stop_loss", "stop_loss_percent", "fee_rate",
+                   "slippage", "initial_balance")
+
+# Cache các vùng shared memory đã gắn trong process con
+_attached = {}
+
+
+def _attach_arrays(descriptor):
+    """Gắn vào vùng shared memory trong process con và trả về dict các mảng (không sao chép)"""
+    name, length = descriptor
+    if name not in _attached:
+        shm = shared_memory.SharedMemory(name=name)
+        matrix = np.ndarray((len(SHARED_COLUMNS), length), dtype=np.float64, buffer=shm.buf)
+        arrays = {col: matrix[i] for i, col in enumerate(SHARED_COLUMNS)}
+        arrays["open_time"] = arrays["open_time"].astype(np.int64)
+        arrays["close_time"] = arrays["close_time"].astype(np.int64)
+        _attached[name] = (shm, arrays)
+    return _attached[name][1]
+
+
+def _run_task(task):
+    """Chạy một backtest trong process con, chỉ trả về thống kê để giảm dữ liệu truyền về"""
+    symbol, descriptor, trading_method, params = task
+    try:
+        arrays = _attach_arrays(descriptor)
+
+        timeframe = params.get("timeframe")
+        if timeframe:
+            arrays = resample_klines(arrays, timeframe)
+
+        backtest_kwargs = {k: params[k] for k in BACKTEST_PARAMS if k in params}
+        strategy_params = {k: v for k, v in params.items() if k not in BACKTEST_PARAMS and k != "timeframe"}
+
+        backtester = Backtester(trading_method, strategy_params=strategy_params, symbol=symbol, **backtest_kwargs)
+        result = backtester.run(arrays)
+        return symbol, params, result["stats"], None
+    except Exception as e:
+        return symbol, params, None, str(e)
+
+
+class StrategyOptimizer:
+    """Tìm tham số tốt nhất cho một phương pháp giao dịch trên nhiều symbol"""
+
+    def __init__(self, trading_method=METHOD_BASELINE, max_workers=None, db_path=None):
+        self.trading_method = trading_method
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.db = DatabaseManager(db_path) if db_path else DatabaseManager()
+
+    @staticmethod
+    def grid(param_grid):
+        """
+        Sinh tất cả tổ hợp tham số
+
+        Args:
+            param_grid (dict): Tên tham số -> danh sách giá trị, ví dụ {"leverage": [5, 10], "timeframe": ["5m", "15m"]}
+        """
+        keys = list(param_grid.keys())
+        return [dict(zip(keys, values)) for values in itertools.product(*(param_grid[k] for k in keys))]
+
+    @staticmethod
+    def random_search(param_space, n_iter, seed=None):
+        """
+        Sinh ngẫu nhiên `n_iter` tổ hợp tham số
+
+        Args:
+            param_space (dict): Tên tham số -> danh sách giá trị hoặc tuple (min, max) cho số thực/số nguyên
+        """
+        rng = random.Random(seed)
+        param_sets = []
+        for _ in range(n_iter):
+            params = {}
+            for key, space in param_space.items():
+                if isinstance(space, tuple):
+                    low, high = space
+                    if isinstance(low, int) and isinstance(high, int):
+                        params[key] = rng.randint(low, high)
+                    else:
+                        params[key] = rng.uniform(low, high)
+                else:
+                    params[key] = rng.choice(list(space))
+            param_sets.append(params)
+        return param_sets
+
+    def _share_arrays(self, data):
+        """Đóng gói dữ liệu nến của một symbol vào shared memory"""
+        length = len(data["close"])
+        shm = shared_memory.SharedMemory(create=True, size=max(1, len(SHARED_COLUMNS) * length * 8))
+        matrix = np.ndarray((len(SHARED_COLUMNS), length), dtype=np.float64, buffer=shm.buf)
+        for i, col in enumerate(SHARED_COLUMNS):
+            matrix[i] = data[col]
+        return shm, (shm.name, length)
+
+    def run(self, datasets, param_sets, run_id=None, sort_by="net_profit"):
+        """
+        Chạy tối ưu tham số
+
+        Args:
+            datasets (dict): Symbol -> dữ liệu nến dạng mảng (thường là nến 1m để có thể gộp theo timeframe)
+            param_sets (list): Danh sách tổ hợp tham số (từ grid() hoặc random_search())
+            run_id (str, optional): Mã lần chạy dùng khi lưu kết quả
+            sort_by (str): Chỉ số dùng để sắp xếp kết quả
+
+        Returns:
+            list: Kết quả (symbol, params, stats) đã sắp xếp giảm dần theo `sort_by`
+        """
+        run_id = run_id or datetime.datetime.now().strftime("%Y%m%d%H%M%S")
+        started = time.perf_counter()
+
+        shared = []
+        results = []
+        try:
+            tasks = []
+            for symbol, data in datasets.items():
+                shm, descriptor = self._share_arrays(data)
+                shared.append(shm)
+                tasks.extend((symbol, descriptor, self.trading_method, params) for params in param_sets)
+
+            chunksize = max(1, len(tasks) // (self.max_workers * 4))
+            with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+                for symbol, params, stats, error in executor.map(_run_task, tasks, chunksize=chunksize):
+                    if error:
+                        logger.error(f"Lỗi backtest {symbol} với tham số {params}: {error}")
+                        continue
+                    results.append({"symbol": symbol, "params": params, "stats": stats})
+        finally:
+            for shm in shared:
+                shm.close()
+                shm.unlink()
+
+        elapsed = time.perf_counter() - started
+        logger.info(f"Tối ưu {self.trading_method}: {len(results)} backtest trên {self.max_workers} process "
+                    f"trong {elapsed:.2f}s")
+
+        self.save_results(run_id, results)
+        results.sort(key=lambda r: r["stats"].get(sort_by, 0), reverse=True)
+        return results
+
+    def save_results(self, run_id, results):
+        """Lưu kết quả tối ưu vào bảng optimization_results"""
+        if not results:
+            return True
+
+        created_at = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        rows = []
+        for r in results:
+            stats = r["stats"]
+            rows.append((
+                run_id, r["symbol"], self.trading_method, json.dumps(r["params"], ensure_ascii=False),
+                stats["total_trades"], stats["win_rate"], stats["net_profit"],
+                stats["profit_factor"] if np.isfinite(stats["profit_factor"]) else None,
+                stats["max_drawdown"], stats["return_percent"], created_at
+            ))
+
+        success = self.db.execute_many('''
+            INSERT INTO optimization_results (
+                run_id, symbol, trading_method, params, total_trades, win_rate,
+                net_profit, profit_factor, max_drawdown, return_percent, created_at
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', rows)
+        if not success:
+            logger.error(f"Lỗi khi lưu kết quả tối ưu của lần chạy {run_id}")
+        return success
@@ -0,0 +1,77 @@
+"""
+Bổ sung thông tin khớp lệnh (giá trung bình, số lượng đã khớp, phí) cho giao dịch local.
+
+Các lần khớp được HistorySync đồng bộ vào bảng account_trades, nên enricher chỉ tra bảng đó theo
+orderId (một truy vấn cho cả lô) mà không gọi userTrades. Giá trị mới được ghi lại vào bảng trades
+nên giao dịch đã khớp đủ không cần tra lại; giao dịch chưa có lần khớp nào (lệnh cũ hơn lịch sử đã
+đồng bộ, dòng vị thế POS_...) chỉ tốn một lần tra SQLite khi giao dịch local được đọc lại.
+"""
+from config.logging_config import setup_logger
+from models.account_history import AccountHistoryStore
+from models.trade_store import parse_number
+
+# Tạo logger cho module này
+logger = setup_logger(__name__)
+
+# Sai số tương đối khi so sánh số lượng/giá (tổng float của các lần khớp không bằng đúng số lượng đặt)
+TOLERANCE = 1e-9
+
+
+def _close(a, b):
+    """Hai giá trị bằng nhau trong sai số (giá trị không phải số thì so sánh trực tiếp)"""
+    if isinstance(a, (int, float)) and isinstance(b, (int, float)):
+        return abs(a - b) <= TOLERANCE * max(abs(a), abs(b))
+    return a == b
+
+
+class TradeEnricher:
+    """Tra tổng các lần khớp theo orderId trong account_trades cho các giao dịch còn thiếu thông tin"""
+
+    def __init__(self, trade_model, username, store=None):
+        self.trade_model = trade_model
+        self.username = username
+        self.store = store or AccountHistoryStore()
+
+    @staticmethod
+    def needs_fills(trade):
+        """Giao dịch chưa có (đủ) thông tin khớp lệnh và có thể tra được (ID là orderId)"""
+        if not str(trade.get('id', '')).isdigit():
+            return False
+        filled = parse_number(trade.get('filled_quantity'))
+        if not filled > 0:
+            return True
+        quantity = parse_number(trade.get('quantity'))
+        return quantity == quantity and filled < quantity * (1 - TOLERANCE)
+
+    def enrich(self, trades):
+        """
+        Bổ sung thông tin khớp lệnh cho các giao dịch còn thiếu và lưu lại vào database
+
+        Returns:
+            list: Danh sách giao dịch (dòng đã bổ sung là bản sao mới)
+        """
+        pending = [trade for trade in trades if self.needs_fills(trade)]
+        if not pending:
+            return trades
+        totals = self.store.get_order_totals(self.username, [trade['id'] for trade in pending])
+
+        updated = {}
+        for trade in pending:
+            order = totals.get(str(trade['id']))
+            if order is None or not order["qty"] > 0:
+                continue
+            fields = {
+                'price': order["quote"] / order["qty"],
+                'filled_quantity': order["qty"],
+                'commission': order["commission"],
+                'commission_asset': order["commission_asset"],
+            }
+            if all(_close(trade.get(key), value) for key, value in fields.items()):
+                continue
+            # Bản sao trong bộ nhớ được cập nhật ngay bên dưới: không cần báo đọc lại bảng trades
+            self.trade_model.update_trade(trade['id'], fields, notify=False)
+            updated[str(trade['id'])] = dict(trade, **fields)
+
+        if updated:
+            logger.debug(f"Bổ sung thông tin khớp lệnh cho {len(updated)} giao dịch")
+        return [updated.get(str(trade.get('id', '')), trade) for trade in trades]
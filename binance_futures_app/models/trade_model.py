@@ -1,112 +1,156 @@
 import os
 import json
 import datetime
+import threading
 from config.config import TRADES_FILE, DATABASE_PATH
-from utils.database_manager import DatabaseManager
+from utils.database_manager import DatabaseManager, TRADE_LIFECYCLE_COLUMNS
+from utils.write_behind import get_journal
 from config.logging_config import setup_logger
 
 logger = setup_logger(__name__)
 
+# Các cột của bảng trades (các khóa khác trong trade_info không được ghi)
+TRADE_COLUMNS = ("id", "username", "symbol", "side", "timestamp", "source") + tuple(
+    name for name, _ in TRADE_LIFECYCLE_COLUMNS)
+
+# Trạng thái lệnh vào của Binance ứng với giao dịch còn đang mở
+OPEN_ORDER_STATUSES = ("NEW", "PARTIALLY_FILLED", "FILLED")
+
+# Các hàm nhận thông báo khi bảng trades được ghi
+_listeners = []
+_listeners_lock = threading.Lock()
+
 class TradeModel:
     def __init__(self):
         self.db = DatabaseManager()
+        # Các lệnh ghi giao dịch đi qua hàng đợi ghi trễ để không chờ commit của SQLite
+        self.journal = get_journal()
 
     def get_user_trades(self, username):
         """Lấy lịch sử giao dịch của người dùng"""
-        trades = []
+        # Đảm bảo các giao dịch vừa thêm/cập nhật đã được ghi trước khi đọc
+        self.journal.flush()
+        # Thông tin khớp lệnh từ Binance được bổ sung theo lô bởi TradeEnricher, không gọi API ở đây
         rows = self.db.fetch_all("SELECT * FROM trades WHERE username = ? ORDER BY timestamp DESC", (username,))
-
-        for row in rows:
-            trade = dict(row)
-            # Fetch full trade details from Binance if needed
-            trade_details = self.fetch_trade_from_binance(trade['order_id'])
-            if trade_details:
-                trade.update(trade_details) #Update with details from Binance
-            trades.append(trade)
-
-        return trades
+        return [dict(row) for row in rows]
 
     def add_trade(self, username, trade_info):
-        """Thêm một giao dịch mới - chỉ lưu ID lệnh và thông tin cơ bản"""
+        """
+        Thêm một giao dịch mới (ID là orderId của lệnh vào).
+        Giao dịch được đưa vào hàng đợi ghi trễ, hàm trả về ngay không chờ ghi vào database.
+        """
         try:
-            # Lưu ID giao dịch vào cơ sở dữ liệu
-            trade_id = trade_info.get('order_id', None) # Assuming order_id is provided
+            trade_id = trade_info.get('id', trade_info.get('order_id'))
             if trade_id is None:
                 logger.error("Order ID is missing for trade")
                 return False
-            symbol = trade_info.get('symbol', '')
-            side = trade_info.get('side', '')
-            timestamp = trade_info.get('timestamp', datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
-            source = trade_info.get('source', 'Manual')
-
-
-            query = """
-                    INSERT INTO trades (
-                        id, username, symbol, side, entry_time, source
-                    ) VALUES (?, ?, ?, ?, ?, ?)
+            now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+            row = {column: trade_info[column] for column in TRADE_COLUMNS if column in trade_info}
+            status = trade_info.get('status') or 'OPEN'
+            row.update({
+                'id': str(trade_id),
+                'username': username,
+                'symbol': trade_info.get('symbol', ''),
+                'side': trade_info.get('side', ''),
+                'timestamp': trade_info.get('timestamp') or trade_info.get('entry_time') or now,
+                'source': trade_info.get('source', 'Manual'),
+                'status': 'OPEN' if status in OPEN_ORDER_STATUSES else status,
+                'updated_at': now,
+            })
+            if 'client_order_id' not in row and trade_info.get('clientOrderId'):
+                row['client_order_id'] = trade_info['clientOrderId']
+
+            # INSERT OR IGNORE: câu lệnh có thể được ghi lại từ journal sau khi crash
+            columns = list(row)
+            query = f"""
+                    INSERT OR IGNORE INTO trades ({', '.join(columns)})
+                    VALUES ({', '.join('?' for _ in columns)})
                 """
-            values = (trade_id, username, symbol, side, timestamp, source)
-            success = self.db.execute_query(query, values)
-
-            if success:
-                logger.info(f"Added trade with ID {trade_id} for user {username}")
-                return True
-            else:
-                logger.error(f"Failed to add trade for user {username}")
-                return False
+            self.journal.submit(query, [row[column] for column in columns])
+
+            logger.info(f"Queued trade with ID {trade_id} for user {username}")
+            self.notify_changed(username)
+            return True
 
         except Exception as e:
             logger.exception(f"Error adding trade: {e}")
             return False
 
-    def update_trade(self, trade_id, trade_info):
-        """Cập nhật thông tin giao dịch"""
+    def update_trade(self, trade_id, trade_info, notify=True):
+        """
+        Cập nhật thông tin giao dịch (chỉ các khóa là cột của bảng trades)
+
+        Args:
+            notify (bool): Báo cho các listener; False khi người gọi đã tự cập nhật bản sao trong bộ nhớ
+        """
         update_fields = []
         values = []
 
         for key, value in trade_info.items():
-            if key != "id" and key != "username":  # Không cập nhật id và username
+            # Không cập nhật id và username
+            if key in TRADE_COLUMNS and key not in ("id", "username", "updated_at"):
                 update_fields.append(f"{key} = ?")
                 values.append(value)
 
         if not update_fields:
             return False
 
+        update_fields.append("updated_at = ?")
+        values.append(datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
         # Thêm ID vào cuối danh sách tham số
-        values.append(trade_id)
+        values.append(str(trade_id))
 
         query = f"UPDATE trades SET {', '.join(update_fields)} WHERE id = ?"
-        return self.db.execute_query(query, values)
+        self.journal.submit(query, values)
+        if notify:
+            self.notify_changed(None)
+        return True
 
     def close_trade(self, trade_id, exit_price, exit_time, pnl, status="CLOSED"):
         """Đóng một giao dịch"""
         query = """
         UPDATE trades 
-        SET exit_price = ?, exit_time = ?, pnl = ?, status = ? 
+        SET exit_price = ?, exit_time = ?, pnl = ?, status = ?, updated_at = ?
         WHERE id = ?
         """
-        return self.db.execute_query(query, (exit_price, exit_time, pnl, status, trade_id))
+        updated_at = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self.journal.submit(query, (exit_price, exit_time, pnl, status, updated_at, str(trade_id)))
+        self.notify_changed(None)
+        return True
 
     def delete_trade(self, trade_id):
         """Xóa một giao dịch"""
-        return self.db.execute_query("DELETE FROM trades WHERE id = ?", (trade_id,))
+        # Ghi xong các lệnh đang chờ để giao dịch vừa thêm cũng bị xóa
+        self.journal.flush()
+        success = self.db.execute_query("DELETE FROM trades WHERE id = ?", (trade_id,))
+        self.notify_changed(None)
+        return success
 
     def delete_user_trades(self, username):
         """Xóa tất cả giao dịch của một người dùng"""
-        return self.db.execute_query("DELETE FROM trades WHERE username = ?", (username,))
+        self.journal.flush()
+        success = self.db.execute_query("DELETE FROM trades WHERE username = ?", (username,))
+        self.notify_changed(username)
+        return success
 
     def get_trade_by_order_id(self, order_id):
-        """Lấy thông tin giao dịch theo order_id"""
-        row = self.db.fetch_one("SELECT * FROM trades WHERE order_id = ?", (order_id,))
+        """Lấy thông tin giao dịch theo orderId (cột id) hoặc clientOrderId"""
+        self.journal.flush()
+        row = self.db.fetch_one(
+            "SELECT * FROM trades WHERE id = ? UNION ALL SELECT * FROM trades WHERE client_order_id = ? LIMIT 1",
+            (str(order_id), str(order_id))
+        )
         if row:
             return dict(row)
         return None
 
     def get_open_trades(self, username):
         """Lấy các giao dịch đang mở của người dùng"""
+        self.journal.flush()
         trades = []
         rows = self.db.fetch_all(
-            "SELECT * FROM trades WHERE username = ? AND status = 'OPEN' ORDER BY timestamp DESC", 
+            "SELECT * FROM trades WHERE username = ? AND status = 'OPEN' ORDER BY timestamp DESC",
             (username,)
         )
 
@@ -115,22 +159,30 @@ class TradeModel:
 
         return trades
 
-    def fetch_trade_from_binance(self, order_id):
-        """Placeholder: Fetch trade details from Binance API using order_id"""
-        # Replace this with actual Binance API call
-        # ... Binance API interaction ...
-        # Example return (replace with actual data)
-        return {
-            "symbol": "BTCUSDT",
-            "side": "BUY",
-            "price": 20000,
-            "quantity": 0.1,
-            "amount": 2000,
-            "leverage": 10,
-            "entry_time": "2024-10-27 10:00:00",
-            "exit_time": "2024-10-27 11:00:00",
-            "exit_price": 21000,
-            "pnl": 1000,
-            "status": "CLOSED",
-            "note": "Test trade"
-        }
\ No newline at end of file
+    @staticmethod
+    def add_listener(callback):
+        """Đăng ký hàm nhận thông báo khi bảng trades được ghi, callback(username) - None khi không rõ người dùng"""
+        with _listeners_lock:
+            if callback not in _listeners:
+                _listeners.append(callback)
+
+    @staticmethod
+    def remove_listener(callback):
+        """Hủy đăng ký hàm nhận thông báo"""
+        with _listeners_lock:
+            if callback in _listeners:
+                _listeners.remove(callback)
+
+    @staticmethod
+    def notify_changed(username):
+        """
+        Báo cho các listener rằng giao dịch của người dùng vừa được ghi (hoặc đưa vào journal).
+        Chạy trên thread đã ghi, listener phải xử lý nhanh.
+        """
+        with _listeners_lock:
+            listeners = list(_listeners)
+        for callback in listeners:
+            try:
+                callback(username)
+            except Exception as e:
+                logger.error(f"Lỗi trong listener giao dịch: {e}")
@@ -0,0 +1,378 @@
+"""
+Kho giao dịch dạng cột cho bảng giao dịch.
+
+Các cột số được giữ trong mảng NumPy (NaN = trống), các cột phân loại (cặp giao dịch, loại lệnh,
+nguồn, trạng thái) được mã hóa thành số nguyên nhỏ. Bộ nhớ mỗi hàng cố định và nhỏ, không có
+đối tượng Qt nào cho từng ô - giao diện chỉ định dạng những hàng đang hiển thị.
+"""
+import re
+
+import numpy as np
+
+# Cột số: tên -> khóa trong dict giao dịch
+NUMERIC_COLUMNS = ("price", "quantity", "pnl", "leverage", "stop_loss", "take_profit")
+
+# Cột số chỉ được ghi bởi bộ tính PnL trực tiếp (set_live), không đọc từ dict giao dịch
+LIVE_COLUMNS = ("roe", "sl_distance", "tp_distance")
+
+# Cột phân loại: tên -> (khóa trong dict giao dịch, giá trị mặc định)
+CATEGORY_COLUMNS = {
+    "symbol": ("symbol", ""),
+    "side": ("side", ""),
+    "source": ("source", "Ứng dụng"),
+    "status": ("status", ""),
+}
+
+# Cột số có thể nhận chuỗi mô tả (ví dụ SL "65000.0 (2.5%)"): giữ nguyên chuỗi để hiển thị,
+# giá trị số lấy từ số đứng đầu chuỗi
+TEXT_COLUMNS = ("pnl", "stop_loss", "take_profit")
+
+_LEADING_NUMBER = re.compile(r"\s*[-+]?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?")
+
+# Trạng thái được coi là lệnh đang mở
+OPEN_STATUSES = ("OPEN", "NEW")
+
+INITIAL_CAPACITY = 1024
+
+
+def parse_number(value):
+    """Chuyển giá trị sang float, NaN nếu trống hoặc không phải số"""
+    if value is None or value == "":
+        return np.nan
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        match = _LEADING_NUMBER.match(str(value))
+        return float(match.group(0)) if match else np.nan
+
+
+def _display_text(value):
+    """Chuỗi gốc cần giữ lại để hiển thị, None nếu giá trị là số hoặc trống"""
+    if value is None or value == "" or isinstance(value, (int, float)):
+        return None
+    try:
+        float(value)
+        return None
+    except (TypeError, ValueError):
+        return str(value)
+
+
+class Category:
+    """Bảng mã cho một cột phân loại: giá trị <-> mã số nguyên"""
+
+    def __init__(self):
+        self.values = []
+        self.codes = {}
+
+    def code(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self.codes[value] = code
+            self.values.append(value)
+        return code
+
+    def value(self, code):
+        return self.values[code]
+
+
+class TradeStore:
+    """Danh sách giao dịch lưu theo cột, định danh bằng ID giao dịch"""
+
+    def __init__(self, capacity=INITIAL_CAPACITY):
+        self.size = 0
+        self.capacity = capacity
+        self.ids = []  # ID giao dịch theo thứ tự hàng
+        self.entry_times = []  # Thời gian vào lệnh (chuỗi hiển thị)
+        self._row_by_id = {}  # ID -> hàng
+        self._reindex_from = None  # Các hàng từ đây trở đi cần đánh lại chỉ số trong _row_by_id (sau khi xóa)
+        self.numeric = {name: np.full(capacity, np.nan) for name in NUMERIC_COLUMNS + LIVE_COLUMNS}
+        self.categories = {name: Category() for name in CATEGORY_COLUMNS}
+        self.codes = {name: np.zeros(capacity, dtype=np.int32) for name in CATEGORY_COLUMNS}
+        # Chuỗi gốc không phải số của các cột TEXT_COLUMNS: cột -> {ID: chuỗi}
+        self.texts = {name: {} for name in TEXT_COLUMNS}
+        # Phiên bản dữ liệu: version tăng khi có bất kỳ thay đổi nào,
+        # category_version chỉ tăng khi thêm/xóa hàng hoặc cột phân loại thay đổi
+        self.version = 0
+        self.category_version = 0
+        self._category_indexes = {}  # cột -> (category_version, {mã: các hàng tăng dần})
+        self._sort_orders = {}  # cột -> (phiên bản, thứ tự hàng tăng dần theo cột)
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def row_by_id(self):
+        """ID -> hàng; chỉ số của các hàng phía sau lần xóa gần nhất được đánh lại khi cần"""
+        if self._reindex_from is not None:
+            ids = self.ids
+            for index in range(self._reindex_from, self.size):
+                self._row_by_id[ids[index]] = index
+            self._reindex_from = None
+        return self._row_by_id
+
+    def row_of(self, trade_id):
+        """Hàng của giao dịch, -1 nếu không có"""
+        return self.row_by_id.get(str(trade_id), -1)
+
+    def _ensure_capacity(self, size):
+        if size <= self.capacity:
+            return
+        capacity = self.capacity
+        while capacity < size:
+            capacity *= 2
+        for name, values in self.numeric.items():
+            grown = np.full(capacity, np.nan)
+            grown[:self.size] = values[:self.size]
+            self.numeric[name] = grown
+        for name, values in self.codes.items():
+            grown = np.zeros(capacity, dtype=np.int32)
+            grown[:self.size] = values[:self.size]
+            self.codes[name] = grown
+        self.capacity = capacity
+
+    def _encode(self, trade):
+        """Chuyển dict giao dịch thành (giá trị số, mã phân loại, thời gian)"""
+        numeric = tuple(parse_number(trade.get(name)) for name in NUMERIC_COLUMNS)
+        codes = tuple(self.categories[name].code(trade.get(key, default) or default)
+                      for name, (key, default) in CATEGORY_COLUMNS.items())
+        entry_time = str(trade.get("entry_time", trade.get("timestamp", "")) or "")
+        return numeric, codes, entry_time
+
+    def _write(self, row, trade_id, trade):
+        """Ghi giao dịch vào hàng, trả về True nếu nội dung thay đổi"""
+        numeric, codes, entry_time = self._encode(trade)
+        changed = False
+        for name, value in zip(NUMERIC_COLUMNS, numeric):
+            column = self.numeric[name]
+            old = column[row]
+            if not (old == value or (old != old and value != value)):  # NaN == NaN
+                column[row] = value
+                changed = True
+        for name, code in zip(CATEGORY_COLUMNS, codes):
+            if self.codes[name][row] != code:
+                self.codes[name][row] = code
+                changed = True
+                self.category_version += 1
+        if self.entry_times[row] != entry_time:
+            self.entry_times[row] = entry_time
+            changed = True
+
+        for name, texts in self.texts.items():
+            text = _display_text(trade.get(name))
+            if texts.get(trade_id) != text:
+                if text is None:
+                    texts.pop(trade_id, None)
+                else:
+                    texts[trade_id] = text
+                changed = True
+        if changed:
+            self.version += 1
+        return changed
+
+    def diff(self, trades):
+        """
+        So sánh danh sách giao dịch mới với kho
+
+        Returns:
+            tuple: (hàng cần xóa - giảm dần, giao dịch mới, {ID: giao dịch đã có})
+        """
+        seen = set()
+        new_trades = []
+        existing = {}
+        row_by_id = self.row_by_id
+        for trade in trades:
+            trade_id = str(trade.get("id", ""))
+            if trade_id in seen:
+                continue  # Bỏ qua ID trùng
+            seen.add(trade_id)
+            if trade_id not in row_by_id:
+                new_trades.append(trade)
+            else:
+                existing[trade_id] = trade
+
+        removed = sorted((row for trade_id, row in self.row_by_id.items() if trade_id not in seen), reverse=True)
+        return removed, new_trades, existing
+
+    def append(self, trades):
+        """Thêm các giao dịch mới vào cuối kho"""
+        start = self.size
+        self._ensure_capacity(start + len(trades))
+        for offset, trade in enumerate(trades):
+            row = start + offset
+            trade_id = str(trade.get("id", ""))
+            self.ids.append(trade_id)
+            self.entry_times.append(None)
+            self.row_by_id[trade_id] = row
+            for values in self.numeric.values():
+                values[row] = np.nan
+            for values in self.codes.values():
+                values[row] = -1
+            self.size = row + 1
+            self._write(row, trade_id, trade)
+        self.category_version += 1
+
+    def update(self, trade_id, trade):
+        """Cập nhật giao dịch đã có, trả về hàng nếu nội dung thay đổi, ngược lại -1"""
+        row = self.row_by_id.get(str(trade_id), -1)
+        if row < 0 or not self._write(row, str(trade_id), trade):
+            return -1
+        return row
+
+    def set_live(self, trade_ids, values):
+        """
+        Ghi các giá trị tính trực tiếp (PnL, ROE, khoảng cách SL/TP) cho nhiều giao dịch cùng lúc
+
+        Args:
+            trade_ids (list): ID giao dịch
+            values (dict): tên cột -> mảng giá trị theo thứ tự trade_ids
+
+        Returns:
+            numpy.ndarray: Các hàng đã ghi (bỏ qua ID không có trong kho)
+        """
+        rows = np.array([self.row_by_id.get(str(trade_id), -1) for trade_id in trade_ids], dtype=np.int64)
+        found = rows >= 0
+        rows = rows[found]
+        if not len(rows):
+            return rows
+        for name, column in values.items():
+            self.numeric[name][rows] = np.asarray(column)[found]
+        if "pnl" in values:
+            # PnL giờ là số tính được, bỏ chuỗi gốc nếu có
+            texts = self.texts["pnl"]
+            for row in rows.tolist():
+                texts.pop(self.ids[row], None)
+        self.version += 1
+        return rows
+
+    def remove_row(self, row):
+        """Xóa một hàng, các hàng phía sau dịch lên một vị trí"""
+        self.remove_rows([row])
+
+    def remove_rows(self, rows):
+        """Xóa nhiều hàng, các hàng còn lại giữ nguyên thứ tự (dịch theo từng dải liên tiếp)"""
+        rows = sorted(set(rows))
+        if not rows:
+            return
+        # Chỉ xóa khóa, chưa đánh lại chỉ số: nhiều lần xóa liên tiếp chỉ đánh lại một lần khi cần
+        for row in rows:
+            trade_id = self.ids[row]
+            for texts in self.texts.values():
+                texts.pop(trade_id, None)
+            del self._row_by_id[trade_id]
+
+        # Gom các hàng liên tiếp thành dải và dịch mảng từ dải cuối lên
+        blocks = []
+        for row in rows:
+            if blocks and row == blocks[-1][1] + 1:
+                blocks[-1][1] = row
+            else:
+                blocks.append([row, row])
+        size = self.size
+        columns = list(self.numeric.values()) + list(self.codes.values())
+        for first, last in reversed(blocks):
+            count = last - first + 1
+            for values in columns:
+                values[first:size - count] = values[last + 1:size]
+            del self.ids[first:last + 1]
+            del self.entry_times[first:last + 1]
+            size -= count
+        self.size = size
+        self._reindex_from = rows[0] if self._reindex_from is None else min(self._reindex_from, rows[0])
+        self.version += 1
+        self.category_version += 1
+
+    def clear(self):
+        self.size = 0
+        self.ids = []
+        self.entry_times = []
+        self._row_by_id = {}
+        self._reindex_from = None
+        self.texts = {name: {} for name in TEXT_COLUMNS}
+        self.version += 1
+        self.category_version += 1
+
+    def value(self, row, name):
+        """Giá trị của một ô: float (NaN nếu trống) cho cột số, chuỗi cho cột phân loại"""
+        if name in self.numeric:
+            return self.numeric[name][row]
+        return self.categories[name].value(self.codes[name][row])
+
+    def text(self, row, name):
+        """Chuỗi gốc của một ô thuộc TEXT_COLUMNS, None nếu ô là số"""
+        return self.texts[name].get(self.ids[row])
+
+    def is_open(self, row):
+        return self.value(row, "status") in OPEN_STATUSES
+
+    def column(self, name):
+        """Mảng giá trị (chỉ phần có dữ liệu) của một cột số hoặc mã của cột phân loại"""
+        if name in self.numeric:
+            return self.numeric[name][:self.size]
+        return self.codes[name][:self.size]
+
+    def category_index(self, name):
+        """
+        Chỉ mục của một cột phân loại: mã -> mảng các hàng (tăng dần).
+        Chỉ tính lại khi thêm/xóa hàng hoặc giá trị phân loại thay đổi.
+        """
+        cached = self._category_indexes.get(name)
+        if cached and cached[0] == self.category_version:
+            return cached[1]
+
+        codes = self.codes[name][:self.size]
+        order = np.argsort(codes, kind="stable")
+        sorted_codes = codes[order]
+        index = {}
+        if len(order):
+            bounds = np.flatnonzero(np.diff(sorted_codes)) + 1
+            starts = np.concatenate(([0], bounds))
+            index = dict(zip(sorted_codes[starts].tolist(), np.split(order, bounds)))
+        self._category_indexes[name] = (self.category_version, index)
+        return index
+
+    def rows_matching(self, name, values, exclude=False):
+        """
+        Các hàng (tăng dần) có giá trị cột phân loại thuộc `values`
+        (hoặc không thuộc nếu exclude=True). Chi phí tỷ lệ với số hàng khớp.
+        """
+        index = self.category_index(name)
+        parts = [index[code] for value, code in self.categories[name].codes.items()
+                 if (value in values) != exclude and code in index]
+        if not parts:
+            return np.empty(0, dtype=np.int64)
+        if len(parts) == 1:
+            return parts[0]
+        return np.sort(np.concatenate(parts))
+
+    def sort_order(self, name):
+        """
+        Thứ tự các hàng tăng dần theo một cột (ổn định, NaN ở cuối).
+        name: cột số, cột phân loại, "entry_time" hoặc "id".
+        """
+        by_value = name in self.numeric or name == "entry_time"
+        version = self.version if by_value else self.category_version
+        cached = self._sort_orders.get(name)
+        if cached and cached[0] == version:
+            return cached[1]
+
+        if name in self.numeric:
+            keys = self.numeric[name][:self.size]
+        elif name in self.codes:
+            # Xếp hạng các giá trị của bảng mã theo thứ tự chữ cái
+            values = self.categories[name].values
+            ranks = np.empty(len(values), dtype=np.int64)
+            ranks[np.argsort(np.array(values, dtype=str), kind="stable")] = np.arange(len(values))
+            keys = ranks[self.codes[name][:self.size]]
+        elif name == "entry_time":
+            keys = np.array(self.entry_times, dtype=str)
+        else:
+            # ID của Binance là số, ID khác được so sánh như chuỗi
+            try:
+                keys = np.array([float(trade_id) for trade_id in self.ids])
+            except ValueError:
+                keys = np.array(self.ids, dtype=str)
+
+        order = np.argsort(keys, kind="stable")
+        self._sort_orders[name] = (version, order)
+        return order
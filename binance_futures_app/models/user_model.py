@@ -4,6 +4,7 @@ import os
 import json
 from config.config import USERS_FILE, DATABASE_PATH
 from utils.database_manager import DatabaseManager
+from models.settings_model import SettingsModel
 from config.logging_config import setup_logger
 
 logger = setup_logger(__name__)
@@ -143,7 +144,7 @@ class UserModel:
             return False, "Người dùng không tồn tại"
         
         # Xóa cài đặt của người dùng
-        self.db.execute_query("DELETE FROM settings WHERE username = ?", (username,))
+        SettingsModel(self.db).delete_all_user_settings(username)
         
         # Xóa giao dịch của người dùng
         self.db.execute_query("DELETE FROM trades WHERE username = ?", (username,))
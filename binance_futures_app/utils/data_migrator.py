@@ -1,156 +1,233 @@
+"""
+Di chuyển dữ liệu từ các file JSON cũ (users.json, trades.json, settings.json) sang SQLite.
+
+Mỗi file được đọc dần (utils.json_stream) và ghi theo lô: mỗi lô là một transaction gồm các
+câu UPSERT và vị trí đã đọc trong file (bảng migration_checkpoints). Nếu bị gián đoạn, lần chạy
+sau bỏ qua các bản ghi đã ghi và tiếp tục từ lô kế tiếp; file đã di chuyển xong và không đổi
+thì không đọc lại. Chạy lại một lô không làm sai dữ liệu vì mọi câu lệnh đều là UPSERT.
+"""
 import os
-import json
-import hashlib
+import time
+import datetime
 from config.config import USERS_FILE, TRADES_FILE, SETTINGS_FILE
 from utils.database_manager import DatabaseManager
+from utils.json_stream import JsonStream
+from models.settings_model import SettingsModel, encode_value
 from config.logging_config import setup_logger
 
 # Tạo logger cho module này
 logger = setup_logger(__name__)
 
+# Số bản ghi ghi trong một transaction
+BATCH_SIZE = 5000
+
+USER_UPSERT = """
+    INSERT INTO users (username, password, role, api_key, api_secret) VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT (username) DO UPDATE SET
+        password = excluded.password,
+        role = excluded.role,
+        api_key = excluded.api_key,
+        api_secret = excluded.api_secret
+"""
+
+# Tên trường cũ trong trades.json -> cột của bảng trades (giống TradeModel.add_trade)
+TRADE_KEY_ALIASES = {"order_id": "id", "entry_time": "timestamp", "clientOrderId": "client_order_id"}
+
+# Cài đặt đã có trong database (mới hơn file JSON) được giữ nguyên
+SETTING_UPSERT = """
+    INSERT INTO settings (username, key, value) VALUES (?, ?, ?)
+    ON CONFLICT (username, key) DO NOTHING
+"""
+
+
 class DataMigrator:
     """Công cụ di chuyển dữ liệu từ JSON sang SQLite"""
-    
-    def __init__(self):
-        self.db = DatabaseManager()
-    
+
+    def __init__(self, db=None, batch_size=BATCH_SIZE, progress=None):
+        self.db = db or DatabaseManager()
+        self.batch_size = batch_size
+        self.progress = progress  # callback(tên file, số bản ghi đã xử lý, bản ghi/giây)
+        self.trade_columns = None
+        self.trade_statements = {}  # tuple cột -> câu UPSERT
+        self.skipped_keys = set()
+
     def migrate_users(self):
         """Di chuyển dữ liệu người dùng từ JSON sang SQLite"""
-        try:
-            # Kiểm tra xem file users.json có tồn tại không
-            if not os.path.exists(USERS_FILE):
-                logger.info("File users.json không tồn tại, bỏ qua di chuyển dữ liệu người dùng")
-                return True
-            
-            # Đọc dữ liệu từ file JSON
-            with open(USERS_FILE, "r", encoding="utf-8") as f:
-                users_data = json.load(f)
-            
-            logger.info(f"Đọc được {len(users_data)} người dùng từ file JSON")
-            
-            # Di chuyển dữ liệu vào SQLite
-            for username, user_data in users_data.items():
-                # Kiểm tra xem người dùng đã tồn tại trong database chưa
-                row = self.db.fetch_one("SELECT * FROM users WHERE username = ?", (username,))
-                
-                if row:
-                    # Người dùng đã tồn tại, cập nhật thông tin
-                    self.db.execute_query(
-                        "UPDATE users SET password = ?, role = ?, api_key = ?, api_secret = ? WHERE username = ?",
-                        (
-                            user_data.get("password", ""),
-                            user_data.get("role", "user"),
-                            user_data.get("api_key", ""),
-                            user_data.get("api_secret", ""),
-                            username
-                        )
-                    )
-                else:
-                    # Thêm người dùng mới
-                    self.db.execute_query(
-                        "INSERT INTO users (username, password, role, api_key, api_secret) VALUES (?, ?, ?, ?, ?)",
-                        (
-                            username,
-                            user_data.get("password", ""),
-                            user_data.get("role", "user"),
-                            user_data.get("api_key", ""),
-                            user_data.get("api_secret", "")
-                        )
-                    )
-            
-            logger.info("Di chuyển dữ liệu người dùng thành công")
-            return True
-        
-        except Exception as e:
-            logger.error(f"Lỗi khi di chuyển dữ liệu người dùng: {e}")
-            return False
-    
+        return self._migrate_file(USERS_FILE, self._user_statements)
+
     def migrate_trades(self):
         """Di chuyển dữ liệu giao dịch từ JSON sang SQLite"""
-        try:
-            # Kiểm tra xem file trades.json có tồn tại không
-            if not os.path.exists(TRADES_FILE):
-                logger.info("File trades.json không tồn tại, bỏ qua di chuyển dữ liệu giao dịch")
-                return True
-            
-            # Đọc dữ liệu từ file JSON
-            with open(TRADES_FILE, "r", encoding="utf-8") as f:
-                trades_data = json.load(f)
-            
-            trade_count = 0
-            # Di chuyển dữ liệu vào SQLite
-            for username, user_trades in trades_data.items():
-                for trade_info in user_trades:
-                    # Tạo truy vấn SQL động dựa trên các trường có trong trade_info
-                    fields = ["username"]
-                    values = [username]
-                    placeholders = ["?"]
-                    
-                    for key, value in trade_info.items():
-                        fields.append(key)
-                        values.append(value)
-                        placeholders.append("?")
-                    
-                    query = f"INSERT INTO trades ({', '.join(fields)}) VALUES ({', '.join(placeholders)})"
-                    self.db.execute_query(query, values)
-                    trade_count += 1
-            
-            logger.info(f"Di chuyển {trade_count} giao dịch thành công")
-            return True
-        
-        except Exception as e:
-            logger.error(f"Lỗi khi di chuyển dữ liệu giao dịch: {e}")
-            return False
-    
+        self.trade_columns = {row[1] for row in self.db.fetch_all("PRAGMA table_info(trades)")}
+        success = self._migrate_file(TRADES_FILE, self._trade_statements)
+        if self.skipped_keys:
+            logger.warning(f"Bỏ qua các trường giao dịch không có trong bảng trades: {sorted(self.skipped_keys)}")
+        return success
+
     def migrate_settings(self):
         """Di chuyển dữ liệu cài đặt từ JSON sang SQLite"""
+        success = self._migrate_file(SETTINGS_FILE, self._setting_statements)
+        # Bảng settings vừa được ghi trực tiếp: cài đặt trong bộ nhớ phải đọc lại
+        SettingsModel.invalidate()
+        return success
+
+    def _user_statements(self, stream):
+        """Mỗi người dùng một bản ghi"""
+        for username in stream.iter_object():
+            user_data = stream.read_value()
+            if not isinstance(user_data, dict):
+                yield []
+                continue
+            yield [(USER_UPSERT, (
+                username,
+                user_data.get("password", ""),
+                user_data.get("role", "user"),
+                user_data.get("api_key", ""),
+                user_data.get("api_secret", "")
+            ))]
+
+    def _trade_statements(self, stream):
+        """Mỗi giao dịch một bản ghi; danh sách giao dịch của một người dùng cũng được đọc dần"""
+        for username in stream.iter_object():
+            if stream.peek_type() != "array":
+                stream.read_value()
+                continue
+            for trade_info in stream.iter_array():
+                statement = self._trade_statement(username, trade_info) if isinstance(trade_info, dict) else None
+                yield [statement] if statement else []
+
+    def _trade_statement(self, username, trade_info):
+        """Câu UPSERT cho một giao dịch, chỉ gồm các trường có trong bảng trades"""
+        trade_id = trade_info.get("id", trade_info.get("order_id"))
+        if trade_id is None:
+            return None
+        row = {"id": str(trade_id), "username": username}
+        for key, value in trade_info.items():
+            key = TRADE_KEY_ALIASES.get(key, key)
+            if key == "username" or row.get(key) is not None:
+                continue
+            if key not in self.trade_columns:
+                self.skipped_keys.add(key)
+                continue
+            row[key] = encode_value(value) if isinstance(value, (dict, list)) else value
+
+        columns = tuple(row)
+        query = self.trade_statements.get(columns)
+        if query is None:
+            # Giao dịch đã có được bổ sung các trường còn trống, không ghi đè dữ liệu mới hơn
+            updates = ", ".join(f"{column} = COALESCE(trades.{column}, excluded.{column})"
+                                for column in columns[2:])
+            query = (f"INSERT INTO trades ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+                     f"ON CONFLICT (id, username) DO " + (f"UPDATE SET {updates}" if updates else "NOTHING"))
+            self.trade_statements[columns] = query
+        return query, tuple(row.values())
+
+    def _setting_statements(self, stream):
+        """Mỗi người dùng một bản ghi (gồm mọi cài đặt của người dùng đó)"""
+        for username in stream.iter_object():
+            user_settings = stream.read_value()
+            if not isinstance(user_settings, dict):
+                yield []
+                continue
+            yield [(SETTING_UPSERT, (username, key, encode_value(value)))
+                   for key, value in user_settings.items()]
+
+    def _get_checkpoint(self, path):
+        row = self.db.fetch_one(
+            "SELECT file_size, file_mtime, records, completed FROM migration_checkpoints WHERE source = ?",
+            (path,)
+        )
+        return tuple(row) if row else None
+
+    def _write_batch(self, path, stat, statements, records, completed):
+        """Ghi một lô câu lệnh cùng vị trí đã đọc trong một transaction"""
+        groups = {}
+        for query, params in statements:
+            groups.setdefault(query, []).append(params)
+        with self.db.transaction() as conn:
+            for query, rows in groups.items():
+                conn.executemany(query, rows)
+            conn.execute("""
+                INSERT INTO migration_checkpoints (source, file_size, file_mtime, records, completed, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (source) DO UPDATE SET
+                    file_size = excluded.file_size,
+                    file_mtime = excluded.file_mtime,
+                    records = excluded.records,
+                    completed = excluded.completed,
+                    updated_at = excluded.updated_at
+            """, (path, stat.st_size, stat.st_mtime, records, 1 if completed else 0,
+                  datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+
+    def _migrate_file(self, path, parse):
+        """
+        Di chuyển một file JSON theo lô, tiếp tục từ vị trí đã lưu nếu file không đổi
+
+        Args:
+            parse (callable): parse(JsonStream) -> generator, mỗi bản ghi một danh sách (câu lệnh, tham số)
+        """
+        name = os.path.basename(path)
         try:
-            # Kiểm tra xem file settings.json có tồn tại không
-            if not os.path.exists(SETTINGS_FILE):
-                logger.info("File settings.json không tồn tại, bỏ qua di chuyển dữ liệu cài đặt")
+            if not os.path.exists(path):
+                logger.info(f"File {name} không tồn tại, bỏ qua")
                 return True
-            
-            # Đọc dữ liệu từ file JSON
-            with open(SETTINGS_FILE, "r", encoding="utf-8") as f:
-                settings_data = json.load(f)
-            
-            settings_count = 0
-            # Di chuyển dữ liệu vào SQLite
-            for username, user_settings in settings_data.items():
-                for key, value in user_settings.items():
-                    # Chuyển đổi giá trị thành chuỗi
-                    str_value = str(value)
-                    
-                    # Thêm cài đặt vào database
-                    self.db.execute_query(
-                        "INSERT INTO settings (username, key, value) VALUES (?, ?, ?)",
-                        (username, key, str_value)
-                    )
-                    settings_count += 1
-            
-            logger.info(f"Di chuyển {settings_count} cài đặt thành công")
+
+            stat = os.stat(path)
+            checkpoint = self._get_checkpoint(path)
+            skip = 0
+            if checkpoint and checkpoint[:2] == (stat.st_size, stat.st_mtime):
+                if checkpoint[3]:
+                    logger.info(f"File {name} đã được di chuyển, bỏ qua")
+                    return True
+                skip = checkpoint[2]
+                logger.info(f"Tiếp tục di chuyển {name} từ bản ghi {skip}")
+
+            started = time.monotonic()
+            records = 0
+            batch = []
+            pending = 0
+            with open(path, "r", encoding="utf-8") as f:
+                for statements in parse(JsonStream(f)):
+                    records += 1
+                    if records <= skip:
+                        continue
+                    batch.extend(statements)
+                    pending += 1
+                    if pending >= self.batch_size:
+                        self._write_batch(path, stat, batch, records, False)
+                        batch = []
+                        pending = 0
+                        self._report(name, records - skip, started)
+            self._write_batch(path, stat, batch, records, True)
+
+            rate = self._report(name, records - skip, started)
+            logger.info(f"Di chuyển {records - skip} bản ghi từ {name} thành công ({rate:.0f} bản ghi/giây)")
             return True
-        
+
         except Exception as e:
-            logger.error(f"Lỗi khi di chuyển dữ liệu cài đặt: {e}")
+            logger.error(f"Lỗi khi di chuyển dữ liệu từ {name}: {e}")
             return False
-    
+
+    def _report(self, name, records, started):
+        """Tốc độ di chuyển (bản ghi/giây), gửi cho callback progress nếu có"""
+        elapsed = time.monotonic() - started
+        rate = records / elapsed if elapsed > 0 else 0.0
+        if self.progress:
+            self.progress(name, records, rate)
+        return rate
+
     def run_migration(self):
         """Thực hiện toàn bộ quá trình di chuyển dữ liệu"""
         logger.info("Bắt đầu quá trình di chuyển dữ liệu từ JSON sang SQLite")
-        
-        # Di chuyển dữ liệu người dùng
+        started = time.monotonic()
+
+        # Người dùng trước để cài đặt/giao dịch tham chiếu được tới người dùng
         users_ok = self.migrate_users()
-        
-        # Di chuyển dữ liệu giao dịch
         trades_ok = self.migrate_trades()
-        
-        # Di chuyển dữ liệu cài đặt
         settings_ok = self.migrate_settings()
-        
+
         if users_ok and trades_ok and settings_ok:
-            logger.info("Di chuyển dữ liệu thành công")
+            logger.info(f"Di chuyển dữ liệu thành công trong {time.monotonic() - started:.2f} giây")
             return True
         else:
             logger.error("Có lỗi xảy ra trong quá trình di chuyển dữ liệu")
-            return False
\ No newline at end of file
+            return False
@@ -1,59 +1,420 @@
 import os
 import sqlite3
+import threading
+from contextlib import contextmanager
 from config.config import DATABASE_PATH
 import logging
 from config.logging_config import setup_logger
 
 logger = setup_logger(__name__)
 
+# Thời gian chờ khi database đang bị ghi bởi kết nối khác (giây)
+BUSY_TIMEOUT = 5.0
+
+# Số câu lệnh đã biên dịch được giữ lại trên mỗi kết nối (truy vấn lặp lại không phải biên dịch lại)
+STATEMENT_CACHE_SIZE = 256
+
+# Pragma áp dụng cho mỗi kết nối: WAL cho phép đọc song song khi đang ghi,
+# synchronous=NORMAL chỉ fsync ở checkpoint (an toàn với WAL), cache 16 MB, mmap 256 MB
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA temp_store=MEMORY",
+)
+
+
+class ConnectionPool:
+    """
+    Các kết nối SQLite tới một file database, mỗi thread dùng một kết nối riêng (tạo khi cần).
+    Kết nối của các thread đã kết thúc được đóng khi có thread mới lấy kết nối.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.connections = {}  # thread -> kết nối
+
+    def connection(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is not None:
+            return conn
+
+        conn = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT, check_same_thread=False,
+                               cached_statements=STATEMENT_CACHE_SIZE)
+        conn.row_factory = sqlite3.Row  # Để kết quả truy vấn trả về dưới dạng dictionary
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        self.local.conn = conn
+
+        with self.lock:
+            for thread in [t for t in self.connections if not t.is_alive()]:
+                self.connections.pop(thread).close()
+            self.connections[threading.current_thread()] = conn
+        return conn
+
+    def close_all(self):
+        """Đóng mọi kết nối (gọi khi thoát ứng dụng)"""
+        with self.lock:
+            for conn in self.connections.values():
+                try:
+                    conn.close()
+                except Exception as e:
+                    logger.error(f"Error closing database connection: {e}")
+            self.connections = {}
+            self.local = threading.local()
+
+
+
+# Các cột vòng đời giao dịch thêm vào bảng trades ở phiên bản 2: tên -> kiểu SQLite.
+# Cột `id` là orderId của Binance, `timestamp` là thời điểm vào lệnh.
+TRADE_LIFECYCLE_COLUMNS = (
+    ("client_order_id", "TEXT"),   # clientOrderId của lệnh vào
+    ("price", "REAL"),             # Giá vào trung bình
+    ("quantity", "REAL"),          # Số lượng đặt
+    ("filled_quantity", "REAL"),   # Số lượng đã khớp
+    ("leverage", "INTEGER"),
+    ("stop_loss", "REAL"),
+    ("take_profit", "REAL"),
+    ("status", "TEXT"),            # OPEN / CLOSED / CANCELED
+    ("commission", "REAL"),        # Tổng phí giao dịch
+    ("commission_asset", "TEXT"),
+    ("pnl", "REAL"),               # Lãi/lỗ đã thực hiện
+    ("exit_price", "REAL"),
+    ("exit_time", "TEXT"),
+    ("note", "TEXT"),
+    ("updated_at", "TEXT"),
+)
+
+
+def _create_base_tables(conn):
+    """Phiên bản 1: các bảng ban đầu"""
+    # Tạo bảng users nếu chưa tồn tại
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS users (
+        username TEXT PRIMARY KEY,
+        password TEXT NOT NULL,
+        role TEXT NOT NULL,
+        api_key TEXT,
+        api_secret TEXT
+    )
+    ''')
+
+    # Tạo bảng trades nếu chưa tồn tại
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS trades (
+        id TEXT,
+        username TEXT,
+        symbol TEXT,
+        side TEXT,
+        timestamp TEXT,
+        source TEXT,
+        PRIMARY KEY (id, username)
+    )
+    ''')
+
+    # Tạo bảng settings nếu chưa tồn tại
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS settings (
+        username TEXT NOT NULL,
+        key TEXT NOT NULL,
+        value TEXT,
+        PRIMARY KEY (username, key),
+        FOREIGN KEY (username) REFERENCES users(username)
+    )
+    ''')
+
+    # Tạo bảng kết quả tối ưu tham số chiến lược nếu chưa tồn tại
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS optimization_results (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        run_id TEXT NOT NULL,
+        symbol TEXT NOT NULL,
+        trading_method TEXT NOT NULL,
+        params TEXT NOT NULL,
+        total_trades INTEGER,
+        win_rate REAL,
+        net_profit REAL,
+        profit_factor REAL,
+        max_drawdown REAL,
+        return_percent REAL,
+        created_at TEXT
+    )
+    ''')
+
+    # Tạo bảng đo thời gian các chu kỳ AutoTrader nếu chưa tồn tại
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS autotrader_traces (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        symbol TEXT,
+        trading_method TEXT,
+        cycle_id INTEGER,
+        stage TEXT NOT NULL,
+        started_at TEXT,
+        duration_ms REAL
+    )
+    ''')
+
+
+def _add_trade_lifecycle(conn):
+    """Phiên bản 2: thông tin đầy đủ của giao dịch (khớp lệnh, phí, PnL, SL/TP, thoát lệnh) và index"""
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(trades)")}
+    for name, column_type in TRADE_LIFECYCLE_COLUMNS:
+        if name not in existing:
+            conn.execute(f"ALTER TABLE trades ADD COLUMN {name} {column_type}")
+    # Lịch sử (ORDER BY timestamp) và lệnh đang mở của một người dùng đọc theo index;
+    # tìm theo orderId dùng khóa chính (id, username), theo clientOrderId dùng index riêng
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_trades_user_time ON trades (username, timestamp)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_trades_user_status ON trades (username, status, timestamp)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_trades_client_order ON trades (client_order_id)")
+
+
+def _add_account_history(conn):
+    """Phiên bản 3: lịch sử khớp lệnh, thu nhập của tài khoản Binance và vị trí đồng bộ"""
+    # Các lần khớp lệnh (userTrades), id là ID khớp lệnh của Binance, time tính bằng ms
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS account_trades (
+        username TEXT NOT NULL,
+        symbol TEXT NOT NULL,
+        id INTEGER NOT NULL,
+        order_id TEXT,
+        side TEXT,
+        position_side TEXT,
+        price REAL,
+        qty REAL,
+        quote_qty REAL,
+        realized_pnl REAL,
+        commission REAL,
+        commission_asset TEXT,
+        maker INTEGER,
+        time INTEGER NOT NULL,
+        PRIMARY KEY (username, symbol, id)
+    )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_account_trades_user_time ON account_trades (username, time)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_account_trades_order ON account_trades (username, order_id)")
+
+    # Thu nhập (REALIZED_PNL, COMMISSION, FUNDING_FEE...) của mọi cặp giao dịch
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS income_history (
+        username TEXT NOT NULL,
+        tran_id INTEGER NOT NULL,
+        income_type TEXT NOT NULL,
+        symbol TEXT,
+        income REAL,
+        asset TEXT,
+        info TEXT,
+        trade_id TEXT,
+        time INTEGER NOT NULL,
+        PRIMARY KEY (username, tran_id, income_type)
+    )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_income_user_time ON income_history (username, time)")
+
+    # Vị trí đã đồng bộ: ID khớp lệnh cuối (stream 'trades', theo cặp giao dịch) hoặc thời điểm (stream 'income')
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS sync_cursors (
+        username TEXT NOT NULL,
+        stream TEXT NOT NULL,
+        symbol TEXT NOT NULL DEFAULT '',
+        position INTEGER NOT NULL,
+        updated_at TEXT,
+        PRIMARY KEY (username, stream, symbol)
+    )
+    ''')
+
+
+def _add_closed_positions(conn):
+    """Phiên bản 4: vị thế đã đóng và bảng tổng hợp lãi/lỗ theo ngày, theo cặp giao dịch"""
+    # Mỗi dòng là một lệnh đóng vị thế (order_id, duy nhất theo cặp giao dịch), side là chiều của vị thế,
+    # close_time tính bằng ms
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS closed_positions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT NOT NULL,
+        order_id TEXT NOT NULL,
+        symbol TEXT,
+        side TEXT,
+        entry_price REAL,
+        exit_price REAL,
+        quantity REAL,
+        leverage INTEGER,
+        pnl REAL,
+        commission REAL,
+        source TEXT,
+        timestamp TEXT,
+        close_time INTEGER
+    )
+    ''')
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_closed_positions_order ON closed_positions (username, symbol, order_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_closed_positions_user_time ON closed_positions (username, close_time)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_closed_positions_user_symbol ON closed_positions (username, symbol, close_time)")
+
+    # Tổng hợp cập nhật cùng transaction với closed_positions
+    for table, key in (("daily_pnl", "day TEXT NOT NULL"), ("symbol_pnl", "symbol TEXT NOT NULL")):
+        conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS {table} (
+            username TEXT NOT NULL,
+            {key},
+            trades INTEGER NOT NULL DEFAULT 0,
+            wins INTEGER NOT NULL DEFAULT 0,
+            losses INTEGER NOT NULL DEFAULT 0,
+            gross_profit REAL NOT NULL DEFAULT 0,
+            gross_loss REAL NOT NULL DEFAULT 0,
+            commission REAL NOT NULL DEFAULT 0,
+            pnl REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (username, {key.split()[0]})
+        )
+        ''')
+
+
+# Nhóm thống kê hiệu suất: phạm vi -> biểu thức khóa trên closed_positions
+PERFORMANCE_SCOPES = {
+    "all": "''",
+    "symbol": "symbol",
+    "strategy": "COALESCE(source, '')",
+}
+
+
+def rebuild_performance_stats(conn, scope, username=None, key=None):
+    """
+    Tính lại thống kê hiệu suất của một phạm vi từ closed_positions theo thứ tự thời gian đóng
+    (vốn = tổng PnL tích lũy, sụt giảm = đỉnh vốn trước đó - vốn hiện tại).
+    Chỉ tính lại một người dùng/khóa nếu được truyền vào.
+    """
+    key_expr = PERFORMANCE_SCOPES[scope]
+    conditions = []
+    params = []
+    if username is not None:
+        conditions.append("username = ?")
+        params.append(username)
+    if key is not None:
+        conditions.append(f"{key_expr} = ?")
+        params.append(key)
+    where = " AND ".join(conditions) or "1"
+
+    if username is not None and key is not None:
+        conn.execute("DELETE FROM performance_stats WHERE username = ? AND scope = ? AND key = ?",
+                     (username, scope, key))
+    conn.execute(f"""
+        INSERT OR REPLACE INTO performance_stats (
+            username, scope, key, trades, wins, losses, gross_profit, gross_loss, commission,
+            pnl, peak, max_drawdown, last_close_time
+        )
+        SELECT username, ?, k, COUNT(*), SUM(pnl > 0), SUM(pnl < 0), SUM(MAX(pnl, 0)), SUM(MAX(-pnl, 0)),
+               SUM(commission), SUM(pnl), MAX(MAX(peak, 0)), MAX(MAX(peak, 0) - equity), MAX(close_time)
+        FROM (
+            SELECT *, MAX(equity) OVER (PARTITION BY username, k ORDER BY close_time, id) AS peak
+            FROM (
+                SELECT username, {key_expr} AS k, id, pnl, commission, close_time,
+                       SUM(pnl) OVER (PARTITION BY username, {key_expr} ORDER BY close_time, id) AS equity
+                FROM closed_positions
+                WHERE {where}
+            )
+        )
+        GROUP BY username, k
+    """, [scope] + params)
+
+
+def _add_performance_stats(conn):
+    """Phiên bản 5: thống kê hiệu suất tổng, theo cặp giao dịch và theo chiến lược (thay symbol_pnl)"""
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS performance_stats (
+        username TEXT NOT NULL,
+        scope TEXT NOT NULL,
+        key TEXT NOT NULL,
+        trades INTEGER NOT NULL DEFAULT 0,
+        wins INTEGER NOT NULL DEFAULT 0,
+        losses INTEGER NOT NULL DEFAULT 0,
+        gross_profit REAL NOT NULL DEFAULT 0,
+        gross_loss REAL NOT NULL DEFAULT 0,
+        commission REAL NOT NULL DEFAULT 0,
+        pnl REAL NOT NULL DEFAULT 0,
+        peak REAL NOT NULL DEFAULT 0,
+        max_drawdown REAL NOT NULL DEFAULT 0,
+        last_close_time INTEGER,
+        PRIMARY KEY (username, scope, key)
+    )
+    ''')
+    for scope in PERFORMANCE_SCOPES:
+        rebuild_performance_stats(conn, scope)
+    conn.execute("DROP TABLE IF EXISTS symbol_pnl")
+
+
+def _add_migration_checkpoints(conn):
+    """Phiên bản 6: vị trí đã di chuyển của các file JSON cũ (để tiếp tục khi bị gián đoạn)"""
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS migration_checkpoints (
+        source TEXT PRIMARY KEY,
+        file_size INTEGER,
+        file_mtime REAL,
+        records INTEGER NOT NULL DEFAULT 0,
+        completed INTEGER NOT NULL DEFAULT 0,
+        updated_at TEXT
+    )
+    ''')
+
+
+def _add_trace_run_id(conn):
+    """Phiên bản 7: mã lần chạy của AutoTrader trong autotrader_traces (cycle_id đánh lại từ 1 mỗi lần chạy)"""
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(autotrader_traces)")}
+    if "run_id" not in existing:
+        conn.execute("ALTER TABLE autotrader_traces ADD COLUMN run_id TEXT")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_autotrader_traces_run ON autotrader_traces (run_id, cycle_id)")
+
+
+# Các bước nâng cấp schema theo thứ tự: (phiên bản, hàm nâng cấp).
+# Phiên bản hiện tại của file database lưu trong PRAGMA user_version; thêm bước mới ở cuối,
+# không sửa các bước đã phát hành.
+SCHEMA_MIGRATIONS = (
+    (1, _create_base_tables),
+    (2, _add_trade_lifecycle),
+    (3, _add_account_history),
+    (4, _add_closed_positions),
+    (5, _add_performance_stats),
+    (6, _add_migration_checkpoints),
+    (7, _add_trace_run_id),
+)
+
+
+# Dùng chung trong toàn tiến trình: đường dẫn database -> pool, và các database đã tạo schema
+_pools = {}
+_initialized = set()
+_pools_lock = threading.Lock()
+
+
 class DatabaseManager:
     def __init__(self, db_path=DATABASE_PATH):
         self.db_path = db_path
-        self._ensure_db_exists()
+        key = os.path.abspath(db_path)
+        with _pools_lock:
+            self.pool = _pools.get(key)
+            if self.pool is None:
+                self.pool = _pools[key] = ConnectionPool(db_path)
+            # Chỉ tạo bảng một lần cho mỗi database trong tiến trình
+            if key not in _initialized:
+                self._ensure_db_exists()
+                _initialized.add(key)
+
+    @staticmethod
+    def close_all():
+        """Đóng mọi kết nối của mọi database"""
+        with _pools_lock:
+            for pool in _pools.values():
+                pool.close_all()
 
     def _ensure_db_exists(self):
-        """Đảm bảo database tồn tại và tạo thư mục chứa nếu cần"""
+        """Tạo thư mục chứa database nếu cần và nâng cấp schema lên phiên bản mới nhất"""
         db_dir = os.path.dirname(self.db_path)
-        if not os.path.exists(db_dir):
+        if db_dir and not os.path.exists(db_dir):
             os.makedirs(db_dir)
 
         # Kết nối đến database sẽ tự động tạo file nếu chưa tồn tại
         conn = self.get_connection()
         try:
-            # Tạo bảng users nếu chưa tồn tại
-            conn.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                username TEXT PRIMARY KEY,
-                password TEXT NOT NULL,
-                role TEXT NOT NULL,
-                api_key TEXT,
-                api_secret TEXT
-            )
-            ''')
-
-            # Tạo bảng trades nếu chưa tồn tại
-            conn.execute('''
-            CREATE TABLE IF NOT EXISTS trades (
-                id TEXT,
-                username TEXT,
-                symbol TEXT,
-                side TEXT,
-                timestamp TEXT,
-                source TEXT,
-                PRIMARY KEY (id, username)
-            )
-            ''')
-
-            # Tạo bảng settings nếu chưa tồn tại
-            conn.execute('''
-            CREATE TABLE IF NOT EXISTS settings (
-                username TEXT NOT NULL,
-                key TEXT NOT NULL,
-                value TEXT,
-                PRIMARY KEY (username, key),
-                FOREIGN KEY (username) REFERENCES users(username)
-            )
-            ''')
+            self._migrate(conn)
 
             # Kiểm tra xem đã có user admin chưa
             cursor = conn.execute("SELECT COUNT(*) FROM users WHERE username = 'admin'")
@@ -72,19 +433,64 @@ class DatabaseManager:
         except Exception as e:
             logger.error(f"Error initializing database: {e}")
             conn.rollback()
-        finally:
-            conn.close()
+
+    def _migrate(self, conn):
+        """Chạy các bước trong SCHEMA_MIGRATIONS mới hơn PRAGMA user_version, mỗi bước một transaction"""
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for target, migrate in SCHEMA_MIGRATIONS:
+            if target <= version:
+                continue
+            with self.transaction():
+                # Đọc lại trong transaction: tiến trình khác có thể vừa nâng cấp xong
+                version = conn.execute("PRAGMA user_version").fetchone()[0]
+                if target <= version:
+                    continue
+                migrate(conn)
+                conn.execute(f"PRAGMA user_version = {target}")
+            version = target
+            logger.info(f"Database {self.db_path} đã nâng cấp schema lên phiên bản {target}")
 
     def get_connection(self):
-        """Trả về kết nối đến database"""
+        """Trả về kết nối của thread hiện tại (dùng lại giữa các lần gọi, người gọi không đóng)"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            conn.row_factory = sqlite3.Row  # Để kết quả truy vấn trả về dưới dạng dictionary
-            return conn
+            return self.pool.connection()
         except Exception as e:
             logger.error(f"Error connecting to database: {e}")
             raise
 
+    def in_transaction(self):
+        """Thread hiện tại có đang ở trong khối transaction() không"""
+        return getattr(self.pool.local, "depth", 0) > 0
+
+    @contextmanager
+    def transaction(self):
+        """
+        Gom nhiều câu lệnh vào một transaction: commit một lần khi khối lệnh kết thúc,
+        rollback nếu có lỗi. Có thể lồng nhau (chỉ khối ngoài cùng commit).
+
+        Ví dụ:
+            with db.transaction() as conn:
+                conn.execute(...)
+                db.execute_query(...)  # không tự commit khi đang trong transaction
+        """
+        conn = self.get_connection()
+        local = self.pool.local
+        depth = getattr(local, "depth", 0)
+        if depth == 0:
+            # Giữ khóa ghi ngay từ đầu để không bị "database is locked" giữa chừng
+            conn.execute("BEGIN IMMEDIATE")
+        local.depth = depth + 1
+        try:
+            yield conn
+        except Exception:
+            local.depth = depth
+            if depth == 0:
+                conn.rollback()
+            raise
+        local.depth = depth
+        if depth == 0:
+            conn.commit()
+
     def execute_query(self, query, params=None):
         """Thực thi truy vấn không trả về dữ liệu"""
         conn = self.get_connection()
@@ -93,20 +499,38 @@ class DatabaseManager:
                 conn.execute(query, params)
             else:
                 conn.execute(query)
-            conn.commit()
+            if not self.in_transaction():
+                conn.commit()
             return True
         except Exception as e:
             logger.error(f"Error executing query: {query}, error: {e}")
-            conn.rollback()
+            if not self.in_transaction():
+                conn.rollback()
+            return False
+
+    def execute_many(self, query, params_list):
+        """
+        Thực thi một câu lệnh cho nhiều bộ tham số trong một transaction (một lần commit)
+
+        Args:
+            query (str): Câu lệnh có tham số
+            params_list (iterable): Các bộ tham số (có thể là generator)
+
+        Returns:
+            bool: True nếu thành công, False nếu lỗi (toàn bộ các dòng bị hủy)
+        """
+        try:
+            with self.transaction() as conn:
+                conn.executemany(query, params_list)
+            return True
+        except Exception as e:
+            logger.error(f"Error executing execute_many query: {query}, error: {e}")
             return False
-        finally:
-            conn.close()
 
     def fetch_one(self, query, params=None):
         """Thực thi truy vấn và trả về một bản ghi"""
-        conn = self.get_connection()
+        cursor = self.get_connection().cursor()
         try:
-            cursor = conn.cursor()
             if params:
                 cursor.execute(query, params)
             else:
@@ -116,13 +540,12 @@ class DatabaseManager:
             logger.error(f"Error executing fetch_one query: {query}, error: {e}")
             return None
         finally:
-            conn.close()
+            cursor.close()
 
     def fetch_all(self, query, params=None):
         """Thực thi truy vấn và trả về tất cả bản ghi"""
-        conn = self.get_connection()
+        cursor = self.get_connection().cursor()
         try:
-            cursor = conn.cursor()
             if params:
                 cursor.execute(query, params)
             else:
@@ -132,4 +555,4 @@ class DatabaseManager:
             logger.error(f"Error executing fetch_all query: {query}, error: {e}")
             return []
         finally:
-            conn.close()
\ No newline at end of file
+            cursor.close()
@@ -0,0 +1,21 @@
+import datetime
+
+# Múi giờ hiển thị của ứng dụng (+7)
+LOCAL_TIMEZONE = datetime.timezone(datetime.timedelta(hours=7))
+
+
+def format_timestamp(timestamp_ms):
+    """Chuyển thời gian Binance (mili giây, UTC) sang chuỗi ở múi giờ +7"""
+    utc_time = datetime.datetime.fromtimestamp(timestamp_ms / 1000, datetime.timezone.utc)
+    return utc_time.astimezone(LOCAL_TIMEZONE).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def parse_timestamp(text):
+    """Chuỗi thời gian ở múi giờ +7 ("YYYY-MM-DD HH:MM:SS") -> mili giây UTC, None nếu không đọc được"""
+    if not text:
+        return None
+    try:
+        local_time = datetime.datetime.strptime(str(text)[:19], "%Y-%m-%d %H:%M:%S")
+    except ValueError:
+        return None
+    return int(local_time.replace(tzinfo=LOCAL_TIMEZONE).timestamp() * 1000)
@@ -0,0 +1,230 @@
+"""
+Module tính toán chỉ báo và tín hiệu giao dịch dạng vector (NumPy).
+Được dùng chung bởi AutoTrader (giao dịch thật) và Backtester (kiểm thử lịch sử)
+để đảm bảo hai nơi sử dụng cùng một logic chiến lược.
+"""
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Tên các phương pháp giao dịch (trùng với tradingMethodComboBox)
+METHOD_BASELINE = "Đường Base Line"
+METHOD_ICHIMOKU = "Mây Ichimoku"
+
+# Tham số mặc định cho từng phương pháp
+DEFAULT_PARAMS = {
+    METHOD_BASELINE: {"baseline_period": 26},
+    METHOD_ICHIMOKU: {"tenkan_period": 9, "kijun_period": 26, "senkou_b_period": 52, "displacement": 26},
+}
+
+# Độ dài của các khung thời gian (mili giây)
+INTERVAL_MS = {
+    "1m": 60_000, "3m": 180_000, "5m": 300_000, "15m": 900_000, "30m": 1_800_000,
+    "1h": 3_600_000, "2h": 7_200_000, "4h": 14_400_000, "6h": 21_600_000,
+    "8h": 28_800_000, "12h": 43_200_000, "1d": 86_400_000,
+}
+
+
+def klines_to_arrays(klines):
+    """
+    Chuyển dữ liệu nến dạng list của Binance sang dict các mảng NumPy
+
+    Args:
+        klines (list): Danh sách nến [open_time, open, high, low, close, volume, close_time, ...]
+
+    Returns:
+        dict: Các mảng open_time, open, high, low, close, volume, close_time
+    """
+    if isinstance(klines, dict):
+        return klines
+
+    if not klines:
+        empty_f = np.empty(0, dtype=np.float64)
+        empty_i = np.empty(0, dtype=np.int64)
+        return {"open_time": empty_i, "open": empty_f, "high": empty_f, "low": empty_f,
+                "close": empty_f, "volume": empty_f, "close_time": empty_i}
+
+    raw = np.array([k[:7] for k in klines], dtype=object)
+    return {
+        "open_time": raw[:, 0].astype(np.int64),
+        "open": raw[:, 1].astype(np.float64),
+        "high": raw[:, 2].astype(np.float64),
+        "low": raw[:, 3].astype(np.float64),
+        "close": raw[:, 4].astype(np.float64),
+        "volume": raw[:, 5].astype(np.float64),
+        "close_time": raw[:, 6].astype(np.int64),
+    }
+
+
+def resample_klines(data, interval):
+    """
+    Gộp nến khung nhỏ (thường là 1m) thành khung thời gian lớn hơn
+
+    Args:
+        data (dict): Dữ liệu nến dạng mảng
+        interval (str): Khung thời gian đích, ví dụ "15m", "1h"
+
+    Returns:
+        dict: Dữ liệu nến đã gộp, cùng định dạng với đầu vào
+    """
+    step = INTERVAL_MS[interval]
+    open_time = np.asarray(data["open_time"], dtype=np.int64)
+    if len(open_time) < 2 or open_time[1] - open_time[0] >= step:
+        return data
+
+    # Chỉ số bắt đầu của mỗi nhóm nến
+    bucket = open_time // step
+    starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    ends = np.r_[starts[1:], len(open_time)] - 1
+
+    return {
+        "open_time": bucket[starts] * step,
+        "open": np.asarray(data["open"])[starts],
+        "high": np.maximum.reduceat(np.asarray(data["high"]), starts),
+        "low": np.minimum.reduceat(np.asarray(data["low"]), starts),
+        "close": np.asarray(data["close"])[ends],
+        "volume": np.add.reduceat(np.asarray(data["volume"]), starts),
+        "close_time": bucket[starts] * step + step - 1,
+    }
+
+
+def rolling_max(values, period):
+    """Giá trị lớn nhất trên cửa sổ trượt, các vị trí chưa đủ dữ liệu là NaN"""
+    result = np.full(len(values), np.nan)
+    if len(values) >= period:
+        result[period - 1:] = sliding_window_view(values, period).max(axis=1)
+    return result
+
+
+def rolling_min(values, period):
+    """Giá trị nhỏ nhất trên cửa sổ trượt, các vị trí chưa đủ dữ liệu là NaN"""
+    result = np.full(len(values), np.nan)
+    if len(values) >= period:
+        result[period - 1:] = sliding_window_view(values, period).min(axis=1)
+    return result
+
+
+def shift(values, periods):
+    """Dịch mảng về phía sau `periods` vị trí, phần đầu điền NaN"""
+    result = np.full(len(values), np.nan)
+    if periods < len(values):
+        result[periods:] = values[:len(values) - periods]
+    return result
+
+
+def calculate_baseline(high, low, period=26):
+    """Đường Base Line (Kijun-sen): trung bình của đỉnh cao nhất và đáy thấp nhất trong `period` nến"""
+    return (rolling_max(high, period) + rolling_min(low, period)) / 2
+
+
+def calculate_ichimoku(high, low, tenkan_period=9, kijun_period=26, senkou_b_period=52, displacement=26):
+    """
+    Tính các thành phần của mây Ichimoku
+
+    Returns:
+        dict: tenkan, kijun, senkou_a, senkou_b (đã dịch `displacement` nến về tương lai,
+              nên giá trị tại nến i là mây đang hiển thị tại nến i)
+    """
+    tenkan = calculate_baseline(high, low, tenkan_period)
+    kijun = calculate_baseline(high, low, kijun_period)
+    senkou_a = shift((tenkan + kijun) / 2, displacement)
+    senkou_b = shift(calculate_baseline(high, low, senkou_b_period), displacement)
+    return {"tenkan": tenkan, "kijun": kijun, "senkou_a": senkou_a, "senkou_b": senkou_b}
+
+
+def _crossed(condition):
+    """Trả về mảng bool đánh dấu các nến mà điều kiện vừa chuyển từ False sang True"""
+    result = np.zeros(len(condition), dtype=bool)
+    result[1:] = condition[1:] & ~condition[:-1]
+    return result
+
+
+def baseline_signals(data, baseline_period=26):
+    """
+    Tín hiệu theo Đường Base Line
+
+    - MUA khi giá đóng cửa cắt lên trên baseline, BÁN khi cắt xuống dưới
+    - Đóng vị thế MUA khi giá đóng cửa nằm dưới baseline và ngược lại
+
+    Returns:
+        dict: signal (int8: 1 = BUY, -1 = SELL, 0 = không có), close_long, close_short (bool), baseline
+    """
+    close = data["close"]
+    baseline = calculate_baseline(data["high"], data["low"], baseline_period)
+
+    # So sánh với NaN luôn cho False nên các nến chưa đủ dữ liệu không tạo tín hiệu
+    above = close > baseline
+    below = close < baseline
+
+    signal = np.zeros(len(close), dtype=np.int8)
+    signal[_crossed(above)] = 1
+    signal[_crossed(below)] = -1
+
+    return {
+        "signal": signal,
+        "close_long": below,
+        "close_short": above,
+        "baseline": baseline,
+    }
+
+
+def ichimoku_signals(data, tenkan_period=9, kijun_period=26, senkou_b_period=52, displacement=26):
+    """
+    Tín hiệu theo Mây Ichimoku
+
+    - MUA khi giá nằm trên mây và Tenkan > Kijun (lần đầu thỏa mãn), BÁN khi ngược lại
+    - Đóng vị thế khi giá đóng cửa cắt qua Kijun theo chiều ngược với vị thế
+
+    Returns:
+        dict: signal, close_long, close_short, baseline (Kijun) cùng các đường Ichimoku
+    """
+    close = data["close"]
+    lines = calculate_ichimoku(data["high"], data["low"], tenkan_period, kijun_period,
+                               senkou_b_period, displacement)
+    tenkan, kijun = lines["tenkan"], lines["kijun"]
+    cloud_top = np.fmax(lines["senkou_a"], lines["senkou_b"])
+    cloud_bottom = np.fmin(lines["senkou_a"], lines["senkou_b"])
+
+    bullish = (close > cloud_top) & (tenkan > kijun)
+    bearish = (close < cloud_bottom) & (tenkan < kijun)
+
+    signal = np.zeros(len(close), dtype=np.int8)
+    signal[_crossed(bullish)] = 1
+    signal[_crossed(bearish)] = -1
+
+    result = {
+        "signal": signal,
+        "close_long": close < kijun,
+        "close_short": close > kijun,
+        "baseline": kijun,
+    }
+    result.update(lines)
+    return result
+
+
+STRATEGIES = {
+    METHOD_BASELINE: baseline_signals,
+    METHOD_ICHIMOKU: ichimoku_signals,
+}
+
+
+def generate_signals(trading_method, data, params=None):
+    """
+    Sinh tín hiệu cho toàn bộ chuỗi nến theo phương pháp giao dịch
+
+    Args:
+        trading_method (str): Tên phương pháp (Đường Base Line / Mây Ichimoku)
+        data (dict | list): Dữ liệu nến dạng mảng hoặc list của Binance
+        params (dict, optional): Tham số chỉ báo, ghi đè DEFAULT_PARAMS
+
+    Returns:
+        dict: Kết quả tín hiệu (xem baseline_signals / ichimoku_signals)
+    """
+    # Phương pháp không xác định sẽ dùng Base Line, giống AutoTrader
+    if trading_method not in STRATEGIES:
+        trading_method = METHOD_BASELINE
+
+    strategy_params = dict(DEFAULT_PARAMS[trading_method])
+    if params:
+        strategy_params.update({k: v for k, v in params.items() if k in strategy_params})
+
+    return STRATEGIES[trading_method](klines_to_arrays(data), **strategy_params)
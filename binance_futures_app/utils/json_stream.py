@@ -0,0 +1,109 @@
+"""
+Đọc dần một file JSON lớn mà không nạp cả file vào bộ nhớ.
+
+File được đọc theo từng khối; các phần tử của object/mảng ngoài cùng được giải mã lần lượt bằng
+json.JSONDecoder.raw_decode, nên bộ nhớ chỉ cần đủ cho một phần tử.
+
+Ví dụ (file {"user": [{...}, {...}], ...}):
+    with open(path, "r", encoding="utf-8") as f:
+        stream = JsonStream(f)
+        for username in stream.iter_object():
+            for trade in stream.iter_array():
+                ...
+"""
+import json
+
+# Số ký tự đọc mỗi lần
+CHUNK_SIZE = 1 << 16
+
+_WHITESPACE = " \t\n\r"
+
+
+class JsonStream:
+    def __init__(self, f, chunk_size=CHUNK_SIZE):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self, size=None):
+        """Đọc thêm một khối vào bộ đệm (bỏ phần đã xử lý), trả về False nếu hết file"""
+        if self.eof:
+            return False
+        chunk = self.f.read(size or self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def _peek(self):
+        """Ký tự khác khoảng trắng tiếp theo ('' nếu hết file)"""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ""
+
+    def _expect(self, char):
+        found = self._peek()
+        if found != char:
+            raise ValueError(f"JSON không hợp lệ: cần '{char}', gặp '{found}' ở vị trí {self.pos}")
+        self.pos += 1
+
+    def read_value(self):
+        """Giải mã giá trị JSON tiếp theo"""
+        self._peek()
+        size = self.chunk_size
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+                # Số ở cuối bộ đệm có thể còn chữ số chưa đọc: đọc thêm rồi giải mã lại
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            # Giá trị lớn hơn bộ đệm: tăng dần kích thước khối để không giải mã lại quá nhiều lần
+            self._fill(size)
+            size *= 2
+
+    def _next_item(self, close, first):
+        """Bỏ qua dấu ',' giữa các phần tử; trả về False khi gặp dấu đóng"""
+        if self._peek() == close:
+            self.pos += 1
+            return False
+        if not first:
+            self._expect(",")
+        return True
+
+    def iter_object(self):
+        """
+        Duyệt object: trả về từng khóa, người gọi phải đọc giá trị tương ứng
+        (read_value, iter_object hoặc iter_array) trước khi lấy khóa tiếp theo
+        """
+        self._expect("{")
+        first = True
+        while self._next_item("}", first):
+            first = False
+            key = self.read_value()
+            self._expect(":")
+            yield key
+
+    def iter_array(self):
+        """Duyệt mảng: trả về từng phần tử đã giải mã"""
+        self._expect("[")
+        first = True
+        while self._next_item("]", first):
+            first = False
+            yield self.read_value()
+
+    def peek_type(self):
+        """Kiểu của giá trị tiếp theo: 'object', 'array' hoặc 'value'"""
+        return {"{": "object", "[": "array"}.get(self._peek(), "value")
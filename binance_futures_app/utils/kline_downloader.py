@@ -0,0 +1,104 @@
+import time
+
+from binance.um_futures import UMFutures
+from binance.error import ClientError
+from config.logging_config import setup_logger
+from models.kline_store import KlineStore
+from utils.indicators import INTERVAL_MS
+
+# Tạo logger cho module này
+logger = setup_logger(__name__)
+
+# Số nến tối đa mỗi lần gọi API klines
+KLINES_PAGE_LIMIT = 1000
+
+
+class KlineDownloader:
+    """
+    Tải hàng loạt dữ liệu nến lịch sử vào KlineStore.
+    Mỗi (symbol, interval) tiếp tục từ nến cuối cùng đã lưu nên có thể dừng và chạy lại bất cứ lúc nào.
+    """
+
+    def __init__(self, store=None, client=None, request_delay=0.1, max_retries=5):
+        self.store = store or KlineStore()
+        # klines là API công khai, không cần API key
+        self.client = client or UMFutures()
+        self.request_delay = request_delay
+        self.max_retries = max_retries
+        self.running = True
+
+    def stop(self):
+        """Dừng tải sau trang hiện tại"""
+        self.running = False
+
+    def _fetch_page(self, symbol, interval, start_time, end_time):
+        """Lấy một trang nến, tự thử lại khi bị giới hạn tần suất"""
+        delay = 1.0
+        for attempt in range(self.max_retries):
+            try:
+                return self.client.klines(symbol=symbol, interval=interval, startTime=start_time,
+                                          endTime=end_time, limit=KLINES_PAGE_LIMIT)
+            except ClientError as e:
+                # 429/418: vượt giới hạn tần suất, chờ rồi thử lại
+                if e.status_code in (418, 429) and attempt < self.max_retries - 1:
+                    logger.warning(f"Bị giới hạn tần suất khi tải {symbol} {interval}, chờ {delay}s")
+                    time.sleep(delay)
+                    delay *= 2
+                    continue
+                raise
+        return []
+
+    def download(self, symbol, interval, start_time, end_time=None, progress_callback=None):
+        """
+        Tải nến cho một cặp giao dịch và khung thời gian
+
+        Args:
+            start_time (int): Thời điểm bắt đầu (ms) nếu kho chưa có dữ liệu
+            end_time (int, optional): Thời điểm kết thúc (ms), mặc định là hiện tại
+            progress_callback (callable, optional): Gọi với (symbol, interval, số nến đã ghi, open_time cuối)
+
+        Returns:
+            int: Số nến mới đã ghi
+        """
+        step = INTERVAL_MS[interval]
+        end_time = end_time or int(time.time() * 1000)
+
+        last_time = self.store.last_open_time(symbol, interval)
+        cursor = last_time + step if last_time is not None else start_time
+
+        written = 0
+        while self.running and cursor <= end_time:
+            page = self._fetch_page(symbol, interval, cursor, end_time)
+            if not page:
+                break
+
+            # Chỉ lưu các nến đã đóng
+            now = int(time.time() * 1000)
+            closed = [k for k in page if int(k[6]) < now]
+            written += self.store.append(symbol, interval, closed)
+
+            if len(closed) < len(page) or len(page) < KLINES_PAGE_LIMIT:
+                break
+
+            cursor = int(page[-1][0]) + step
+            if progress_callback:
+                progress_callback(symbol, interval, written, int(page[-1][0]))
+            time.sleep(self.request_delay)
+
+        logger.info(f"Đã tải {written} nến {symbol} {interval}")
+        return written
+
+    def download_many(self, symbols, intervals, start_time, end_time=None, progress_callback=None):
+        """Tải nến cho nhiều cặp giao dịch và khung thời gian, trả về dict (symbol, interval) -> số nến mới"""
+        results = {}
+        for symbol in symbols:
+            for interval in intervals:
+                if not self.running:
+                    return results
+                try:
+                    results[(symbol, interval)] = self.download(symbol, interval, start_time, end_time,
+                                                                progress_callback)
+                except Exception as e:
+                    logger.error(f"Lỗi khi tải nến {symbol} {interval}: {e}")
+                    results[(symbol, interval)] = 0
+        return results
@@ -0,0 +1,150 @@
+"""
+Đo thời gian từng giai đoạn trong mỗi chu kỳ của AutoTrader
+(lấy nến -> tính chỉ báo -> quyết định tín hiệu -> tính khối lượng -> gửi lệnh -> xác nhận).
+
+Kết quả được giữ trong ring buffer để tính phân vị nhanh và được lưu vào bảng
+autotrader_traces để phân tích lâu dài. Mỗi lần chạy AutoTrader có một run_id riêng;
+cycle_id chỉ duy nhất trong một lần chạy nên các dòng được phân biệt bằng (run_id, cycle_id).
+"""
+import time
+import uuid
+import datetime
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+import numpy as np
+
+from config.logging_config import setup_logger
+from utils.database_manager import DatabaseManager
+
+# Tạo logger cho module này
+logger = setup_logger(__name__)
+
+# Nhóm nguyên nhân của từng giai đoạn: mạng, tính toán hay chờ cố định
+STAGE_CATEGORIES = {
+    "position_check": "compute",
+    "kline_fetch": "network",
+    "indicator": "compute",
+    "signal": "compute",
+    "quantity": "network",  # calculate_order_quantity có thể gọi REST khi giá trong cache đã cũ
+    "order_send": "network",
+    "ack": "network",
+    "close_send": "compute",
+    "close_wait": "sleep",
+}
+
+
+class CycleTrace:
+    """Thời gian các giai đoạn của một chu kỳ"""
+
+    def __init__(self, tracer, cycle_id):
+        self.tracer = tracer
+        self.cycle_id = cycle_id
+        self.started_at = time.time()
+        self._started = time.perf_counter()
+        self.stages = []  # [(stage, started_at, duration_ms)]
+
+    @contextmanager
+    def stage(self, name):
+        """Đo thời gian của khối lệnh bên trong `with`"""
+        started_at = time.time()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages.append((name, started_at, (time.perf_counter() - started) * 1000))
+
+    def record(self, name, duration_ms, started_at=None):
+        """Ghi thời gian của giai đoạn đã được đo ở nơi khác (ví dụ trong BinanceDataModel)"""
+        self.stages.append((name, started_at or time.time(), float(duration_ms)))
+
+    def finish(self):
+        """Kết thúc chu kỳ và đẩy kết quả vào tracer"""
+        total = (time.perf_counter() - self._started) * 1000
+        self.tracer.submit(self, total)
+        return total
+
+
+class LatencyTracer:
+    """Thu thập thời gian theo giai đoạn cho các chu kỳ giao dịch"""
+
+    def __init__(self, symbol, trading_method, capacity=5000, persist=True):
+        self.symbol = symbol
+        self.trading_method = trading_method
+        self.buffer = deque(maxlen=capacity)  # (cycle_id, stage, duration_ms)
+        self.lock = threading.Lock()
+        self.db = DatabaseManager() if persist else None
+        # Mã lần chạy: thời điểm bắt đầu + phần ngẫu nhiên (sắp xếp được theo thời gian)
+        self.run_id = f"{datetime.datetime.now().strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        self._next_cycle = 1
+
+    def start_cycle(self):
+        with self.lock:
+            cycle_id = self._next_cycle
+            self._next_cycle += 1
+        return CycleTrace(self, cycle_id)
+
+    def submit(self, trace, total_ms):
+        """Lưu kết quả một chu kỳ vào ring buffer và SQLite"""
+        stages = trace.stages + [("cycle", trace.started_at, total_ms)]
+        with self.lock:
+            self.buffer.extend((trace.cycle_id, stage, duration) for stage, _, duration in stages)
+
+        logger.debug("Chu kỳ #%s (lần chạy %s): %s", trace.cycle_id, self.run_id,
+                     ", ".join(f"{stage}={duration:.1f}ms" for stage, _, duration in stages))
+
+        if self.db:
+            self._persist(trace.cycle_id, stages)
+
+    def _persist(self, cycle_id, stages):
+        rows = [(
+            self.run_id, self.symbol, self.trading_method, cycle_id, stage,
+            datetime.datetime.fromtimestamp(started_at).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3],
+            duration
+        ) for stage, started_at, duration in stages]
+
+        if not self.db.execute_many('''
+            INSERT INTO autotrader_traces (run_id, symbol, trading_method, cycle_id, stage, started_at, duration_ms)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', rows):
+            logger.error(f"Lỗi khi lưu dữ liệu đo thời gian của chu kỳ #{cycle_id} (lần chạy {self.run_id})")
+
+    def summary(self, percentiles=(50, 90, 99)):
+        """
+        Thống kê thời gian theo giai đoạn từ ring buffer
+
+        Returns:
+            dict: stages (stage -> count/mean/max/pXX, ms), categories (nhóm -> tỷ lệ % thời gian chu kỳ)
+        """
+        with self.lock:
+            records = list(self.buffer)
+
+        by_stage = {}
+        for _, stage, duration in records:
+            by_stage.setdefault(stage, []).append(duration)
+
+        stages = {}
+        for stage, durations in by_stage.items():
+            values = np.asarray(durations)
+            stats = {"count": len(values), "mean": float(values.mean()), "max": float(values.max())}
+            for p, value in zip(percentiles, np.percentile(values, percentiles)):
+                stats[f"p{p}"] = float(value)
+            stages[stage] = stats
+
+        # Tỷ lệ thời gian của mỗi nhóm trên tổng thời gian các chu kỳ
+        total_cycle = sum(by_stage.get("cycle", [])) or 1.0
+        categories = {}
+        for stage, durations in by_stage.items():
+            if stage in STAGE_CATEGORIES:
+                category = STAGE_CATEGORIES[stage]
+                categories[category] = categories.get(category, 0.0) + sum(durations) / total_cycle * 100
+
+        return {"stages": stages, "categories": categories}
+
+    def bottleneck(self):
+        """Nhóm chiếm nhiều thời gian nhất trong chu kỳ (network / compute / sleep)"""
+        categories = self.summary()["categories"]
+        if not categories:
+            return None
+        return max(categories, key=categories.get)
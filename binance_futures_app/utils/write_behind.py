@@ -0,0 +1,250 @@
+"""
+Hàng đợi ghi trễ (write-behind) cho SQLite.
+
+Câu lệnh ghi được nối vào một file journal (mỗi dòng một JSON, ghi xuống hệ điều hành ngay)
+rồi đưa vào hàng đợi; thread ghi gom các câu lệnh đang chờ thành một transaction. Người gọi
+không phải chờ commit/fsync của SQLite. Nếu ứng dụng dừng đột ngột, các câu lệnh còn trong
+journal được ghi lại ở lần khởi động sau - vì vậy câu lệnh phải chạy lại được nhiều lần mà không
+đổi kết quả (INSERT OR IGNORE/UPSERT, UPDATE theo khóa).
+
+Mỗi câu lệnh nhớ vị trí cuối của dòng tương ứng trong journal. Sau mỗi lô ghi thành công, phần
+journal đến câu lệnh cuối đã commit được cắt bỏ, nên câu lệnh đã ghi không bị chạy lại. Lô ghi lỗi
+vì database bị khóa/bận được đưa lại về đầu hàng đợi và thử lại sau một khoảng chờ tăng dần; câu lệnh
+lỗi vì lý do khác được ghi log và bỏ qua để không chặn các câu lệnh sau.
+"""
+import os
+import json
+import time
+import sqlite3
+import threading
+from collections import deque
+
+from config.config import TRADE_JOURNAL_FILE
+from config.logging_config import setup_logger
+from utils.database_manager import DatabaseManager
+
+# Tạo logger cho module này
+logger = setup_logger(__name__)
+
+# Số câu lệnh tối đa trong một transaction
+DEFAULT_BATCH_SIZE = 500
+
+# Thời gian chờ gom thêm câu lệnh trước khi ghi (giây)
+DEFAULT_MAX_DELAY = 0.05
+
+# Thời gian chờ trước khi ghi lại lô lỗi (giây), gấp đôi sau mỗi lần lỗi liên tiếp
+RETRY_DELAY = 0.5
+MAX_RETRY_DELAY = 30.0
+
+
+class WriteBehindJournal:
+    """Ghi các câu lệnh SQL theo lô trên thread nền, có journal để khôi phục khi crash"""
+
+    def __init__(self, path, db=None, batch_size=DEFAULT_BATCH_SIZE, max_delay=DEFAULT_MAX_DELAY):
+        self.path = path
+        self.db = db or DatabaseManager()
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+
+        self.condition = threading.Condition()
+        self.queue = deque()  # (câu lệnh, tham số, vị trí cuối dòng trong journal) chờ ghi
+        self.writing = 0  # Số câu lệnh đang được ghi
+        self.failed = False  # Lô ghi gần nhất bị lỗi: đang chờ ghi lại, journal được giữ nguyên
+        self.retry_delay = RETRY_DELAY
+        self.running = True
+        # Vị trí tính từ đầu journal kể cả phần đã cắt bỏ: base = vị trí của byte đầu file,
+        # end = vị trí cuối file
+        self.base = 0
+        self.end = 0
+
+        journal_dir = os.path.dirname(path)
+        if journal_dir and not os.path.exists(journal_dir):
+            os.makedirs(journal_dir)
+        self._replay()
+        # newline="\n": vị trí tính theo byte phải khớp với nội dung file trên mọi hệ điều hành
+        self.journal = open(path, "a", encoding="utf-8", newline="\n")
+
+        self.thread = threading.Thread(target=self._writer_loop, name="WriteBehindJournal", daemon=True)
+        self.thread.start()
+
+    def _replay(self):
+        """Đưa các câu lệnh còn sót trong journal từ lần chạy trước vào đầu hàng đợi"""
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            return
+        with open(self.path, "rb") as f:
+            for raw in f:
+                self.end += len(raw)
+                try:
+                    entry = json.loads(raw.decode("utf-8"))
+                    self.queue.append((entry["sql"], entry["params"], self.end))
+                except (ValueError, KeyError):
+                    # Dòng cuối có thể bị ghi dở khi crash
+                    logger.warning(f"Bỏ qua dòng journal không hợp lệ: {raw[:80]!r}")
+        if not raw.endswith(b"\n"):
+            # Dòng ghi dở không có ký tự xuống dòng: thêm vào để câu lệnh mới bắt đầu ở dòng riêng
+            with open(self.path, "ab") as f:
+                f.write(b"\n")
+            self.end += 1
+        logger.info(f"Khôi phục {len(self.queue)} câu lệnh từ journal {self.path}")
+
+    def submit(self, sql, params=()):
+        """Đưa một câu lệnh vào hàng đợi (không chờ ghi vào database)"""
+        params = list(params)
+        line = json.dumps({"sql": sql, "params": params}, ensure_ascii=False) + "\n"
+        with self.condition:
+            if not self.running:
+                raise RuntimeError("Journal đã đóng")
+            self.journal.write(line)
+            self.journal.flush()
+            self.end += len(line.encode("utf-8"))
+            self.queue.append((sql, params, self.end))
+            self.condition.notify_all()
+
+    def flush(self, timeout=None):
+        """
+        Chờ đến khi mọi câu lệnh đã gửi được ghi vào database, trả về False nếu hết thời gian.
+        Không có timeout thì trả về False ngay khi lô ghi bị lỗi (câu lệnh vẫn trong hàng đợi để ghi lại),
+        để người đọc không bị chặn mãi khi database lỗi kéo dài.
+        """
+        with self.condition:
+            self.condition.wait_for(
+                lambda: (not self.queue and not self.writing) or (timeout is None and self.failed), timeout)
+            return not self.queue and not self.writing
+
+    def close(self, timeout=10.0):
+        """Ghi nốt các câu lệnh còn lại rồi dừng thread ghi"""
+        self.flush(timeout)
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        self.thread.join(timeout)
+        with self.condition:
+            self.journal.close()
+
+    def _writer_loop(self):
+        while True:
+            with self.condition:
+                while self.running and not self.queue:
+                    self.condition.wait()
+                if not self.queue or (self.failed and not self.running):
+                    # Lô lỗi khi đang đóng: để lại trong journal cho lần khởi động sau
+                    break
+                # Chờ thêm một chút để gom các câu lệnh đến gần nhau
+                if len(self.queue) < self.batch_size:
+                    self.condition.wait(self.max_delay)
+                batch = [self.queue.popleft() for _ in range(min(self.batch_size, len(self.queue)))]
+                self.writing = len(batch)
+
+            success = self._write_batch(batch)
+
+            with self.condition:
+                self.writing = 0
+                if success:
+                    self.failed = False
+                    self.retry_delay = RETRY_DELAY
+                    self._discard_committed(batch[-1][2])
+                else:
+                    # Đưa lô về đầu hàng đợi, giữ nguyên thứ tự, rồi chờ trước khi ghi lại
+                    self.queue.extendleft(reversed(batch))
+                    self.failed = True
+                    self.condition.notify_all()
+                    logger.warning(f"Ghi lại {len(batch)} câu lệnh sau {self.retry_delay:.1f} giây")
+                    deadline = time.monotonic() + self.retry_delay
+                    remaining = self.retry_delay
+                    while self.running and remaining > 0:
+                        self.condition.wait(remaining)
+                        remaining = deadline - time.monotonic()
+                    self.retry_delay = min(self.retry_delay * 2, MAX_RETRY_DELAY)
+                self.condition.notify_all()
+
+    def _discard_committed(self, committed):
+        """Cắt bỏ phần journal đến vị trí committed (gọi khi đang giữ condition)"""
+        if self.journal.closed or committed <= self.base:
+            return
+        try:
+            if not self.queue:
+                # Mọi câu lệnh trong journal đã được ghi: làm rỗng journal
+                self.journal.seek(0)
+                self.journal.truncate()
+                committed = self.end
+            else:
+                # Giữ lại các dòng chưa ghi (thường chỉ vài dòng gửi trong lúc lô trước đang ghi)
+                with open(self.path, "rb") as f:
+                    f.seek(committed - self.base)
+                    pending = f.read()
+                self.journal.close()
+                temp_path = self.path + ".tmp"
+                with open(temp_path, "wb") as f:
+                    f.write(pending)
+                os.replace(temp_path, self.path)
+                self.journal = open(self.path, "a", encoding="utf-8", newline="\n")
+            self.base = committed
+        except OSError as e:
+            # Journal không cắt được chỉ làm các câu lệnh đã ghi bị chạy lại ở lần khởi động sau
+            logger.error(f"Lỗi khi cắt journal {self.path}: {e}")
+            if self.journal.closed:
+                self.journal = open(self.path, "a", encoding="utf-8", newline="\n")
+
+    def _write_batch(self, batch):
+        """
+        Ghi một lô câu lệnh trong một transaction.
+        Trả về False nếu transaction thất bại vì lỗi tạm thời (database bị khóa/bận): cả lô được ghi lại sau.
+        Lỗi khác (câu lệnh sai, vi phạm ràng buộc...) không tự hết khi ghi lại: lô được chạy lại từng câu
+        lệnh, câu lệnh lỗi được ghi log và bỏ qua, các câu còn lại vẫn được commit.
+        """
+        if not batch:
+            return True
+        try:
+            with self.db.transaction() as conn:
+                for sql, params, _ in batch:
+                    conn.execute(sql, params)
+            return True
+        except Exception as e:
+            if _is_transient(e):
+                logger.error(f"Lỗi tạm thời khi ghi {len(batch)} câu lệnh từ journal: {e}")
+                return False
+            logger.warning(f"Lỗi khi ghi {len(batch)} câu lệnh từ journal ({e}), ghi lại từng câu lệnh")
+
+        try:
+            with self.db.transaction() as conn:
+                for sql, params, _ in batch:
+                    try:
+                        conn.execute(sql, params)
+                    except Exception as e:
+                        if _is_transient(e):
+                            raise
+                        # Câu lệnh lỗi không có tác dụng (SQLite hoàn tác riêng câu lệnh đó), transaction vẫn tiếp tục
+                        logger.error(f"Bỏ câu lệnh lỗi trong journal: {sql.strip()[:120]!r} {params!r}: {e}")
+            return True
+        except Exception as e:
+            logger.error(f"Lỗi khi ghi {len(batch)} câu lệnh từ journal: {e}")
+            return False
+
+
+def _is_transient(error):
+    """Lỗi tự hết khi ghi lại (database bị khóa/bận)"""
+    if not isinstance(error, sqlite3.OperationalError):
+        return False
+    message = str(error).lower()
+    return "locked" in message or "busy" in message
+
+
+_journals = {}
+_journals_lock = threading.Lock()
+
+
+def get_journal(path=TRADE_JOURNAL_FILE):
+    """Journal dùng chung trong tiến trình cho một file"""
+    with _journals_lock:
+        journal = _journals.get(path)
+        if journal is None:
+            journal = _journals[path] = WriteBehindJournal(path)
+        return journal
+
+
+def close_journals():
+    """Ghi nốt và đóng mọi journal (gọi khi thoát ứng dụng)"""
+    with _journals_lock:
+        for journal in _journals.values():
+            journal.close()
+        _journals.clear()
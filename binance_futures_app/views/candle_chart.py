@@ -0,0 +1,233 @@
+"""
+Biểu đồ nến vẽ trực tiếp bằng pyqtgraph thay cho trang web Binance.
+
+Phần lịch sử được vẽ một lần thành QPicture và chỉ vẽ lại khi khoảng nhìn thay đổi hoặc có nến
+mới đóng; nến đang hình thành là một item riêng nên mỗi lần giá đổi chỉ vẽ lại một nến. Khi số
+nến trong khoảng nhìn nhiều hơn số điểm ảnh cho phép, các nến liền nhau được gộp lại (giữ đúng
+open/high/low/close) trước khi vẽ.
+"""
+import numpy as np
+import pyqtgraph as pg
+from PyQt5.QtCore import QRectF, QLineF, QTimer
+from PyQt5.QtGui import QPicture, QPainter, QColor
+
+from utils.indicators import INTERVAL_MS
+from views.chart_overlays import IndicatorOverlay, TradeMarkerOverlay
+
+# Màu nến tăng/giảm
+COLOR_UP = QColor(0, 200, 83)
+COLOR_DOWN = QColor(255, 61, 0)
+
+# Độ rộng thân nến so với khoảng cách giữa hai nến
+BODY_RATIO = 0.7
+
+# Số điểm ảnh tối thiểu cho một nến trước khi phải gộp nến
+MIN_PIXELS_PER_CANDLE = 3
+
+# Số nến hiển thị khi nạp dữ liệu mới
+DEFAULT_VISIBLE_CANDLES = 120
+
+
+def decimate_ohlc(x, open_, high, low, close, max_candles):
+    """
+    Gộp các nến liền nhau để còn tối đa `max_candles` nến
+
+    Returns:
+        tuple: (x, open, high, low, close, số nến gốc trong mỗi nến đã gộp)
+    """
+    count = len(x)
+    if count <= max_candles:
+        return x, open_, high, low, close, 1
+    factor = int(np.ceil(count / max_candles))
+    starts = np.arange(0, count, factor)
+    ends = np.minimum(starts + factor, count) - 1
+    return (x[starts], open_[starts], np.maximum.reduceat(high, starts),
+            np.minimum.reduceat(low, starts), close[ends], factor)
+
+
+class CandlestickItem(pg.GraphicsObject):
+    """Một nhóm nến được vẽ sẵn thành QPicture"""
+
+    def __init__(self):
+        super().__init__()
+        self.picture = QPicture()
+        self.bounds = QRectF()
+
+    def set_candles(self, x, open_, high, low, close, width):
+        """Vẽ lại các nến (x là tâm nến, width là độ rộng thân nến theo trục x)"""
+        self.prepareGeometryChange()
+        self.picture = QPicture()
+        self.bounds = QRectF()
+        if len(x):
+            painter = QPainter(self.picture)
+            half = width / 2
+            for up, color in ((True, COLOR_UP), (False, COLOR_DOWN)):
+                mask = (close >= open_) if up else (close < open_)
+                if not mask.any():
+                    continue
+                painter.setPen(pg.mkPen(color))
+                painter.setBrush(pg.mkBrush(color))
+                xs, opens, highs, lows, closes = x[mask], open_[mask], high[mask], low[mask], close[mask]
+                painter.drawLines([QLineF(xi, lo, xi, hi) for xi, lo, hi in zip(xs.tolist(), lows.tolist(), highs.tolist())])
+                painter.drawRects([QRectF(xi - half, min(o, c), width, abs(c - o))
+                                   for xi, o, c in zip(xs.tolist(), opens.tolist(), closes.tolist())])
+            painter.end()
+            self.bounds = QRectF(float(x[0]) - half, float(np.min(low)),
+                                 float(x[-1] - x[0]) + width, float(np.max(high) - np.min(low)))
+        self.update()
+
+    def paint(self, painter, option, widget=None):
+        painter.drawPicture(0, 0, self.picture)
+
+    def boundingRect(self):
+        return QRectF(self.bounds)
+
+
+class CandleChartWidget(pg.PlotWidget):
+    """Biểu đồ nến với trục thời gian, cập nhật từng phần theo nến cuối"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent, axisItems={"bottom": pg.DateAxisItem(orientation="bottom")})
+        self.showGrid(x=True, y=True, alpha=0.2)
+        self.setMouseEnabled(x=True, y=False)
+        self.getPlotItem().hideButtons()
+        self.getViewBox().enableAutoRange(enable=False)
+
+        self.history_item = CandlestickItem()
+        self.last_item = CandlestickItem()
+        self.addItem(self.history_item)
+        self.addItem(self.last_item)
+        # Đường chỉ báo của chiến lược và điểm vào/ra lệnh, SL/TP
+        self.indicators = IndicatorOverlay(self)
+        self.markers = TradeMarkerOverlay(self)
+
+        self.symbol = ""
+        self.interval = "1m"
+        self.step = INTERVAL_MS["1m"] / 1000  # Khoảng cách giữa hai nến (giây)
+        self.x = np.empty(0)  # Thời gian mở nến (giây)
+        self.open = np.empty(0)
+        self.high = np.empty(0)
+        self.low = np.empty(0)
+        self.close = np.empty(0)
+
+        # Gộp các lần đổi khoảng nhìn liên tiếp (kéo/cuộn) thành một lần vẽ lại
+        self._render_timer = QTimer(self)
+        self._render_timer.setSingleShot(True)
+        self._render_timer.timeout.connect(self._render_history)
+        self.getViewBox().sigXRangeChanged.connect(lambda *args: self._render_timer.start(0))
+
+    def set_title(self, symbol, interval=None):
+        self.setTitle(f"{symbol} {interval or self.interval}")
+
+    def set_candles(self, symbol, interval, data):
+        """Nạp toàn bộ dữ liệu nến (dict mảng như KlineStore.load) và hiển thị các nến gần nhất"""
+        self.symbol = symbol
+        self.interval = interval
+        self.step = INTERVAL_MS.get(interval, INTERVAL_MS["1m"]) / 1000
+        self.x = np.asarray(data["open_time"], dtype=np.float64) / 1000
+        self.open = np.array(data["open"], dtype=np.float64)
+        self.high = np.array(data["high"], dtype=np.float64)
+        self.low = np.array(data["low"], dtype=np.float64)
+        self.close = np.array(data["close"], dtype=np.float64)
+        self.set_title(symbol, interval)
+        self.indicators.show(symbol, interval, self.step)
+        self.markers.show(symbol)
+
+        self._render_last()
+        if len(self.x):
+            end = self.x[-1] + self.step
+            self.setXRange(end - DEFAULT_VISIBLE_CANDLES * self.step, end, padding=0.02)
+        self._render_history()
+
+    def update_last_candle(self, candle):
+        """
+        Cập nhật nến cuối hoặc thêm nến mới
+
+        Args:
+            candle (tuple): (open_time ms, open, high, low, close)
+        """
+        open_time, open_, high, low, close = candle
+        x = open_time / 1000
+        if not len(self.x) or x > self.x[-1]:
+            # Nến mới: nến cuối cũ chuyển vào phần lịch sử
+            following = self._following_last()
+            self.x = np.append(self.x, x)
+            self.open = np.append(self.open, open_)
+            self.high = np.append(self.high, high)
+            self.low = np.append(self.low, low)
+            self.close = np.append(self.close, close)
+            self._render_last()
+            if following:
+                self.getViewBox().translateBy(x=self.step)
+            self._render_history()
+            return
+
+        index = len(self.x) - 1 if x == self.x[-1] else int(np.searchsorted(self.x, x))
+        if index >= len(self.x) or self.x[index] != x:
+            return  # Nến quá cũ không có trong dữ liệu
+        self.open[index] = open_
+        self.high[index] = high
+        self.low[index] = low
+        self.close[index] = close
+        if index == len(self.x) - 1:
+            self._render_last()
+            self._fit_y_to_last()
+        else:
+            self._render_history()
+
+    def _following_last(self):
+        """Khoảng nhìn đang bao gồm nến cuối (biểu đồ tự cuộn theo nến mới)"""
+        if not len(self.x):
+            return True
+        right = self.getViewBox().viewRange()[0][1]
+        return right >= self.x[-1]
+
+    def _render_last(self):
+        if not len(self.x):
+            self.last_item.set_candles(self.x, self.open, self.high, self.low, self.close, 0)
+            return
+        self.last_item.set_candles(self.x[-1:] + self.step / 2, self.open[-1:], self.high[-1:],
+                                   self.low[-1:], self.close[-1:], self.step * BODY_RATIO)
+
+    def _render_history(self):
+        """Vẽ lại các nến đã đóng trong khoảng nhìn (gộp nến nếu quá dày)"""
+        count = len(self.x) - 1
+        if count <= 0:
+            self.history_item.set_candles(np.empty(0), np.empty(0), np.empty(0), np.empty(0), np.empty(0), 0)
+            self._fit_y()
+            return
+
+        left, right = self.getViewBox().viewRange()[0]
+        start = max(0, int(np.searchsorted(self.x[:count], left - self.step)))
+        end = min(count, int(np.searchsorted(self.x[:count], right, side="right")))
+        width_px = max(1, self.getViewBox().width())
+        max_candles = max(10, int(width_px / MIN_PIXELS_PER_CANDLE))
+
+        x, open_, high, low, close, factor = decimate_ohlc(
+            self.x[start:end], self.open[start:end], self.high[start:end],
+            self.low[start:end], self.close[start:end], max_candles)
+        step = self.step * factor
+        self.history_item.set_candles(x + step / 2, open_, high, low, close, step * BODY_RATIO)
+        self._fit_y(start, end)
+
+    def _fit_y(self, start=None, end=None):
+        """Đặt trục giá theo các nến trong khoảng nhìn (kể cả nến cuối nếu đang hiển thị)"""
+        if not len(self.x):
+            return
+        if start is None:
+            left, right = self.getViewBox().viewRange()[0]
+            start = max(0, int(np.searchsorted(self.x, left - self.step)))
+            end = int(np.searchsorted(self.x, right, side="right"))
+        if self._following_last():
+            end = len(self.x)
+        if end <= start:
+            return
+        self.setYRange(float(np.min(self.low[start:end])), float(np.max(self.high[start:end])), padding=0.05)
+
+    def _fit_y_to_last(self):
+        """Mở rộng trục giá nếu nến cuối vượt ra ngoài khoảng đang hiển thị"""
+        if not self._following_last():
+            return
+        bottom, top = self.getViewBox().viewRange()[1]
+        if self.low[-1] < bottom or self.high[-1] > top:
+            self._fit_y()
@@ -0,0 +1,188 @@
+"""
+Các lớp vẽ chồng lên biểu đồ nến: đường chỉ báo của chiến lược và điểm vào/ra lệnh, SL/TP.
+
+Chỉ báo được lưu theo (cặp giao dịch, khung thời gian) và ghép từng phần theo thời gian nến,
+nên AutoTrader chỉ cần gửi các nến mới/đổi ở mỗi chu kỳ. Mỗi đường là một PlotCurveItem
+(NaN được bỏ qua nhờ connect="finite"). Điểm giao dịch được cập nhật theo dòng thêm/đổi/xóa
+của bảng giao dịch và chỉ vẽ lại khi thay đổi thuộc cặp giao dịch đang hiển thị.
+"""
+import numpy as np
+import pyqtgraph as pg
+from PyQt5.QtCore import Qt
+
+from models.trade_store import parse_number, OPEN_STATUSES
+from utils.helpers import parse_timestamp
+
+# Tên đường chỉ báo -> (màu, kiểu nét)
+INDICATOR_STYLES = {
+    "baseline": ("#2962FF", Qt.SolidLine),
+    "tenkan": ("#00BCD4", Qt.SolidLine),
+    "kijun": ("#E91E63", Qt.SolidLine),
+    "senkou_a": ("#4CAF50", Qt.DashLine),
+    "senkou_b": ("#FF9800", Qt.DashLine),
+}
+
+# Số nến tối đa giữ lại cho mỗi chuỗi chỉ báo
+MAX_INDICATOR_POINTS = 5000
+
+COLOR_ENTRY_BUY = "#00C853"
+COLOR_ENTRY_SELL = "#FF3D00"
+COLOR_EXIT = "#FFD600"
+COLOR_SL = "#FF0000"
+COLOR_TP = "#00FF00"
+
+
+def parse_trade_time(value):
+    """Thời gian giao dịch (chuỗi "YYYY-MM-DD HH:MM:SS" ở múi giờ +7) -> giây epoch, None nếu không đọc được"""
+    millis = parse_timestamp(value)
+    return millis / 1000 if millis is not None else None
+
+
+class IndicatorOverlay:
+    """Các đường chỉ báo của chiến lược trên biểu đồ"""
+
+    def __init__(self, plot):
+        self.plot = plot
+        self.series = {}  # (symbol, interval) -> {"open_time": mảng, tên: mảng}
+        self.curves = {}  # tên -> PlotCurveItem
+        self.key = None  # (symbol, interval) đang hiển thị
+        self.step = 60  # Khoảng cách giữa hai nến (giây)
+
+    def show(self, symbol, interval, step):
+        """Chuyển sang cặp giao dịch/khung thời gian của biểu đồ"""
+        self.key = (symbol, interval)
+        self.step = step
+        self._redraw()
+
+    def update(self, symbol, interval, data):
+        """
+        Ghép chỉ báo mới vào chuỗi đã có: các nến từ data["open_time"][0] trở đi được thay thế
+
+        Args:
+            data (dict): open_time (ms) và các mảng chỉ báo cùng độ dài
+        """
+        open_time = np.asarray(data["open_time"], dtype=np.int64)
+        if not len(open_time):
+            return
+        key = (symbol, interval)
+        current = self.series.get(key)
+        if current is None or set(current) != set(data):
+            merged = {name: np.asarray(values) for name, values in data.items()}
+        else:
+            start = int(np.searchsorted(current["open_time"], open_time[0]))
+            merged = {name: np.concatenate((current[name][:start], np.asarray(values)))
+                      for name, values in data.items()}
+        self.series[key] = {name: values[-MAX_INDICATOR_POINTS:] for name, values in merged.items()}
+        if key == self.key:
+            self._redraw()
+
+    def _redraw(self):
+        data = self.series.get(self.key)
+        names = [name for name in (data or {}) if name != "open_time"]
+        for name in list(self.curves):
+            if name not in names:
+                self.plot.removeItem(self.curves.pop(name))
+        if not data:
+            return
+
+        x = data["open_time"] / 1000 + self.step / 2
+        for name in names:
+            curve = self.curves.get(name)
+            if curve is None:
+                color, style = INDICATOR_STYLES.get(name, ("#9E9E9E", Qt.SolidLine))
+                curve = pg.PlotCurveItem(pen=pg.mkPen(color, width=1.5, style=style), connect="finite")
+                self.plot.addItem(curve)
+                self.curves[name] = curve
+            curve.setData(x, np.asarray(data[name], dtype=np.float64))
+
+    def clear(self):
+        self.series = {}
+        self._redraw()
+
+
+class TradeMarkerOverlay:
+    """Điểm vào/ra lệnh và đường SL/TP của các giao dịch thuộc cặp đang hiển thị"""
+
+    def __init__(self, plot):
+        self.plot = plot
+        self.symbol = None
+        self.trades = {}  # ID -> dòng giao dịch
+        self.entries = pg.ScatterPlotItem(size=12, pen=pg.mkPen(None))
+        self.exits = pg.ScatterPlotItem(size=10, symbol="x", pen=pg.mkPen(None), brush=pg.mkBrush(COLOR_EXIT))
+        plot.addItem(self.entries)
+        plot.addItem(self.exits)
+        self.level_lines = {}  # (ID, "sl"/"tp") -> InfiniteLine
+
+    def show(self, symbol):
+        """Chuyển sang cặp giao dịch của biểu đồ"""
+        if symbol != self.symbol:
+            self.symbol = symbol
+            self._redraw()
+
+    def set_trades(self, trades):
+        """Thay toàn bộ danh sách giao dịch"""
+        self.trades = {str(trade.get('id', '')): trade for trade in trades}
+        self._redraw()
+
+    def apply_changes(self, changed, removed):
+        """Áp dụng dòng thêm/đổi và ID bị xóa, chỉ vẽ lại nếu liên quan cặp đang hiển thị"""
+        affected = False
+        for trade_id in removed:
+            trade = self.trades.pop(str(trade_id), None)
+            affected = affected or (trade is not None and trade.get('symbol') == self.symbol)
+        for trade in changed:
+            self.trades[str(trade.get('id', ''))] = trade
+            affected = affected or trade.get('symbol') == self.symbol
+        if affected:
+            self._redraw()
+
+    def _redraw(self):
+        entry_spots = []
+        exit_spots = []
+        levels = {}
+        for trade_id, trade in self.trades.items():
+            if trade.get('symbol') != self.symbol:
+                continue
+            side = trade.get('side')
+            entry_price = parse_number(trade.get('price', trade.get('entry_price')))
+            entry_time = parse_trade_time(trade.get('entry_time') or trade.get('timestamp'))
+            if entry_time is not None and entry_price == entry_price:
+                entry_spots.append({
+                    "pos": (entry_time, entry_price),
+                    "symbol": "t1" if side == "BUY" else "t",
+                    "brush": pg.mkBrush(COLOR_ENTRY_BUY if side == "BUY" else COLOR_ENTRY_SELL),
+                })
+
+            exit_price = parse_number(trade.get('exit_price'))
+            exit_time = parse_trade_time(trade.get('exit_time'))
+            if exit_time is not None and exit_price == exit_price:
+                exit_spots.append({"pos": (exit_time, exit_price)})
+
+            # SL/TP chỉ có ý nghĩa khi lệnh còn mở
+            if trade.get('status') in OPEN_STATUSES:
+                for kind, key in (("sl", "stop_loss"), ("tp", "take_profit")):
+                    price = parse_number(trade.get(key))
+                    if price == price and price > 0:
+                        levels[(trade_id, kind)] = price
+
+        self.entries.setData(entry_spots)
+        self.exits.setData(exit_spots)
+        self._set_levels(levels)
+
+    def _set_levels(self, levels):
+        """Giữ nguyên đường SL/TP không đổi, chỉ thêm/xóa/dời những đường khác"""
+        for key in list(self.level_lines):
+            if key not in levels:
+                self.plot.removeItem(self.level_lines.pop(key))
+        for key, price in levels.items():
+            line = self.level_lines.get(key)
+            if line is None:
+                kind = key[1]
+                line = pg.InfiniteLine(pos=price, angle=0, movable=False,
+                                       pen=pg.mkPen(COLOR_SL if kind == "sl" else COLOR_TP, style=Qt.DashLine),
+                                       label="SL" if kind == "sl" else "TP",
+                                       labelOpts={"position": 0.95, "color": COLOR_SL if kind == "sl" else COLOR_TP})
+                self.plot.addItem(line)
+                self.level_lines[key] = line
+            elif line.value() != price:
+                line.setValue(price)
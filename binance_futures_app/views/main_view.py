@@ -1,7 +1,7 @@
-from PyQt5.QtWidgets import QMainWindow, QHeaderView, QLabel, QMessageBox, QTableWidgetItem, QPushButton, QDoubleSpinBox
+from PyQt5.QtWidgets import (QMainWindow, QHeaderView, QLabel, QMessageBox, QAbstractItemView, QDoubleSpinBox,
+                             QPushButton)
 from PyQt5.QtCore import Qt, QUrl
 from PyQt5.QtGui import QIcon, QColor
-from PyQt5.QtWebEngineWidgets import QWebEngineView
 from PyQt5 import uic
 from PyQt5.QtCore import pyqtSignal
 import os
@@ -9,6 +9,9 @@ import logging
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from config.config import UI_DIR, ICONS_DIR
+from views.trade_table import (TradeTableModel, TradeFilterProxyModel, CloseButtonDelegate,
+                               STATUS_COLUMN, TRADE_FILTERS)
+from views.candle_chart import CandleChartWidget
 
 class MainView(QMainWindow):
     close_position_signal = pyqtSignal(str, str, str)  # trade_id, symbol, side
@@ -40,41 +43,44 @@ class MainView(QMainWindow):
         # Tạo label hiển thị trạng thái giao dịch tự động
         self.auto_trading_status = QLabel("Giao dịch tự động: Đã tắt")
         self.verticalLayout_2.addWidget(self.auto_trading_status)
-        # Thiết lập header cho bảng giao dịch
-        self.tradeTable.setColumnCount(12)
-        self.tradeTable.setHorizontalHeaderLabels([
-        "ID", "Cặp giao dịch", "Loại", "Giá", "Số lượng", "Thời gian", 
-        "Lời/Lỗ", "Nguồn", "Đòn bẩy", "Stop Loss", "Take Profit", "Trạng thái"
-        ])
-        # Điều chỉnh hình dạng của header
-        header = self.tradeTable.horizontalHeader()
-        header.setSectionResizeMode(0, QHeaderView.ResizeToContents)  # ID
-        header.setSectionResizeMode(1, QHeaderView.ResizeToContents)  # Cặp giao dịch
-        header.setSectionResizeMode(2, QHeaderView.ResizeToContents)  # Loại
-        header.setSectionResizeMode(3, QHeaderView.ResizeToContents)  # Giá
-        header.setSectionResizeMode(4, QHeaderView.ResizeToContents)  # Số lượng
-        header.setSectionResizeMode(5, QHeaderView.ResizeToContents)  # Thời gian
-        header.setSectionResizeMode(6, QHeaderView.ResizeToContents)  # Lời/Lỗ
-        header.setSectionResizeMode(7, QHeaderView.ResizeToContents)  # Nguồn
-        header.setSectionResizeMode(8, QHeaderView.ResizeToContents)  # Đòn bẩy
-        header.setSectionResizeMode(9, QHeaderView.ResizeToContents)  # Stop Loss
-        header.setSectionResizeMode(10, QHeaderView.ResizeToContents)  # Take Profit
-        header.setSectionResizeMode(11, QHeaderView.ResizeToContents)  # Trạng thái
-
-        # Tạo QWebEngineView cho biểu đồ
-        self.chart_view = QWebEngineView()
-
-        # Cấu hình WebEngineView với kích thước lớn hơn
-        self.chart_view.setMinimumSize(1100, 750)  # Tăng kích thước để hiển thị đầy đủ
-
-        # Bỏ qua lỗi CSP từ Binance
-        profile = self.chart_view.page().profile()
-        settings = self.chart_view.settings()
-        settings.setAttribute(settings.WebAttribute.JavascriptCanAccessClipboard, True)
-        settings.setAttribute(settings.WebAttribute.LocalContentCanAccessRemoteUrls, True)
-
-        # Thêm vào container
-        self.chartContainer.addWidget(self.chart_view)
+        # Số dư hiển thị dạng HTML; lưu khóa của lần vẽ trước để bỏ qua khi không đổi
+        self.balanceValueLabel.setTextFormat(Qt.RichText)
+        self._balance_render_key = None
+        # Bảng giao dịch: model trên kho dạng cột, chỉ các hàng đang hiển thị được định dạng
+        self.trade_model = TradeTableModel(parent=self)
+        # Lọc/sắp xếp qua proxy dùng chỉ mục theo cột (trạng thái, nguồn, cặp giao dịch, loại lệnh)
+        self.trade_proxy = TradeFilterProxyModel(self)
+        self.trade_proxy.setSourceModel(self.trade_model)
+        self.tradeTable.setModel(self.trade_proxy)
+        # Mặc định giữ thứ tự nạp, bấm tiêu đề cột để sắp xếp
+        self.tradeTable.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+        self.tradeTable.setSortingEnabled(True)
+        self.close_button_delegate = CloseButtonDelegate(self.tradeTable)
+        self.close_button_delegate.close_clicked.connect(self.on_close_position_clicked)
+        self.tradeTable.setItemDelegateForColumn(STATUS_COLUMN, self.close_button_delegate)
+        self.tradeTable.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.tradeTable.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        # Chiều cao hàng cố định để cuộn mượt với số hàng lớn
+        self.tradeTable.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.tradeTable.verticalHeader().setDefaultSectionSize(28)
+        # Độ rộng cột chỉ tính theo nội dung một lần khi có dữ liệu lần đầu,
+        # không tính lại mỗi khi dữ liệu thay đổi
+        self.tradeTable.horizontalHeader().setSectionResizeMode(QHeaderView.Interactive)
+        self.tradeTable.horizontalHeader().setStretchLastSection(True)
+        self._trade_columns_sized = False
+
+        # Biểu đồ nến vẽ từ dữ liệu của ứng dụng (không cần tải trang web)
+        self.candle_chart = CandleChartWidget()
+        self.candle_chart.setMinimumSize(1100, 750)  # Tăng kích thước để hiển thị đầy đủ
+        self.chartContainer.addWidget(self.candle_chart)
+
+        # Trang biểu đồ Binance chỉ được tạo khi người dùng bật (QtWebEngine là tùy chọn)
+        self.chart_view = None
+        self.current_chart_symbol = None
+        self.webChartButton = QPushButton("Biểu đồ Binance")
+        self.webChartButton.setCheckable(True)
+        self.webChartButton.toggled.connect(self.toggle_web_chart)
+        self.chartContainer.insertWidget(0, self.webChartButton, 0, Qt.AlignRight)
 
         # Thêm các cặp giao dịch phổ biến
         popular_symbols = ["BTCUSDT", "ETHUSDT", "BNBUSDT", "ADAUSDT", "DOGEUSDT", "XRPUSDT", 
@@ -97,42 +103,41 @@ class MainView(QMainWindow):
         # Cập nhật thanh trạng thái
         self.statusbar.showMessage(f"Giá hiện tại: {price}", 3000)
 
-    def update_balance_display(self, balances, symbol):
-        """Cập nhật hiển thị số dư"""
+    def update_balance_display(self, balance, symbol):
+        """Cập nhật hiển thị số dư (balance là BalanceSnapshot)"""
         try:
             # Lấy base asset từ symbol
             base_asset = symbol.replace('USDT', '')
 
+            # Bỏ qua nếu số dư và cặp giao dịch không đổi so với lần vẽ trước
+            render_key = (balance.digest if balance is not None else None, base_asset)
+            if render_key == self._balance_render_key:
+                return
+            self._balance_render_key = render_key
+
             # Chuẩn bị thông tin hiển thị
             balance_html = "<div style='margin: 2px;'>"
 
             # Hiển thị số dư USDT (quan trọng nhất trong Futures)
-            if 'USDT' in balances:
-                usdt_data = balances['USDT']
-                usdt_balance = usdt_data['wallet_balance']
-                usdt_pnl = usdt_data['unrealized_pnl']
-                usdt_available = usdt_data['available_balance']
-
+            usdt = balance.get('USDT') if balance is not None else None
+            if usdt is not None:
                 # Định dạng số dư với bố cục tốt hơn
-                balance_html += f"<b>USDT:</b> {usdt_balance:.2f}<br>"
-                balance_html += f"<small>Khả dụng: {usdt_available:.2f}</small>"
+                balance_html += f"<b>USDT:</b> {usdt.wallet_balance:.2f}<br>"
+                balance_html += f"<small>Khả dụng: {usdt.available_balance:.2f}</small>"
 
                 # Hiển thị lãi/lỗ nếu có
-                if usdt_pnl != 0:
-                    pnl_color = "green" if usdt_pnl > 0 else "red"
-                    balance_html += f"<br><span style='color:{pnl_color};'><b>PnL:</b> {usdt_pnl:.2f}</span>"
-            else:
+                if usdt.unrealized_pnl != 0:
+                    pnl_color = "green" if usdt.unrealized_pnl > 0 else "red"
+                    balance_html += f"<br><span style='color:{pnl_color};'><b>PnL:</b> {usdt.unrealized_pnl:.2f}</span>"
+            elif balance is not None and balance.total_usdt:
                 # Hiển thị tổng số dư USDT nếu có
-                if 'total_usdt' in balances:
-                    balance_html += f"<b>USDT:</b> {balances['total_usdt']:.2f}"
+                balance_html += f"<b>USDT:</b> {balance.total_usdt:.2f}"
 
             # Hiển thị số dư của base asset nếu có
-            if base_asset in balances:
-                asset_data = balances[base_asset]
-                asset_balance = asset_data['wallet_balance']
-
+            asset = balance.get(base_asset) if balance is not None else None
+            if asset is not None:
                 # Thêm thông tin base asset
-                balance_html += f"<br><b>{base_asset}:</b> {asset_balance}"
+                balance_html += f"<br><b>{base_asset}:</b> {asset.wallet_balance}"
 
             balance_html += "</div>"
 
@@ -142,98 +147,48 @@ class MainView(QMainWindow):
 
             # Cập nhật UI
             self.balanceValueLabel.setText(balance_html)
-            self.balanceValueLabel.setTextFormat(Qt.RichText)
 
         except Exception as e:
+            self._balance_render_key = None
             self.balanceValueLabel.setText("<div style='color:red'>Lỗi khi cập nhật số dư</div>")
-
-        except Exception as e:
             print(f"Lỗi khi cập nhật số dư: {e}")
 
     def update_trades_table(self, trades_data):
-        """Cập nhật bảng giao dịch"""
-        # Xóa dữ liệu hiện tại
-        self.tradeTable.setRowCount(0)
-
-        # Duyệt qua danh sách giao dịch và thêm vào bảng
-        for i, trade in enumerate(trades_data):
-            self.tradeTable.insertRow(i)
-
-            # Thêm dữ liệu vào bảng
-            self.tradeTable.setItem(i, 0, QTableWidgetItem(str(trade.get("id", ""))))
-            self.tradeTable.setItem(i, 1, QTableWidgetItem(trade.get("symbol", "")))
-
-            side = trade.get("side", "")
-            side_item = QTableWidgetItem(side)
-            if side == "BUY":
-                side_item.setForeground(QColor(0, 200, 83))  # Xanh lá
-            else:
-                side_item.setForeground(QColor(255, 61, 0))  # Đỏ
-            self.tradeTable.setItem(i, 2, side_item)
-
-            self.tradeTable.setItem(i, 3, QTableWidgetItem(str(trade.get("price", ""))))
-            self.tradeTable.setItem(i, 4, QTableWidgetItem(str(trade.get("quantity", ""))))
-            # Hiển thị entry_time thay vì timestamp
-            entry_time = trade.get("entry_time", trade.get("timestamp", ""))
-            self.tradeTable.setItem(i, 5, QTableWidgetItem(entry_time))
-
-            pnl = trade.get("pnl", 0)
-            pnl_item = QTableWidgetItem(f"{pnl:.2f}" if isinstance(pnl, (int, float)) else str(pnl))
-            if isinstance(pnl, (int, float)):
-                if pnl > 0:
-                    pnl_item.setForeground(QColor(0, 200, 83))  # Xanh lá
-                elif pnl < 0:
-                    pnl_item.setForeground(QColor(255, 61, 0))  # Đỏ
-            self.tradeTable.setItem(i, 6, pnl_item)
-
-            # Nguồn lệnh
-            source = trade.get("source", "Ứng dụng")
-            source_item = QTableWidgetItem(source)
-            source_color = QColor(0, 120, 215) if source == "Ứng dụng" else QColor(245, 158, 11)
-            source_item.setForeground(source_color)
-            self.tradeTable.setItem(i, 7, source_item)
-
-            # Đòn bẩy 
-            leverage = trade.get("leverage", "")
-            leverage_item = QTableWidgetItem(str(leverage) if leverage else "")
-            self.tradeTable.setItem(i, 8, leverage_item)
-            
-            # Stop Loss và Take Profit
-            sl_value = trade.get("stop_loss", "")
-            tp_value = trade.get("take_profit", "")
-            logging.debug(f"Show order trade with ID {trade.get('id', 'N/A')}, SL: {sl_value}, TP: {tp_value}")
-
-            # Chuyển đổi sang chuỗi nếu cần (phòng trường hợp dữ liệu là số hoặc kiểu khác)
-            sl_item = QTableWidgetItem(str(sl_value) if sl_value else "")
-            tp_item = QTableWidgetItem(str(tp_value) if tp_value else "")
-
-            # Thêm màu sắc để dễ nhận biết
-            if sl_value:
-                sl_item.setForeground(QColor(255, 0, 0))  # Đỏ
-            if tp_value:
-                tp_item.setForeground(QColor(0, 255, 0))  # Xanh lá
-
-            # Kiểm tra chỉ số cột - giả sử chỉ số cột 9 là SL và 10 là TP (chỉ số từ 0)
-            self.tradeTable.setItem(i, 9, sl_item)
-            self.tradeTable.setItem(i, 10, tp_item)
-            
-            # Trạng thái/Hành động
-            status = trade.get("status", "")
-            if status == "OPEN" or status == "NEW":
-                close_button = QPushButton("Đóng vị thế")
-                close_button.setStyleSheet("background-color: #E74C3C; color: white;")
-                # Lưu thông tin trade vào button để sử dụng khi click
-                close_button.setProperty("trade_id", trade.get("id", ""))
-                close_button.setProperty("symbol", trade.get("symbol", ""))
-                close_button.setProperty("side", side)
-                close_button.clicked.connect(self.on_close_position_clicked)
-                self.tradeTable.setCellWidget(i, 11, close_button)
-            else:
-                status_item = QTableWidgetItem(trade.get("status", ""))
-                self.tradeTable.setItem(i, 11, status_item)
-
-    def update_summary(self, total_profit, win_rate, update_time):
-        """Cập nhật thông tin tổng kết"""
+        """Cập nhật bảng giao dịch - chỉ báo thay đổi cho những hàng khác (so theo ID giao dịch)"""
+        self.trade_model.set_trades(trades_data)
+        self.candle_chart.markers.set_trades(trades_data)
+        if not self._trade_columns_sized and self.trade_model.rowCount() > 0:
+            self.tradeTable.resizeColumnsToContents()
+            self._trade_columns_sized = True
+
+    def apply_trade_changes(self, changed, removed):
+        """Cập nhật bảng giao dịch từng phần (dòng thêm/đổi và ID bị xóa)"""
+        self.trade_model.apply_changes(changed, removed)
+        self.candle_chart.markers.apply_changes(changed, removed)
+        if not self._trade_columns_sized and self.trade_model.rowCount() > 0:
+            self.tradeTable.resizeColumnsToContents()
+            self._trade_columns_sized = True
+
+    def update_trade_pnl(self, trade_ids, values):
+        """Cập nhật PnL trực tiếp của các lệnh đang mở (chỉ các ô thay đổi)"""
+        self.trade_model.update_live(trade_ids, values)
+
+    def set_trade_closing(self, trade_id):
+        """Vô hiệu hóa nút đóng vị thế của giao dịch đang được đóng"""
+        self.trade_model.set_closing(trade_id)
+
+    def remove_trade_row(self, trade_id):
+        """Xóa giao dịch khỏi bảng ngay lập tức"""
+        self.trade_model.remove_trade(trade_id)
+
+    def update_summary(self, total_profit, win_rate, update_time, details=None):
+        """
+        Cập nhật thông tin tổng kết
+
+        Args:
+            details (dict, optional): profit_factor, max_drawdown, trades và các danh sách
+                by_symbol/by_strategy (mỗi phần tử có key, total_profit, win_rate, trades) - hiển thị ở tooltip
+        """
         self.totalProfitLabel.setText(f"Tổng lợi nhuận: {total_profit:.2f} USDT")
 
         # Thiết lập màu sắc
@@ -245,39 +200,93 @@ class MainView(QMainWindow):
         self.winRateLabel.setText(f"Tỷ lệ thắng: {win_rate:.2f}%")
         self.lastUpdateLabel.setText(f"Cập nhật lần cuối: {update_time}")
 
+        if details is not None:
+            profit_factor = details.get("profit_factor")
+            self.totalProfitLabel.setToolTip(
+                f"Số lệnh đã đóng: {details.get('trades', 0)}\n"
+                f"Profit factor: {'-' if profit_factor is None else f'{profit_factor:.2f}'}\n"
+                f"Sụt giảm lớn nhất: {details.get('max_drawdown', 0):.2f} USDT"
+            )
+            lines = []
+            for title, rows in (("Theo cặp giao dịch", details.get("by_symbol")),
+                                ("Theo chiến lược", details.get("by_strategy"))):
+                if rows:
+                    lines.append(f"{title}:")
+                    lines.extend(f"  {row['key'] or '-'}: {row['total_profit']:.2f} USDT, "
+                                 f"thắng {row['win_rate']:.1f}% / {row['trades']} lệnh" for row in rows)
+            self.winRateLabel.setToolTip("\n".join(lines))
+
     def filter_trades(self, filter_text):
-        """Lọc bảng giao dịch"""
-        for row in range(self.tradeTable.rowCount()):
-            show_row = True
-
-            if filter_text == "Đang mở":
-                # Kiểm tra cột "Loại lệnh" (cột 8)
-                type_item = self.tradeTable.item(row, 8)
-                if type_item and type_item.text() != "Đang mở":
-                    show_row = False
-
-            elif filter_text == "Đã đóng":
-                # Kiểm tra cột "Loại lệnh" (cột 8)
-                type_item = self.tradeTable.item(row, 8)
-                if type_item and type_item.text() != "Đã đóng":
-                    show_row = False
-
-            elif filter_text == "Ứng dụng":
-                # Kiểm tra cột "Nguồn" (cột 7)
-                source_item = self.tradeTable.item(row, 7)
-                if source_item and source_item.text() != "Ứng dụng":
-                    show_row = False
-
-            elif filter_text == "Binance":
-                # Kiểm tra cột "Nguồn" (cột 7)
-                source_item = self.tradeTable.item(row, 7)
-                if source_item and source_item.text() != "Binance":
-                    show_row = False
-
-            self.tradeTable.setRowHidden(row, not show_row)
+        """Lọc bảng giao dịch theo lựa chọn của filterComboBox"""
+        filters = {}
+        if filter_text in TRADE_FILTERS:
+            column, values, exclude = TRADE_FILTERS[filter_text]
+            filters[column] = (values, exclude)
+        self.trade_proxy.set_filters(filters)
 
     def load_chart(self, symbol):
-        """Tải biểu đồ cho cặp giao dịch"""
+        """Chuyển biểu đồ sang cặp giao dịch (dữ liệu nến do ChartFeed gửi tới)"""
+        self.current_chart_symbol = symbol
+        self.candle_chart.set_title(symbol)
+        if self.chart_view is not None and self.chart_view.isVisible():
+            self._load_web_chart(symbol)
+
+    def set_chart_data(self, symbol, interval, data):
+        """Nạp lịch sử nến cho biểu đồ"""
+        if symbol == self.current_chart_symbol:
+            self.candle_chart.set_candles(symbol, interval, data)
+
+    def update_chart_candle(self, symbol, candle):
+        """Cập nhật nến đang hình thành"""
+        if symbol == self.current_chart_symbol:
+            self.candle_chart.update_last_candle(candle)
+
+    def update_chart_indicators(self, symbol, interval, data):
+        """Ghép các giá trị chỉ báo mới của chiến lược vào biểu đồ"""
+        self.candle_chart.indicators.update(symbol, interval, data)
+
+    def _create_web_chart(self):
+        """Tạo QWebEngineView khi cần, None nếu chưa cài PyQtWebEngine"""
+        try:
+            from PyQt5.QtWebEngineWidgets import QWebEngineView
+        except ImportError:
+            return None
+
+        chart_view = QWebEngineView()
+        # Cấu hình WebEngineView với kích thước lớn hơn
+        chart_view.setMinimumSize(1100, 750)
+
+        # Bỏ qua lỗi CSP từ Binance
+        settings = chart_view.settings()
+        settings.setAttribute(settings.WebAttribute.JavascriptCanAccessClipboard, True)
+        settings.setAttribute(settings.WebAttribute.LocalContentCanAccessRemoteUrls, True)
+
+        self.chartContainer.addWidget(chart_view)
+        return chart_view
+
+    def toggle_web_chart(self, checked):
+        """Chuyển giữa biểu đồ nến và trang biểu đồ Binance"""
+        if checked and self.chart_view is None:
+            self.chart_view = self._create_web_chart()
+            if self.chart_view is None:
+                self.webChartButton.setChecked(False)
+                self.webChartButton.setEnabled(False)
+                self.webChartButton.setToolTip("Cần cài PyQtWebEngine để xem biểu đồ Binance")
+                return
+
+        self.candle_chart.setVisible(not checked)
+        if self.chart_view is None:
+            return
+        self.chart_view.setVisible(checked)
+        if checked:
+            self._load_web_chart(self.current_chart_symbol)
+        else:
+            # Bỏ trang đã tải để không tốn CPU/mạng khi đang ẩn
+            self.chart_view.setUrl(QUrl("about:blank"))
+
+    def _load_web_chart(self, symbol):
+        if not symbol:
+            return
         chart_url = self.binance_futures_chart_url.format(symbol=symbol)
         self.statusbar.showMessage(f"Đang tải biểu đồ Binance Futures: {chart_url}", 3000)
         self.chart_view.load(QUrl(chart_url))
@@ -305,23 +314,17 @@ class MainView(QMainWindow):
         )
 
         return reply == QMessageBox.Yes
-    def on_close_position_clicked(self):
+    def on_close_position_clicked(self, trade_id, symbol, side):
         """Xử lý khi nút đóng vị thế được nhấn"""
-        button = self.sender()
-        if button:
-            trade_id = button.property("trade_id")
-            symbol = button.property("symbol")
-            side = button.property("side")
-
-            logging.info(f"Close position button clicked for: ID={trade_id}, Symbol={symbol}, Side={side}")
-
-            # Hiển thị dialog xác nhận
-            confirm = self.confirm_dialog(
-                'Xác nhận đóng vị thế', 
-                f'Bạn có chắc chắn muốn đóng vị thế {symbol} ({side}) không?'
-            )
+        logging.info(f"Close position button clicked for: ID={trade_id}, Symbol={symbol}, Side={side}")
+
+        # Hiển thị dialog xác nhận
+        confirm = self.confirm_dialog(
+            'Xác nhận đóng vị thế', 
+            f'Bạn có chắc chắn muốn đóng vị thế {symbol} ({side}) không?'
+        )
 
-            if confirm:
-                # Gửi tín hiệu đóng vị thế với các tham số cụ thể
-                self.close_position_signal.emit(str(trade_id), symbol, side)
-                logging.info(f"Emitted close_position_signal for: ID={trade_id}, Symbol={symbol}, Side={side}")
+        if confirm:
+            # Gửi tín hiệu đóng vị thế với các tham số cụ thể
+            self.close_position_signal.emit(str(trade_id), symbol, side)
+            logging.info(f"Emitted close_position_signal for: ID={trade_id}, Symbol={symbol}, Side={side}")
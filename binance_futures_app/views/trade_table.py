@@ -0,0 +1,533 @@
+"""
+Model/delegate cho bảng giao dịch.
+
+TradeTableModel đọc trực tiếp từ TradeStore (dạng cột) và chỉ định dạng các ô mà view yêu cầu,
+tức là các hàng đang hiển thị. Nút "Đóng vị thế" được vẽ bởi CloseButtonDelegate thay vì tạo
+một QPushButton cho mỗi hàng, nên bộ nhớ không phụ thuộc số giao dịch trong lịch sử.
+TradeFilterProxyModel lọc và sắp xếp bằng chỉ mục của TradeStore thay vì đọc chữ từng ô.
+"""
+import math
+
+import numpy as np
+from PyQt5.QtCore import Qt, QAbstractTableModel, QAbstractProxyModel, QModelIndex, QEvent, QRect, pyqtSignal
+from PyQt5.QtGui import QColor
+from PyQt5.QtWidgets import QStyledItemDelegate
+
+from models.trade_store import TradeStore, OPEN_STATUSES
+
+# Tiêu đề cột
+TRADE_HEADERS = [
+    "ID", "Cặp giao dịch", "Loại", "Giá", "Số lượng", "Thời gian",
+    "Lời/Lỗ", "Nguồn", "Đòn bẩy", "Stop Loss", "Take Profit", "Trạng thái"
+]
+TRADE_COLUMN_COUNT = len(TRADE_HEADERS)
+PNL_COLUMN = 6
+TAKE_PROFIT_COLUMN = 10
+STATUS_COLUMN = 11
+
+# Cột của bảng -> cột của TradeStore dùng để sắp xếp
+TRADE_SORT_KEYS = ("id", "symbol", "side", "price", "quantity", "entry_time",
+                   "pnl", "source", "leverage", "stop_loss", "take_profit", "status")
+
+# Lựa chọn của bộ lọc -> (cột phân loại, giá trị, loại trừ)
+TRADE_FILTERS = {
+    "Đang mở": ("status", OPEN_STATUSES, False),
+    "Đã đóng": ("status", OPEN_STATUSES, True),
+    # Giao dịch tạo từ ứng dụng ("Manual", "Auto (...)"): mọi nguồn trừ vị thế đọc từ Binance
+    "Ứng dụng": ("source", ("Binance",), True),
+    "Binance": ("source", ("Binance",), False),
+}
+
+# Quá số dải hàng rời rạc này thì proxy reset thay vì báo từng dải thêm/xóa
+MAX_INCREMENTAL_BLOCKS = 256
+
+# Role riêng cho delegate (đi qua được proxy model)
+OPEN_ROLE = Qt.UserRole + 1  # True nếu hàng là lệnh đang mở (vẽ nút đóng vị thế)
+CLOSING_ROLE = Qt.UserRole + 2  # True nếu lệnh đóng đang được gửi
+TRADE_ROLE = Qt.UserRole + 3  # (trade_id, symbol, side)
+
+# Màu chữ dùng trong bảng
+COLOR_GREEN = QColor(0, 200, 83)
+COLOR_RED = QColor(255, 61, 0)
+COLOR_SL = QColor(255, 0, 0)
+COLOR_TP = QColor(0, 255, 0)
+COLOR_SOURCE_APP = QColor(0, 120, 215)
+COLOR_SOURCE_OTHER = QColor(245, 158, 11)
+COLOR_CLOSE_BUTTON = QColor("#E74C3C")
+COLOR_CLOSING_BUTTON = QColor("#7f8c8d")
+
+
+def _blocks(positions):
+    """Các vị trí tăng dần -> danh sách dải liên tiếp (đầu, cuối)"""
+    blocks = []
+    for position in positions:
+        position = int(position)
+        if blocks and position == blocks[-1][1] + 1:
+            blocks[-1][1] = position
+        else:
+            blocks.append([position, position])
+    return [tuple(block) for block in blocks]
+
+
+def _format_number(value):
+    """Số hiển thị: trống nếu NaN, bỏ phần thập phân .0 của số nguyên"""
+    if math.isnan(value):
+        return ""
+    if value == int(value):
+        return str(int(value))
+    return str(value)
+
+
+class TradeTableModel(QAbstractTableModel):
+    """Model bảng giao dịch trên TradeStore"""
+
+    def __init__(self, store=None, parent=None):
+        super().__init__(parent)
+        self.store = store or TradeStore()
+        self.closing_ids = set()  # Giao dịch đang được đóng
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.store)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else TRADE_COLUMN_COUNT
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return TRADE_HEADERS[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row, column = index.row(), index.column()
+        store = self.store
+
+        if role == Qt.DisplayRole:
+            return self._display(row, column)
+        if role == Qt.ForegroundRole:
+            return self._foreground(row, column)
+        if role == Qt.ToolTipRole:
+            return self._tooltip(row, column)
+        if role == OPEN_ROLE:
+            return store.is_open(row)
+        if role == CLOSING_ROLE:
+            return store.ids[row] in self.closing_ids
+        if role == TRADE_ROLE:
+            return store.ids[row], store.value(row, "symbol"), store.value(row, "side")
+        return None
+
+    def _display(self, row, column):
+        store = self.store
+        if column == 0:
+            return store.ids[row]
+        if column == 1:
+            return store.value(row, "symbol")
+        if column == 2:
+            return store.value(row, "side")
+        if column == 3:
+            return _format_number(store.value(row, "price"))
+        if column == 4:
+            return _format_number(store.value(row, "quantity"))
+        if column == 5:
+            return store.entry_times[row]
+        if column == 6:
+            text = store.text(row, "pnl")
+            if text is not None:
+                return text
+            pnl = store.value(row, "pnl")
+            if math.isnan(pnl):
+                return ""
+            roe = store.value(row, "roe")
+            return f"{pnl:.2f}" if math.isnan(roe) else f"{pnl:.2f} ({roe:+.2f}%)"
+        if column == 7:
+            return store.value(row, "source")
+        if column == 8:
+            return _format_number(store.value(row, "leverage"))
+        if column == 9:
+            text = store.text(row, "stop_loss")
+            return text if text is not None else _format_number(store.value(row, "stop_loss"))
+        if column == 10:
+            text = store.text(row, "take_profit")
+            return text if text is not None else _format_number(store.value(row, "take_profit"))
+        if column == STATUS_COLUMN:
+            # Lệnh đang mở được delegate vẽ thành nút
+            return "" if store.is_open(row) else store.value(row, "status")
+        return None
+
+    def _foreground(self, row, column):
+        store = self.store
+        if column == 2:
+            return COLOR_GREEN if store.value(row, "side") == "BUY" else COLOR_RED
+        if column == 6:
+            pnl = store.value(row, "pnl")
+            if pnl > 0:
+                return COLOR_GREEN
+            if pnl < 0:
+                return COLOR_RED
+            return None
+        if column == 7:
+            return COLOR_SOURCE_OTHER if store.value(row, "source") == "Binance" else COLOR_SOURCE_APP
+        if column == 9 and not math.isnan(store.value(row, "stop_loss")):
+            return COLOR_SL
+        if column == 10 and not math.isnan(store.value(row, "take_profit")):
+            return COLOR_TP
+        return None
+
+    def _tooltip(self, row, column):
+        """Khoảng cách từ giá hiện tại tới SL/TP (do bộ tính PnL trực tiếp cập nhật)"""
+        if column == 9:
+            distance = self.store.value(row, "sl_distance")
+            if not math.isnan(distance):
+                return f"Cách Stop Loss {distance:.2f}% giá hiện tại"
+        if column == 10:
+            distance = self.store.value(row, "tp_distance")
+            if not math.isnan(distance):
+                return f"Cách Take Profit {distance:.2f}% giá hiện tại"
+        return None
+
+    def set_trades(self, trades):
+        """
+        Đồng bộ model với danh sách giao dịch: xóa hàng không còn, thêm hàng mới vào cuối
+        và chỉ báo thay đổi cho những hàng có nội dung khác.
+
+        Returns:
+            int: Số hàng đã thêm, xóa hoặc thay đổi
+        """
+        store = self.store
+        removed, new_trades, existing = store.diff(trades)
+
+        self._remove_rows(removed)
+
+        changed_rows = []
+        for trade_id, trade in existing.items():
+            row = store.update(trade_id, trade)
+            if row >= 0:
+                changed_rows.append(row)
+                # Lệnh đã đóng xong thì bỏ trạng thái "đang đóng"
+                if not store.is_open(row):
+                    self.closing_ids.discard(trade_id)
+        self._emit_rows_changed(changed_rows)
+
+        if new_trades:
+            start = len(store)
+            self.beginInsertRows(QModelIndex(), start, start + len(new_trades) - 1)
+            store.append(new_trades)
+            self.endInsertRows()
+
+        return len(removed) + len(changed_rows) + len(new_trades)
+
+    def apply_changes(self, changed, removed):
+        """
+        Áp dụng thay đổi từng phần: thêm/cập nhật các dòng trong `changed`, xóa các ID trong `removed`.
+        Các dòng không được nhắc đến giữ nguyên.
+        """
+        store = self.store
+        self._remove_rows([store.row_of(trade_id) for trade_id in removed])
+
+        new_trades = []
+        changed_rows = []
+        for trade in changed:
+            trade_id = str(trade.get("id", ""))
+            if store.row_of(trade_id) < 0:
+                new_trades.append(trade)
+                continue
+            row = store.update(trade_id, trade)
+            if row >= 0:
+                changed_rows.append(row)
+                if not store.is_open(row):
+                    self.closing_ids.discard(trade_id)
+        self._emit_rows_changed(changed_rows)
+
+        if new_trades:
+            start = len(store)
+            self.beginInsertRows(QModelIndex(), start, start + len(new_trades) - 1)
+            store.append(new_trades)
+            self.endInsertRows()
+
+    def update_live(self, trade_ids, values):
+        """
+        Cập nhật PnL, ROE và khoảng cách SL/TP tính trực tiếp từ giá đánh dấu.
+        Chỉ báo thay đổi cho các ô Lời/Lỗ..Take Profit của những hàng được nhắc đến.
+        """
+        rows = self.store.set_live(trade_ids, values)
+        self._emit_rows_changed(rows.tolist(), PNL_COLUMN, TAKE_PROFIT_COLUMN)
+
+    def _emit_rows_changed(self, rows, first_column=0, last_column=TRADE_COLUMN_COUNT - 1):
+        """Phát dataChanged cho từng dải hàng liên tiếp"""
+        if not rows:
+            return
+        rows.sort()
+        start = previous = rows[0]
+        for row in rows[1:] + [None]:
+            if row is not None and row == previous + 1:
+                previous = row
+                continue
+            self.dataChanged.emit(self.index(start, first_column), self.index(previous, last_column))
+            if row is not None:
+                start = previous = row
+
+    def remove_trade(self, trade_id):
+        """Xóa giao dịch khỏi bảng ngay lập tức"""
+        self._remove_rows([self.store.row_of(trade_id)])
+
+    def _remove_rows(self, rows):
+        """Xóa các hàng theo từng dải liên tiếp (từ cuối lên), mỗi dải một cặp beginRemoveRows/endRemoveRows"""
+        for first, last in reversed(_blocks(sorted(row for row in set(rows) if row >= 0))):
+            self.beginRemoveRows(QModelIndex(), first, last)
+            for row in range(first, last + 1):
+                self.closing_ids.discard(self.store.ids[row])
+            self.store.remove_rows(range(first, last + 1))
+            self.endRemoveRows()
+
+    def set_closing(self, trade_id):
+        """Đánh dấu lệnh đang được đóng (nút chuyển sang xám và bị vô hiệu hóa)"""
+        row = self.store.row_of(trade_id)
+        if row < 0:
+            return
+        self.closing_ids.add(str(trade_id))
+        index = self.index(row, STATUS_COLUMN)
+        self.dataChanged.emit(index, index)
+
+
+class TradeFilterProxyModel(QAbstractProxyModel):
+    """
+    Lọc và sắp xếp bảng giao dịch bằng chỉ mục theo cột của TradeStore.
+    Các hàng hiển thị là một mảng chỉ số hàng nguồn; đổi bộ lọc chỉ ghép các danh sách hàng
+    khớp của từng cột (giao của nhiều điều kiện) mà không đọc lại nội dung ô.
+    Thêm/xóa hàng và thay đổi giá trị được báo cho view từng phần (thêm/xóa dải hàng,
+    layoutChanged khi đổi chỗ) nên vùng chọn và vị trí cuộn được giữ nguyên.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.filters = {}  # cột phân loại -> (tập giá trị, loại trừ)
+        self.sort_column = -1
+        self.sort_order = Qt.AscendingOrder
+        self.rows = np.empty(0, dtype=np.int64)  # hàng proxy -> hàng nguồn
+        self._proxy_rows = None  # hàng nguồn -> hàng proxy (-1 nếu bị ẩn), tính khi cần
+        self._category_version = -1
+
+    def setSourceModel(self, model):
+        old = self.sourceModel()
+        if old is not None:
+            for signal, slot in self._source_connections(old):
+                signal.disconnect(slot)
+        super().setSourceModel(model)
+        for signal, slot in self._source_connections(model):
+            signal.connect(slot)
+        self._rebuild()
+
+    def _source_connections(self, model):
+        return [
+            (model.modelReset, self._rebuild),
+            (model.layoutChanged, self._rebuild),
+            (model.rowsInserted, self._on_source_rows_inserted),
+            (model.rowsAboutToBeRemoved, self._on_source_rows_about_to_be_removed),
+            (model.rowsRemoved, self._on_source_rows_removed),
+            (model.dataChanged, self._on_source_data_changed),
+        ]
+
+    @property
+    def store(self):
+        return self.sourceModel().store
+
+    def set_filter(self, column, values, exclude=False):
+        """Đặt điều kiện lọc cho một cột phân loại (values=None để bỏ lọc cột này)"""
+        if values is None:
+            self.filters.pop(column, None)
+        else:
+            self.filters[column] = (frozenset(values), exclude)
+        self._refresh()
+
+    def set_filters(self, filters):
+        """Thay toàn bộ điều kiện lọc: {cột: (giá trị, loại trừ)}"""
+        self.filters = {column: (frozenset(values), exclude) for column, (values, exclude) in filters.items()}
+        self._refresh()
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        self.sort_column = column
+        self.sort_order = order
+        self._refresh()
+
+    def _compute_rows(self):
+        store = self.store
+        matches = None
+        for column, (values, exclude) in self.filters.items():
+            rows = store.rows_matching(column, values, exclude)
+            matches = rows if matches is None else np.intersect1d(matches, rows, assume_unique=True)
+
+        if 0 <= self.sort_column < len(TRADE_SORT_KEYS):
+            order = store.sort_order(TRADE_SORT_KEYS[self.sort_column])
+            if self.sort_order == Qt.DescendingOrder:
+                order = order[::-1]
+            if matches is not None:
+                mask = np.zeros(len(store), dtype=bool)
+                mask[matches] = True
+                order = order[mask[order]]
+            return order
+        return matches if matches is not None else np.arange(len(store))
+
+    def _rebuild(self, *args):
+        if self.sourceModel() is None:
+            return
+        self.beginResetModel()
+        self.rows = self._compute_rows()
+        self._proxy_rows = None
+        self._category_version = self.store.category_version
+        self.endResetModel()
+
+    def _refresh(self):
+        """Tính lại các hàng hiển thị và báo cho view từng phần"""
+        if self.sourceModel() is not None:
+            self._update_rows(self._compute_rows())
+
+    def _update_rows(self, new_rows):
+        """
+        Chuyển các hàng hiển thị sang new_rows: xóa các dải hàng không còn, đổi thứ tự các hàng
+        còn lại bằng layoutChanged (cập nhật persistent index), rồi chèn các dải hàng mới.
+        Nếu thay đổi quá rời rạc thì reset một lần.
+        """
+        new_rows = np.asarray(new_rows, dtype=np.int64)
+        size = max(len(self.store), int(self.rows.max()) + 1 if len(self.rows) else 0)
+        in_new = np.zeros(size, dtype=bool)
+        in_new[new_rows] = True
+        in_old = np.zeros(size, dtype=bool)
+        in_old[self.rows] = True
+        removed = _blocks(np.flatnonzero(~in_new[self.rows]))
+        inserted = _blocks(np.flatnonzero(~in_old[new_rows]))
+        if len(removed) + len(inserted) > MAX_INCREMENTAL_BLOCKS:
+            self.beginResetModel()
+            self.rows = new_rows
+            self._proxy_rows = None
+            self._category_version = self.store.category_version
+            self.endResetModel()
+            return
+
+        # Xóa từ cuối lên để vị trí các dải phía trước không đổi
+        for first, last in reversed(removed):
+            self.beginRemoveRows(QModelIndex(), first, last)
+            self.rows = np.concatenate((self.rows[:first], self.rows[last + 1:]))
+            self._proxy_rows = None
+            self.endRemoveRows()
+
+        # Các hàng còn lại theo thứ tự mới
+        kept = new_rows[in_old[new_rows]]
+        if not np.array_equal(kept, self.rows):
+            self.layoutAboutToBeChanged.emit()
+            old_rows = self.rows
+            self.rows = kept
+            self._proxy_rows = None
+            persistent = self.persistentIndexList()
+            targets = [self.index(self._proxy_row(int(old_rows[index.row()])), index.column())
+                       if 0 <= index.row() < len(old_rows) else QModelIndex() for index in persistent]
+            self.changePersistentIndexList(persistent, targets)
+            self.layoutChanged.emit()
+
+        # Chèn theo vị trí tăng dần: mọi hàng đứng trước vị trí chèn đã đúng chỗ
+        for first, last in inserted:
+            self.beginInsertRows(QModelIndex(), first, last)
+            self.rows = np.concatenate((self.rows[:first], new_rows[first:last + 1], self.rows[first:]))
+            self._proxy_rows = None
+            self.endInsertRows()
+        self._category_version = self.store.category_version
+
+    def _on_source_rows_inserted(self, parent, first, last):
+        # Hàng nguồn từ `first` trở đi dịch xuống; vị trí proxy không đổi
+        self.rows = np.where(self.rows >= first, self.rows + (last - first + 1), self.rows)
+        self._proxy_rows = None
+        self._refresh()
+
+    def _on_source_rows_about_to_be_removed(self, parent, first, last):
+        visible = (self.rows < first) | (self.rows > last)
+        if not visible.all():
+            self._update_rows(self.rows[visible])
+
+    def _on_source_rows_removed(self, parent, first, last):
+        self.rows = np.where(self.rows > last, self.rows - (last - first + 1), self.rows)
+        self._proxy_rows = None
+        self._category_version = self.store.category_version
+
+    def _on_source_data_changed(self, top_left, bottom_right, roles=()):
+        # Giá trị phân loại hoặc cột đang sắp xếp thay đổi: hàng có thể đổi chỗ/bị ẩn/hiện ra
+        if (self.store.category_version != self._category_version or
+                (self.sort_column >= 0 and self.sort_column != STATUS_COLUMN and
+                 top_left.column() <= self.sort_column <= bottom_right.column())):
+            self._refresh()
+        last_column = bottom_right.column()
+        for source_row in range(top_left.row(), bottom_right.row() + 1):
+            row = self._proxy_row(source_row)
+            if row >= 0:
+                self.dataChanged.emit(self.index(row, top_left.column()), self.index(row, last_column), roles)
+
+    def _proxy_row(self, source_row):
+        if self._proxy_rows is None:
+            self._proxy_rows = np.full(len(self.store), -1, dtype=np.int64)
+            self._proxy_rows[self.rows] = np.arange(len(self.rows))
+        if source_row >= len(self._proxy_rows):
+            return -1
+        return int(self._proxy_rows[source_row])
+
+    def mapToSource(self, proxy_index):
+        if not proxy_index.isValid() or self.sourceModel() is None:
+            return QModelIndex()
+        return self.sourceModel().index(int(self.rows[proxy_index.row()]), proxy_index.column())
+
+    def mapFromSource(self, source_index):
+        if not source_index.isValid():
+            return QModelIndex()
+        row = self._proxy_row(source_index.row())
+        if row < 0:
+            return QModelIndex()
+        return self.index(row, source_index.column())
+
+    def index(self, row, column, parent=QModelIndex()):
+        if parent.isValid() or not (0 <= row < len(self.rows)) or not (0 <= column < self.columnCount()):
+            return QModelIndex()
+        return self.createIndex(row, column)
+
+    def parent(self, index=QModelIndex()):
+        return QModelIndex()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() or self.sourceModel() is None else self.sourceModel().columnCount()
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal:
+            return self.sourceModel().headerData(section, orientation, role)
+        if role == Qt.DisplayRole:
+            return section + 1
+        return None
+
+
+class CloseButtonDelegate(QStyledItemDelegate):
+    """Vẽ nút "Đóng vị thế" trong cột trạng thái và phát close_clicked khi được nhấn"""
+    close_clicked = pyqtSignal(str, str, str)  # trade_id, symbol, side
+
+    def _button_rect(self, option):
+        return QRect(option.rect).adjusted(2, 2, -2, -2)
+
+    def paint(self, painter, option, index):
+        if not index.data(OPEN_ROLE):
+            super().paint(painter, option, index)
+            return
+
+        closing = index.data(CLOSING_ROLE)
+        rect = self._button_rect(option)
+        painter.save()
+        painter.fillRect(rect, COLOR_CLOSING_BUTTON if closing else COLOR_CLOSE_BUTTON)
+        painter.setPen(QColor("white"))
+        painter.drawText(rect, Qt.AlignCenter, "Đang đóng..." if closing else "Đóng vị thế")
+        painter.restore()
+
+    def editorEvent(self, event, model, option, index):
+        if (event.type() == QEvent.MouseButtonRelease and event.button() == Qt.LeftButton and
+                index.data(OPEN_ROLE) and not index.data(CLOSING_ROLE) and
+                self._button_rect(option).contains(event.pos())):
+            trade_id, symbol, side = index.data(TRADE_ROLE)
+            self.close_clicked.emit(trade_id, symbol, side)
+            return True
+        return super().editorEvent(event, model, option, index)